@@ -3,6 +3,12 @@ import os
 default_colormap = 'RdBu'
 user_path = os.path.join(os.getenv('HOME'), 'aospy_user', 'aospy_user')
 
+# Roots of the archive and scratch filesystems
+ARCHIVE_ROOT = os.getenv('AOSPY_ARCHIVE_ROOT', '/archive')
+SCRATCH_ROOT = os.getenv('AOSPY_SCRATCH_ROOT', '/work')
+# Maximum number of datasets kept open by dataset_pool.dataset_pool
+MAX_OPEN_DATASETS = int(os.getenv('AOSPY_MAX_OPEN_DATASETS', '64'))
+
 LON_STR = 'lon'
 LAT_STR = 'lat'
 LON_BOUNDS_STR = 'lon_bounds'
@@ -13,5 +19,6 @@ PLEVEL_STR = 'level'
 TIME_STR = 'time'
 TIME_STR_IDEALIZED = 'year'
 YEAR_STR = 'year'
+REGION_STR = 'region'
 
 del os
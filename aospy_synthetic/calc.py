@@ -1,11 +1,85 @@
 """calc.py: classes for performing specified calculations on aospy data"""
 from __future__ import print_function
+import copy
+import datetime
+import errno
 import os
 import time
+from collections import OrderedDict
 
-from .io import _data_in_label, _data_out_label, _ens_label, _yr_label
-from .timedate import TimeManager
+import numpy as np
+import xray
+
+from .__config__ import ARCHIVE_ROOT, SCRATCH_ROOT, TIME_STR
+from .dag import Plan, loaded_vars
+from .dataset_pool import dataset_pool
+from .ensemble import ensemble_mean
+from .db.registry import get_backend, register
+from .file_index import run_file_index
+from .io import (_data_in_label, _data_out_label, _ens_label,
+                 _parse_file_name, _region_label, _yr_label, hdf5_locked)
+from .provenance import StatCache, fingerprint, stale_calcs
+from .reader import BlockReader
+from .reductions import STATS_EXT, accumulator
+from .region import regional_averages
+from .tar_index import append_files, tar_index
+from .timedate import (TimeManager, _prep_time_data, date_bounds,
+                       time_array, time_index)
 from .utils import get_parent_attr
+from .writer import OutputWriter
+
+REGIONAL_PREFIX = 'reg.'
+
+
+class CacheStats(object):
+    """Counts of Calc results loaded from the cache versus computed, in total
+    and per Run.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.
+        self.by_run = {}
+
+    def _run_stats(self, run_name):
+        return self.by_run.setdefault(
+            run_name, {'hits': 0, 'misses': 0, 'time_saved': 0.}
+        )
+
+    def record_hit(self, run_name, time_saved):
+        self.hits += 1
+        self.time_saved += time_saved
+        stats = self._run_stats(run_name)
+        stats['hits'] += 1
+        stats['time_saved'] += time_saved
+
+    def record_miss(self, run_name):
+        self.misses += 1
+        self._run_stats(run_name)['misses'] += 1
+
+    def report(self):
+        """Returns a summary of the cache statistics, one line per Run."""
+        lines = [str(self)]
+        for run_name in sorted(self.by_run):
+            stats = self.by_run[run_name]
+            lines.append('  {}: {} hits, {} misses, {:.1f} s saved'.format(
+                run_name, stats['hits'], stats['misses'],
+                stats['time_saved']
+            ))
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return 'Calc cache: {} hits, {} misses, {:.1f} s saved'.format(
+            self.hits, self.misses, self.time_saved
+        )
+
+    __repr__ = __str__
+
+
+cache_stats = CacheStats()
 
 
 class CalcInterface(object):
@@ -28,7 +102,8 @@ class CalcInterface(object):
                  date_range=None, region=None, intvl_in=None, intvl_out=None,
                  dtype_in_time=None, dtype_in_vert=None, dtype_out_time=None,
                  dtype_out_vert=None, level=None, chunk_len=False,
-                 verbose=True, backend=None, db_tracking=True):
+                 verbose=True, backend=None, db_tracking=True, stager=None,
+                 writer=None, ens_workers=1):
         """Create the CalcInterface object with the given parameters."""
         if run not in model.runs.values():
             raise AttributeError("Model '{}' has no run '{}'.  Calc object "
@@ -65,33 +140,56 @@ class CalcInterface(object):
         self.ens_mem = ens_mem
         self.level = level
         self.intvl_in = intvl_in
-        self.intvl_out = intvl_out
+        # Several intvl_out may be given, as for dtype_out_time below
+        if isinstance(intvl_out, (list, tuple)):
+            self.intvls_out = tuple(intvl_out)
+        else:
+            self.intvls_out = (intvl_out,)
+        self.intvl_out = intvl_out = self.intvls_out[0]
         self.dtype_in_time = dtype_in_time
         self.dtype_in_vert = dtype_in_vert
 
         # For now we'll change to make Calc one to one -- testing already works
         # this way.  (It doesn't use the CalcInterface -- CalcInterface may be
         # all we need to change to change Calc to one to one in reality).
-        self.dtype_out_time = dtype_out_time
+        # Several dtype_out_time may be given; the Calc is then split into one
+        # Calc per intvl_out and dtype_out_time by Calc.outputs.
+        if isinstance(dtype_out_time, (list, tuple)):
+            self.dtypes_out_time = tuple(dtype_out_time)
+        else:
+            self.dtypes_out_time = (dtype_out_time,)
+        self.dtype_out_time = self.dtypes_out_time[0]
         self.dtype_out_vert = dtype_out_vert
         self.region = region
 
         self.months = TimeManager.month_indices(intvl_out)
-        self.start_date = TimeManager.str_to_datetime(date_range[0])
-        self.end_date = TimeManager.str_to_datetime(date_range[-1])
-        tm = TimeManager(self.start_date, self.end_date, intvl_out)
-        self.date_range = tm.create_time_array()
+        self.start_date, self.end_date = date_bounds(date_range)
 
-        self.start_date_xray = tm.apply_year_offset(self.start_date)
-        self.end_date_xray = tm.apply_year_offset(self.end_date)
+        self.chunk_len = chunk_len
 
         self.backend = backend
         self.db_tracking = db_tracking
+        # Stager copying input files from archive to scratch, if any
+        self.stager = stager
+        # OutputWriter of the outputs; by default, one per computation
+        self.writer = writer
+        # Number of ensemble members loaded at once for an ensemble mean
+        self.ens_workers = ens_workers
+
+    @property
+    def date_range(self):
+        """Array of the month ends of the Calc's months within its date
+        range; built on first use and shared among Calcs.
+        """
+        return time_array(self.start_date, self.end_date, self.months)
 
 
 class Calc(object):
     """Class for executing, saving, and loading a single computation."""
 
+    # Calc shares its CalcInterface's attributes but not its class
+    date_range = CalcInterface.date_range
+
     def __hash__(self):
         self.file_name = self._file_name(self.dtype_out_time)
         if self.region:
@@ -127,14 +225,14 @@ class Calc(object):
     def _dir_scratch(self):
         """Create string of the data directory on the scratch filesystem."""
         ens_label = _ens_label(self.ens_mem)
-        return os.path.join('/work', os.getenv('USER'), self.proj_str,
+        return os.path.join(SCRATCH_ROOT, os.getenv('USER'), self.proj_str,
                             self.model_str, self.run_str, ens_label,
                             self.name)
 
     def _dir_archive(self):
         """Create string of the data directory on the archive filesystem."""
         ens_label = _ens_label(self.ens_mem)
-        return os.path.join('/archive', os.getenv('USER'),
+        return os.path.join(ARCHIVE_ROOT, os.getenv('USER'),
                             self.proj_str, 'data', self.model_str,
                             self.run_str, ens_label)
 
@@ -145,19 +243,492 @@ class Calc(object):
         in_lbl = _data_in_label(self.intvl_in, self.dtype_in_time,
                                 self.dtype_in_vert)
         ens_lbl = _ens_label(self.ens_mem)
+        # Calcs of a region are reduced over it alone
+        reg_lbl = _region_label(self.region)
         yr_lbl = _yr_label((self.start_date.year,
                             self.end_date.year))
         return '.'.join(
-            [self.name, out_lbl, in_lbl, self.model_str, self.run_str_full,
-             ens_lbl, yr_lbl, extension]
-        ).replace('..', '.')
+            lbl for lbl in [self.name, out_lbl, in_lbl, self.model_str,
+                            self.run_str_full, ens_lbl, reg_lbl, yr_lbl,
+                            extension] if lbl
+        )
 
     def _path_scratch(self, dtype_out_time):
-        return os.path.join(self.dir_scratch, self.file_name)
+        return os.path.join(self.dir_scratch,
+                            self._file_name(dtype_out_time))
+
+    def _path_stats(self, dtype_out_time):
+        """Path of the file holding the running statistics of an output;
+        see ``reductions.Accumulator.state``.
+        """
+        return os.path.join(self.dir_scratch,
+                            self._file_name(dtype_out_time, STATS_EXT[1:]))
 
     def _path_archive(self):
         return os.path.join(self.dir_archive, 'data.tar')
 
+    def is_up_to_date(self, backend=None, check_content=False):
+        """Returns True if the output file of this Calc exists and none of
+        the input files recorded for it in the backend have changed since.
+
+        See ``provenance.stale_calcs`` to check many Calcs at once.
+        """
+        return not stale_calcs([self], backend=backend,
+                               check_content=check_content)
+
+    def _data_in_attr(self, attr):
+        """Returns an input data attribute set by CalcInterface, which wraps
+        each of them in a tuple.
+        """
+        val = getattr(self, attr)
+        if isinstance(val, tuple) and len(val) == 1:
+            return val[0]
+        return val
+
+    def _get_input_data_paths(self, var):
+        """Returns the paths of the files holding a variable's input data,
+        or, for an ensemble mean, those of every member's data of the
+        variables it is derived from.
+        """
+        if self.ens_mem == 'avg':
+            paths = []
+            for member in self._ens_members():
+                for loaded in loaded_vars(var):
+                    paths.extend(path for path in
+                                 member._get_input_data_paths(loaded)
+                                 if path not in paths)
+            return paths
+        if var.in_nc_grid:
+            return list(self.model.grid_file_paths)
+        direc = self._data_in_attr('data_in_direc')
+        dir_struc = self._data_in_attr('data_in_dir_struc')
+        if dir_struc == 'one_dir':
+            files = self._data_in_attr('data_in_files')[self.intvl_in]
+            for name in var.names:
+                if name in files:
+                    return [os.path.join(direc, files[name])]
+            raise KeyError("No input file of '{}' for intvl_in '{}'".format(
+                var.name, self.intvl_in))
+        elif dir_struc == 'gfdl':
+            return self._get_input_data_paths_gfdl(direc, var)
+        raise ValueError("Unsupported data_in_dir_struc "
+                         "'{}'".format(dir_struc))
+
+    def _get_input_data_paths_gfdl(self, direc, var):
+        """Returns the paths of the data_in_dur-year files of a variable in
+        the GFDL post-processing directory structure that span the Calc's
+        date range, looked up in the Run's index of the directory.
+        """
+        index = run_file_index(self.run, direc, get_backend(self.run))
+        paths = index.paths(var.names, var.domain, self.dtype_in_time,
+                            self.intvl_in, self._data_in_attr('data_in_dur'),
+                            self.start_date.year, self.end_date.year)
+        if not paths:
+            raise IOError("No input files of '{}' for intvl_in '{}' and "
+                          "dtype_in_time '{}' in {}".format(
+                              var.name, self.intvl_in, self.dtype_in_time,
+                              direc))
+        return paths
+
+    def _select_time(self, arr):
+        """Restricts an array to the Calc's date range and the months it
+        loads.
+        """
+        if TIME_STR not in arr.dims:
+            return arr
+        inds = time_index(arr[TIME_STR]).select(self._loaded_months(),
+                                                self.start_date,
+                                                self._stop_date())
+        return arr.isel(**{TIME_STR: inds})
+
+    def _stop_date(self):
+        """Returns the start of the day after the Calc's end date, the
+        exclusive end of the times it selects, so that the times during its
+        last day, not just at its start, are selected.
+        """
+        return self.end_date + datetime.timedelta(days=1)
+
+    def _ens_members(self):
+        """Returns a copy of the Calc selecting the input data of each
+        ensemble member of its run.
+        """
+        direcs = self._data_in_attr('data_in_direc')
+        if not (self._data_in_attr('ens_mem_prefix') and
+                isinstance(self._data_in_attr('ens_mem_ext'), (list, tuple))):
+            raise ValueError("Run '{}' is not an ensemble: it has no "
+                             "ens_mem_prefix and list of "
+                             "ens_mem_ext".format(self.run.name))
+        members = []
+        for i, direc in enumerate(direcs):
+            member = copy.copy(self)
+            member.ens_mem = i
+            member.data_in_direc = (direc,)
+            members.append(member)
+        return members
+
+    def _load_var(self, var):
+        """Loads a variable's input data within the Calc's date range.
+
+        With a stager, the input files are read from their scratch copies.
+        For an ensemble mean, the variable is loaded, or derived, for one
+        member at a time, or ``ens_workers`` at once, and averaged; see
+        ``ensemble.ensemble_mean``.
+        """
+        if self.ens_mem == 'avg':
+            return ensemble_mean(self._ens_members(), var, self.ens_workers)
+        paths = self._get_input_data_paths(var)
+        if self.stager is None:
+            return self._read_var(var, paths)
+        with self.stager.staged(paths) as local_paths:
+            return self._read_var(var, local_paths)
+
+    def _read_var(self, var, paths):
+        """Reads a variable's data within the Calc's date range from some
+        files, opened through the shared ``dataset_pool``.
+
+        The times are selected from each file before the files' data are
+        concatenated, so that only the selected data is read.  Files read
+        through netCDF4 are read holding ``io.hdf5_lock``, as inputs may be
+        loaded ahead on another thread (see ``reader.BlockReader``).
+        """
+        with dataset_pool.datasets(paths, preprocess=_prep_time_data,
+                                   decode_times=False) as datasets, \
+                hdf5_locked(paths):
+            arrs = []
+            for path, ds in zip(paths, datasets):
+                for name in var.names:
+                    if name in ds:
+                        arrs.append(self._select_time(
+                            ds[name].copy(deep=False)
+                        ))
+                        break
+                else:
+                    raise KeyError("Variable '{}' not found in {}".format(
+                        var.name, path))
+            if len(arrs) > 1 and TIME_STR in arrs[0].dims:
+                arr = xray.concat(arrs, dim=TIME_STR)
+            else:
+                arr = arrs[0]
+            return arr.load()
+
+    def _time_chunks(self, exclude=None):
+        """Returns the (start, stop) dates of the chunks of the date range
+        that the Calc's inputs are loaded and reduced in.
+
+        Each chunk spans from its start up to, but excluding, its stop, the
+        start of the next chunk, so that no times between chunks are left
+        out.
+
+        With an integer ``chunk_len``, chunks span that many years from the
+        start of the date range.  With ``chunk_len=True`` they are the
+        ``data_in_dur``-year blocks of the input files.  Otherwise the whole
+        date range is a single chunk.
+
+        Parameters
+        ----------
+        exclude : tuple of datetime, optional
+            (start, stop) dates of a part of the date range to leave out,
+            e.g. one whose running statistics are stored.
+        """
+        if self.chunk_len is True:
+            dur = self._data_in_attr('data_in_dur')
+            origin = self._data_in_attr('data_in_start_date').year
+        elif self.chunk_len:
+            dur = int(self.chunk_len)
+            origin = self.start_date.year
+        else:
+            dur = None
+        stop_date = self._stop_date()
+        if dur is None:
+            chunks = [(self.start_date, stop_date)]
+        else:
+            first = origin + (self.start_date.year - origin) // dur * dur
+            chunks = [
+                (max(self.start_date, datetime.datetime(year, 1, 1)),
+                 min(stop_date, datetime.datetime(year + dur, 1, 1)))
+                for year in range(first, self.end_date.year + 1, dur)
+            ]
+        if exclude is None:
+            return chunks
+        exclude_start, exclude_stop = exclude
+        kept = []
+        for start, stop in chunks:
+            if start < exclude_start:
+                kept.append((start, min(stop, exclude_start)))
+            if stop > exclude_stop:
+                kept.append((max(start, exclude_stop), stop))
+        return kept
+
+    def _loaded_months(self):
+        """Returns the months of input data the Calc loads: its own months,
+        unless it shares its inputs with Calcs of other output intervals.
+        """
+        if self._load_months is None:
+            return tuple(sorted(self.months))
+        return self._load_months
+
+    def _chunk(self, start_date, stop_date, months=None):
+        """Returns a copy of the Calc that selects only the input data from
+        ``start_date`` up to, but excluding, ``stop_date``, and, if given,
+        of the given months, which must include the Calc's own months.
+        """
+        if months is None:
+            months = self._loaded_months()
+        months = tuple(sorted(months))
+        if ((start_date, stop_date, months) ==
+                (self.start_date, self._stop_date(), self._loaded_months())):
+            return self
+        end_date = stop_date - datetime.timedelta(days=1)
+        chunk = copy.copy(self)
+        chunk.start_date = start_date
+        chunk.end_date = end_date
+        chunk._load_months = months
+        return chunk
+
+    def _whole_years(self):
+        """Whether the date range spans whole calendar years."""
+        return ((self.start_date.month, self.start_date.day) == (1, 1) and
+                (self.end_date.month, self.end_date.day) == (12, 31))
+
+    def _with_years(self, first, last):
+        """Returns a copy of the Calc over the given years, with the file
+        names and hash of a Calc created over them.
+        """
+        calc = copy.copy(self)
+        calc.start_date = datetime.datetime(first, 1, 1)
+        calc.end_date = datetime.datetime(last, 12, 31)
+        calc.file_name = calc._file_name(calc.dtype_out_time)
+        calc.path_scratch = calc._path_scratch(calc.dtype_out_time)
+        calc.path_stats = calc._path_stats(calc.dtype_out_time)
+        return calc
+
+    def _input_selection(self):
+        """Returns what determines the input data the Calc selects, other
+        than its date range and months.
+        """
+        return (self.run, self.ens_mem, self.intvl_in, self.dtype_in_time,
+                self.dtype_in_vert)
+
+    def _output_data(self, data, loaded_months, shared):
+        """Returns the part of the data of the Calc's variable that feeds
+        its time reduction.
+
+        The data is averaged over the Calc's regions if its dtype_out_time
+        is regional, and restricted to its months if more were loaded.
+
+        Parameters
+        ----------
+        data : DataArray
+            Chunk of the data of the Calc's variable.
+        loaded_months : tuple
+            Months of the data.
+        shared : dict
+            Memo of the regional averages and month selections of the same
+            data, shared by all Calcs it feeds.
+        """
+        key = None
+        if self.dtype_out_time.startswith(REGIONAL_PREFIX):
+            key = tuple(region.digest() for region in self._regions())
+            if key not in shared:
+                shared[key] = self._regional_averages(data)
+            data = shared[key]
+        months = tuple(sorted(self.months))
+        if months != tuple(sorted(loaded_months)) and TIME_STR in data.dims:
+            selection = (key, months)
+            if selection not in shared:
+                inds = time_index(data[TIME_STR]).select(months)
+                shared[selection] = data.isel(**{TIME_STR: inds})
+            data = shared[selection]
+        return data
+
+    @staticmethod
+    def _time_reduction(dtype_out_time):
+        """Returns the time reduction of a dtype_out_time, e.g. 'av' for
+        both 'av' and the regional 'reg.av'.
+        """
+        if dtype_out_time.startswith(REGIONAL_PREFIX):
+            return dtype_out_time[len(REGIONAL_PREFIX):]
+        return dtype_out_time
+
+    def _regions(self):
+        """Returns the regions of regional reductions: the Calc's region if
+        it has one, else all regions of its project.
+        """
+        if self.region:
+            return [self.region]
+        return sorted(self.proj.regions.values(), key=lambda r: r.name)
+
+    def _grid_field(self, name):
+        """Returns a (lat, lon) field from the model's grid files, or None
+        if none of them holds it.
+        """
+        for path in self.model.grid_file_paths:
+            with dataset_pool.dataset(path) as ds, hdf5_locked([path]):
+                if name in ds:
+                    return ds[name].copy(deep=False).load()
+        return None
+
+    def _regional_averages(self, data):
+        """Averages data over the Calc's regions, weighted by the cell
+        areas and land fractions of the model's grid files if available.
+        """
+        regions = self._regions()
+        land_mask = None
+        if any(region.do_land_mask for region in regions):
+            land_mask = self._grid_field('land_mask')
+        area = self._grid_field('area')
+        return regional_averages(
+            data, regions,
+            area=None if area is None else area.values,
+            land_mask=None if land_mask is None else land_mask.values
+        )
+
+    def _load_output(self, path):
+        """Loads an output array written by _save_output."""
+        with hdf5_locked([path]):
+            ds = xray.open_dataset(path)
+            try:
+                return ds[self.name].load()
+            finally:
+                ds.close()
+
+    def _load_stats(self):
+        """Loads the running statistics written next to the output."""
+        with hdf5_locked([self.path_stats]):
+            ds = xray.open_dataset(self.path_stats)
+            try:
+                return ds.load()
+            finally:
+                ds.close()
+
+    def _cached_record(self, backend):
+        """Returns the backend's metadata of this Calc if it has a record of
+        it computed (with a compute time) and the output file exists,
+        otherwise None.
+
+        Whether its inputs changed since is checked by ``_cached_records``.
+        """
+        if backend is None:
+            return None
+        record = backend.get_metadata(self)
+        if (record is None or record.get('compute_time') is None or
+                not os.path.isfile(self.path_scratch)):
+            return None
+        return record
+
+    def _load_cached(self, record):
+        """Loads the Calc's cached output, given its record in the backend
+        (see ``_cached_records``).
+        """
+        self.data_out[self.dtype_out_time] = self._load_output(
+            self.path_scratch
+        )
+        self.compute_time = record['compute_time']
+        cache_stats.record_hit(self.run_str, self.compute_time)
+        self._print_verbose('Loaded cached result:', self.path_scratch)
+
+    def compute(self, backend=None, use_cache=True):
+        """Computes the Calc's output, or loads it if it is already cached.
+
+        The output is cached if the backend has a record of this Calc (with
+        the same hash) computed, the output file exists at ``path_scratch``
+        and its input files have not changed since; see ``_cached_records``.
+        Otherwise the inputs are loaded, the Var's function applied, and the
+        result reduced in time, written to ``path_scratch`` and registered
+        in the backend along with fingerprints of the input files.
+
+        A Calc with several intvl_out or dtype_out_time computes all of its
+        outputs from one pass over the inputs; see ``outputs``.
+
+        Parameters
+        ----------
+        backend : AbstractBackend, optional
+            Defaults to the backend of the Calc or its parents.
+        use_cache : bool
+            Whether to look up a cached result.
+
+        Returns
+        -------
+        DataArray or dict
+            The reduced output, or, with several dtype_out_time, a dict
+            mapping each of them to its reduced output.  With several
+            intvl_out, the dict is keyed by (intvl_out, dtype_out_time).
+        """
+        return compute_all([self], backend=backend, use_cache=use_cache)[0]
+
+    def outputs(self):
+        """Returns a single-output Calc for each pair of intvl_out and
+        dtype_out_time of this Calc, or just this Calc if it has only one.
+
+        Each output has its own file name, path and hash, and so its own
+        record in the backend.  The outputs of the same intvl_out share
+        one ``data_out``.
+        """
+        if len(self.intvls_out) == 1 and len(self.dtypes_out_time) == 1:
+            return [self]
+        outputs = []
+        for intvl_out in self.intvls_out:
+            for dtype_out_time in self.dtypes_out_time:
+                output = copy.copy(self)
+                output.intvl_out = intvl_out
+                output.intvls_out = (intvl_out,)
+                output.months = TimeManager.month_indices(intvl_out)
+                output.dtype_out_time = dtype_out_time
+                output.dtypes_out_time = (dtype_out_time,)
+                output.file_name = output._file_name(dtype_out_time)
+                output.path_scratch = output._path_scratch(dtype_out_time)
+                output.path_stats = output._path_stats(dtype_out_time)
+                output.data_out = self._data_out_intvl[intvl_out]
+                outputs.append(output)
+        return outputs
+
+    def _result(self):
+        """Returns the reduced output(s) of the Calc, as ``compute``."""
+        if len(self.intvls_out) > 1:
+            return {(intvl_out, dtype_out_time):
+                    self._data_out_intvl[intvl_out][dtype_out_time]
+                    for intvl_out in self.intvls_out
+                    for dtype_out_time in self.dtypes_out_time}
+        if len(self.dtypes_out_time) == 1:
+            return self.data_out[self.dtype_out_time]
+        return {dtype_out_time: self.data_out[dtype_out_time]
+                for dtype_out_time in self.dtypes_out_time}
+
+    def _save_output(self, reduced, paths, compute_time, writer):
+        """Starts writing the Calc's reduced output to ``path_scratch``.
+
+        The output is kept with the precision it is written with, so that
+        it is the same whether computed or loaded from the cache.
+
+        Parameters
+        ----------
+        reduced : DataArray
+            Output reduced in time.
+        paths : sequence of str
+            Input files the output was derived from.
+        compute_time : float
+            Time it took to compute the output.
+        writer : OutputWriter
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of the (bytes_written, write_time) of the output file.
+        """
+        self._input_paths = list(paths)
+        reduced.name = self.name
+        reduced = writer.prepare(reduced)
+        self.data_out[self.dtype_out_time] = reduced
+        self.compute_time = compute_time
+        return writer.submit(reduced, self.path_scratch)
+
+    def input_fingerprints(self):
+        """Returns fingerprints of the input files read by the last
+        computation of this Calc.
+        """
+        return [fingerprint(path) for path in getattr(self, '_input_paths',
+                                                      ())]
+
     def _print_verbose(self, *args):
         """Print diagnostic message."""
         if not self.verbose:
@@ -174,7 +745,9 @@ class Calc(object):
         self._print_verbose('Initializing Calc instance:', self.__str__())
 
         if isinstance(calc_interface.ens_mem, int):
-            self.data_in_direc = self.data_in_direc[calc_interface.ens_mem]
+            self.data_in_direc = (
+                self._data_in_attr('data_in_direc')[calc_interface.ens_mem],
+            )
 
         self.dt_set = False
 
@@ -182,6 +755,354 @@ class Calc(object):
         self.dir_archive = self._dir_archive()
         self.file_name = self._file_name(self.dtype_out_time)
         self.path_scratch = self._path_scratch(self.dtype_out_time)
+        self.path_stats = self._path_stats(self.dtype_out_time)
         self.path_archive = self._path_archive()
 
         self.data_out = {}
+        # Outputs of each intvl_out, keyed by dtype_out_time
+        self._data_out_intvl = {intvl_out: {} for intvl_out in self.intvls_out}
+        self._data_out_intvl[self.intvl_out] = self.data_out
+        # Months of input data loaded, if more than the Calc's own months
+        self._load_months = None
+
+        for output in self.outputs():
+            register(output)
+
+
+def compute_all(calcs, backend=None, use_cache=True, prefetch_depth=1,
+                max_prefetch_bytes=None):
+    """Computes a batch of Calcs, loading or deriving each variable they
+    share only once.
+
+    The Calcs' variables are loaded and derived one time chunk at a time,
+    each chunk of a variable's data feeding the time reductions of every
+    Calc (and every dtype_out_time of a multi-output Calc) that uses it.
+    The outputs are then written and registered as by ``Calc.compute``.
+    See ``dag.Plan``.
+
+    The running statistics of each output are written next to it (see
+    ``reductions.Accumulator.state``).  A Calc over whole years that is not
+    cached, e.g. after its run was extended, starts from the stored
+    statistics of the up-to-date result over the most years within its date
+    range, and only loads the data of the remaining years.
+
+    Parameters
+    ----------
+    calcs : sequence of Calc
+    backend : AbstractBackend, optional
+        Backend to look up cached results in and register results with.
+        Defaults to the backend of each Calc or its parents.
+    use_cache : bool
+        Whether to load cached results rather than computing them.
+    prefetch_depth, max_prefetch_bytes : int, optional
+        Number of time chunks, and bytes of data, to load ahead while the
+        current chunk is reduced; see ``reader.BlockReader``.
+
+    Returns
+    -------
+    list
+        The output of each Calc, as returned by ``Calc.compute``.
+    """
+    outputs = [output for calc in calcs for output in calc.outputs()]
+    backends = {}
+    for calc in outputs:
+        backends[calc] = backend if backend is not None else get_backend(calc)
+    if use_cache:
+        _restore_archived(outputs, backends)
+    cached = _cached_records(outputs, backends) if use_cache else {}
+    to_compute = []
+    for calc in outputs:
+        if calc in cached:
+            calc._load_cached(cached[calc])
+        else:
+            to_compute.append(calc)
+
+    bases = _stored_bases(to_compute, backends) if use_cache else {}
+    _compute_and_save_all(to_compute, prefetch_depth, max_prefetch_bytes,
+                          bases)
+    records = {}
+    for calc in to_compute:
+        cache_stats.record_miss(calc.run_str)
+        if backends[calc] is not None and calc.track():
+            records.setdefault(backends[calc], []).append(
+                (calc, calc.input_fingerprints())
+            )
+    for calc_backend, calc_fingerprints in records.items():
+        calc_backend.set_all_input_fingerprints(calc_fingerprints)
+    return [calc._result() for calc in calcs]
+
+
+def _cached_records(calcs, backends, stat_cache=None):
+    """Returns the records of the Calcs whose cached output can be reused.
+
+    The output of a Calc is reused if the backend has a record of it
+    computed, its output file exists, and its inputs still match the
+    fingerprints stored when it was computed (see
+    ``provenance.stale_calcs``).  The inputs of the Calcs of each backend
+    are checked at once.
+
+    Returns
+    -------
+    dict
+        Maps each Calc with a reusable output to its record.
+    """
+    if stat_cache is None:
+        stat_cache = StatCache()
+    candidates = OrderedDict()
+    for calc in calcs:
+        record = calc._cached_record(backends[calc])
+        if record is not None:
+            candidates.setdefault(backends[calc], OrderedDict())[calc] = record
+    cached = {}
+    for backend, records in candidates.items():
+        stale = set(map(id, stale_calcs(list(records), backend,
+                                        stat_cache=stat_cache)))
+        cached.update((calc, record) for calc, record in records.items()
+                      if id(calc) not in stale)
+    return cached
+
+
+def archive_all(calcs, backend=None):
+    """Appends the output files of Calcs to their runs' archives.
+
+    The files are appended to each ``path_archive`` in one write, without
+    rewriting the members already archived; see ``tar_index.TarIndex``.
+    Processes archiving to the same archive append one after the other.
+    Outputs not yet written to ``path_scratch`` are skipped.
+
+    Parameters
+    ----------
+    calcs : sequence of Calc
+    backend : AbstractBackend, optional
+        Backend to store the archives' indexes in.  Defaults to the backend
+        of each Calc or its parents.
+    """
+    files = OrderedDict()
+    backends = {}
+    for calc in calcs:
+        for output in calc.outputs():
+            if not os.path.isfile(output.path_scratch):
+                continue
+            files.setdefault(output.path_archive, OrderedDict())[
+                output.file_name] = output.path_scratch
+            backends.setdefault(output.path_archive, backend if backend
+                                is not None else get_backend(output))
+    for path, members in files.items():
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        append_files(path, list(members.items()), backends[path])
+
+
+def _restore_archived(calcs, backends):
+    """Extracts the archived outputs of Calcs that the backend has a record
+    of but whose output files are missing from scratch.
+
+    The members of each archive are read in one pass in offset order.
+    """
+    targets = OrderedDict()
+    for calc in calcs:
+        backend = backends[calc]
+        if (backend is None or os.path.isfile(calc.path_scratch) or
+                not os.path.isfile(calc.path_archive)):
+            continue
+        index = tar_index(calc.path_archive, backend)
+        if (calc.file_name in index and
+                backend.get_metadata(calc) is not None):
+            targets.setdefault(index, {})[calc.file_name] = calc.path_scratch
+    for index, members in targets.items():
+        index.extract(members)
+
+
+def _stored_bases(calcs, backends):
+    """Returns the stored results that Calcs can be extended from.
+
+    The base of a tracked Calc over whole years is the up-to-date Calc (see
+    ``provenance.stale_calcs``) over the most whole years within its date
+    range whose running statistics are stored next to its output, found by
+    parsing the names of the files in its scratch directory.  The stored
+    fingerprints of each base are checked with one backend query.
+
+    Returns
+    -------
+    dict
+        Maps each Calc with a base to it, with ``_input_paths`` set to the
+        input files the base was computed from.
+    """
+    candidates = OrderedDict()
+    for calc in calcs:
+        if (backends[calc] is None or not calc.track() or
+                not calc._whole_years()):
+            continue
+        try:
+            names = os.listdir(calc.dir_scratch)
+        except OSError:
+            continue
+        model_runs = [(calc.model_str, calc.run_str_full)]
+        labels = _parse_file_name(calc._file_name(calc.dtype_out_time),
+                                  model_runs)
+        if labels is None:
+            continue
+        labels.pop('yr_range')
+        first, last = calc.start_date.year, calc.end_date.year
+        found = []
+        for name in names:
+            if not name.endswith(STATS_EXT):
+                continue
+            stored = _parse_file_name(name[:-len(STATS_EXT)] + '.nc',
+                                      model_runs)
+            if stored is None:
+                continue
+            start, end = stored.pop('yr_range')
+            if stored != labels or start < first or end > last:
+                continue
+            base = calc._with_years(start, end)
+            if os.path.basename(base.path_stats) == name:
+                found.append(base)
+        if found:
+            found.sort(key=lambda base: (base.start_date.year -
+                                         base.end_date.year))
+            candidates[calc] = found
+
+    by_backend = OrderedDict()
+    for calc, found in candidates.items():
+        by_backend.setdefault(backends[calc], []).extend(found)
+    up_to_date = set()
+    fingerprints = {}
+    for backend, found in by_backend.items():
+        stale = set(map(id, stale_calcs(found, backend)))
+        fresh = [base for base in found if id(base) not in stale]
+        up_to_date.update(map(id, fresh))
+        fingerprints.update(backend.get_input_fingerprints(fresh))
+
+    bases = {}
+    for calc, found in candidates.items():
+        for base in found:
+            if id(base) in up_to_date:
+                base._input_paths = [fp[0] for fp in
+                                     fingerprints.get(hash(base), ())]
+                bases[calc] = base
+                break
+    return bases
+
+
+def _compute_and_save_all(calcs, prefetch_depth=1, max_prefetch_bytes=None,
+                          bases=None):
+    """Computes Calcs and writes their outputs and running statistics,
+    without consulting or updating any backend.
+
+    The Calcs' inputs are processed one time chunk at a time (see
+    ``Calc._time_chunks``), each through one dependency graph, and reduced
+    into running statistics, so that only the data of the current chunk,
+    and of the next ``prefetch_depth`` chunks being loaded, is held at once.
+    The statistics of a Calc with a base in ``bases`` (see
+    ``_stored_bases``) start from those stored for its base, and the years
+    of the base are not loaded.
+    """
+    bases = bases or {}
+    accumulators = {}
+    paths = {}
+    compute_times = {}
+    chunks = OrderedDict()
+    for calc in calcs:
+        accumulators[calc] = accumulator(
+            calc._time_reduction(calc.dtype_out_time)
+        )
+        paths[calc] = set()
+        compute_times[calc] = 0.
+        base = bases.get(calc)
+        exclude = None
+        if base is not None:
+            accumulators[calc].merge_state(base._load_stats())
+            paths[calc].update(base._input_paths)
+            exclude = (base.start_date, base._stop_date())
+            calc._print_verbose('Extending stored result:', base.path_stats)
+        for bounds in calc._time_chunks(exclude):
+            chunks.setdefault(bounds, []).append(calc)
+
+    plans = []
+    for (start_date, stop_date), chunk_calcs in chunks.items():
+        # Calcs selecting the same inputs but different months, e.g. of
+        # different intvl_out, load the union of their months once
+        months = {}
+        for calc in chunk_calcs:
+            months.setdefault(calc._input_selection(), set()).update(
+                calc.months
+            )
+        views = [calc._chunk(start_date, stop_date,
+                             months[calc._input_selection()])
+                 for calc in chunk_calcs]
+        plans.append((Plan(views), dict(zip(map(id, views), chunk_calcs))))
+
+    # The input files of each chunk are staged, and its variables loaded,
+    # while the previous chunk is reduced
+    if plans:
+        _prefetch(plans[0][0])
+    reader = BlockReader([plan for plan, _ in plans], prefetch_depth,
+                         max_prefetch_bytes)
+    for i, (plan, load) in enumerate(reader):
+        calc_of_view = plans[i][1]
+        if i + 1 < len(plans):
+            _prefetch(plans[i + 1][0])
+
+        # The Calcs using the same data are called back in a row, so that
+        # its regional averages and month selections, e.g. for both 'reg.av'
+        # and 'reg.std' outputs, are computed once
+        shared = {'data': None}
+
+        def accumulate(view, data, view_paths, eval_time):
+            start = time.time()
+            calc = calc_of_view[id(view)]
+            if shared['data'] is not data:
+                shared.clear()
+                shared['data'] = data
+            accumulators[calc].add(
+                calc._output_data(data, view._loaded_months(), shared)
+            )
+            paths[calc].update(view_paths)
+            compute_times[calc] += eval_time + time.time() - start
+
+        plan.execute(accumulate, load)
+
+    # Each output is written in the background while the next is reduced.
+    # The running statistics are kept at full precision.
+    default_writer = None
+    writes = []
+    stats_writes = []
+    try:
+        for calc in calcs:
+            writer = calc.writer
+            if writer is None:
+                if default_writer is None:
+                    default_writer = OutputWriter()
+                writer = default_writer
+            start = time.time()
+            reduced = accumulators[calc].result()
+            writes.append((calc, calc._save_output(
+                reduced, sorted(paths[calc]),
+                compute_times[calc] + time.time() - start, writer
+            )))
+            stats_writes.append(writer.submit(accumulators[calc].state(),
+                                              calc.path_stats))
+        for write in stats_writes:
+            write.result()
+        for calc, write in writes:
+            calc.bytes_written, calc.write_time = write.result()
+            calc._print_verbose('Computed {} in {:.1f} s:'.format(
+                calc.name, calc.compute_time), calc.path_scratch)
+    finally:
+        if default_writer is not None:
+            default_writer.shutdown()
+
+
+def _prefetch(plan):
+    """Starts staging the input files of the variables a Plan loads, for
+    the Calcs with a stager.
+    """
+    for node in plan.nodes:
+        if not node.inputs and node.calc.stager is not None:
+            node.calc.stager.prefetch(
+                node.calc._get_input_data_paths(node.var)
+            )
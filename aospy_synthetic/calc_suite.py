@@ -0,0 +1,379 @@
+"""calc_suite.py: run many Calcs in parallel over a pool of processes.
+
+A ``CalcSuite`` expands every combination of models, runs, variables,
+regions, output intervals and output time reductions into a Calc.  Workers
+receive a compact ``CalcSpec`` naming the objects of each Calc rather than a
+pickled copy of the whole project (Var functions are usually lambdas, which
+cannot be pickled anyway); the project, variables and regions are inherited
+by the forked workers, which rebuild each Calc from its spec, compute it and
+write its output.  Calcs that select the same input data are computed in
+the same task, so that the variables they share are loaded or derived once
+(see ``dag``).  Workers never touch the backend: the parent collects the
+timings and input file fingerprints they return and writes them to the
+backend in bulk.
+"""
+from __future__ import print_function
+import itertools
+import os
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .calc import (Calc, CalcInterface, _cached_records,
+                   _compute_and_save_all, cache_stats)
+from .db.registry import get_backend, get_registry
+
+try:
+    from multiprocessing import get_context
+except ImportError:
+    # Python 2 always forks worker processes
+    get_context = None
+
+
+class CalcSpec(namedtuple('CalcSpec', [
+        'model', 'run', 'ens_mem', 'var', 'region', 'date_range', 'intvl_in',
+        'intvl_out', 'dtype_in_time', 'dtype_in_vert', 'dtype_out_time',
+        'dtype_out_vert', 'level'])):
+    """Names and labels identifying a Calc within a project."""
+    __slots__ = ()
+
+
+class CalcResult(namedtuple('CalcResult',
+                            ['calc', 'compute_time', 'cached', 'error'])):
+    """Outcome of running one Calc of a CalcSuite.
+
+    ``compute_time`` is the time taken to compute it in a worker, or, if it
+    was cached, the time it took when it was computed.  ``error`` is the
+    exception raised while computing it, if any.
+    """
+    __slots__ = ()
+
+
+# Objects needed to rebuild Calcs from their specs.  Set in the parent
+# before the pool's processes are forked, so that workers inherit them; they
+# cannot be pickled, so the workers must be forked (see _process_pool).
+_worker_context = None
+
+
+def _format_date(date):
+    return '{:04d}-{:02d}-{:02d}'.format(date.year, date.month, date.day)
+
+
+def _as_tuple(obj):
+    if isinstance(obj, (list, tuple)):
+        return tuple(obj)
+    return (obj,)
+
+
+def calc_from_spec(spec, proj, variables, regions, dir_scratch=None):
+    """Builds the Calc described by a CalcSpec.
+
+    Parameters
+    ----------
+    spec : CalcSpec
+    proj : Proj
+        Project holding the spec's model and run.
+    variables : dict
+        Maps variable names to Var objects.
+    regions : dict
+        Maps region names to Region objects.
+    dir_scratch : str, optional
+        Directory to write the output to instead of the Calc's scratch
+        directory.
+
+    Returns
+    -------
+    Calc
+        The Calc is not registered with any backend.
+    """
+    model = proj.models[spec.model]
+    calc = Calc(CalcInterface(
+        proj=proj, model=model, run=model.runs[spec.run],
+        ens_mem=spec.ens_mem, var=variables[spec.var],
+        date_range=spec.date_range,
+        region=regions[spec.region] if spec.region else None,
+        intvl_in=spec.intvl_in, intvl_out=spec.intvl_out,
+        dtype_in_time=spec.dtype_in_time, dtype_in_vert=spec.dtype_in_vert,
+        dtype_out_time=spec.dtype_out_time,
+        dtype_out_vert=spec.dtype_out_vert, level=spec.level, verbose=False
+    ))
+    # Tracking records are written in bulk by CalcSuite.run
+    get_registry().discard(calc)
+    if dir_scratch is not None:
+        calc.dir_scratch = dir_scratch
+        calc.path_scratch = os.path.join(dir_scratch, calc.file_name)
+    return calc
+
+
+def _input_key(spec):
+    """Returns the part of a spec that determines the input data its Calc
+    selects; Calcs with equal keys can share variables (see ``dag``).
+
+    The intvl_out is left out, since Calcs of different intvl_out load the
+    union of their months once, and so is the region, since Calcs of
+    different regions average the same data, and write it to files labelled
+    with their region (see ``Calc._file_name``).
+    """
+    return (spec.model, spec.run, spec.ens_mem, spec.date_range,
+            spec.intvl_in, spec.dtype_in_time, spec.dtype_in_vert)
+
+
+def _compute_specs(indices, specs):
+    """Computes the Calcs of some specs in a worker process, loading or
+    deriving the variables they share once.
+
+    If the Calcs cannot be computed together, they are computed one by one
+    so that only the failing Calcs fail.
+
+    Returns
+    -------
+    list of tuple
+        (index, compute_time, fingerprints, error, write_stats) of each
+        spec, with the fingerprints of the input files read as tuples and
+        the (bytes_written, write_time) of the output file.
+    """
+    try:
+        calcs = [calc_from_spec(spec, *_worker_context) for spec in specs]
+        _compute_and_save_all(calcs)
+    except Exception as e:
+        if len(specs) == 1:
+            return [(indices[0], None, [], e, None)]
+        return [result for index, spec in zip(indices, specs)
+                for result in _compute_specs([index], [spec])]
+    return [(index, calc.compute_time,
+             [tuple(fp) for fp in calc.input_fingerprints()], None,
+             (calc.bytes_written, calc.write_time))
+            for index, calc in zip(indices, calcs)]
+
+
+def _process_pool(max_workers):
+    """Returns a pool of worker processes forked from this one, which so
+    inherit ``_worker_context``, whatever the default start method.
+    """
+    if get_context is not None:
+        try:
+            return ProcessPoolExecutor(max_workers=max_workers,
+                                       mp_context=get_context('fork'))
+        except TypeError:
+            # Before Python 3.7, pools use the default start method, which
+            # forks on POSIX
+            pass
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+class CalcSuite(object):
+    """All combinations of a set of Calc parameters, computed in parallel.
+
+    Parameters
+    ----------
+    proj : Proj
+        Project to compute Calcs of.
+    variables : sequence of Var
+    models : sequence of str, optional
+        Names of the models.  Defaults to all models of the project.
+    runs : sequence of str, optional
+        Names of the runs.  Defaults to all runs of each model; models
+        lacking a named run are skipped.
+    regions : sequence of Region, optional
+        Regions; by default Calcs have no region.
+    intvl_out, dtype_out_time : str or sequence of str
+    date_range : tuple of str, optional
+        (start, end) dates as 'YYYY-MM-DD'.  Defaults to each run's
+        default date range.
+    intvl_in, dtype_in_time, dtype_in_vert, dtype_out_vert, level, ens_mem
+        Passed to every CalcInterface.
+    dir_scratch : str, optional
+        Directory to write all outputs to instead of each Calc's scratch
+        directory.
+    verbose : bool
+        Whether to print the time taken by each Calc.
+    """
+    def __init__(self, proj, variables, models=None, runs=None,
+                 regions=(None,), intvl_out='ann', dtype_out_time='avg',
+                 date_range=None, intvl_in='monthly', dtype_in_time='ts',
+                 dtype_in_vert=False, dtype_out_vert=False, level=False,
+                 ens_mem=None, dir_scratch=None, verbose=True):
+        self.proj = proj
+        self.variables = {var.name: var for var in variables}
+        self.regions = {region.name: region for region in regions if region}
+        self.dir_scratch = dir_scratch
+        self.verbose = verbose
+
+        if models is None:
+            models = sorted(proj.models)
+        self.specs = []
+        for model_name in models:
+            model = proj.models[model_name]
+            run_names = sorted(model.runs) if runs is None else runs
+            for run_name in run_names:
+                if run_name not in model.runs:
+                    continue
+                run = model.runs[run_name]
+                if date_range is None:
+                    run_date_range = tuple(_format_date(d) for d
+                                           in run.default_date_range)
+                else:
+                    run_date_range = tuple(date_range)
+                for var, region, intvl, dtype in itertools.product(
+                        variables, regions, _as_tuple(intvl_out),
+                        _as_tuple(dtype_out_time)):
+                    self.specs.append(CalcSpec(
+                        model=model_name, run=run_name, ens_mem=ens_mem,
+                        var=var.name,
+                        region=region.name if region else None,
+                        date_range=run_date_range, intvl_in=intvl_in,
+                        intvl_out=intvl, dtype_in_time=dtype_in_time,
+                        dtype_in_vert=dtype_in_vert, dtype_out_time=dtype,
+                        dtype_out_vert=dtype_out_vert, level=level
+                    ))
+        self.calcs = [self._calc(spec) for spec in self.specs]
+        self.results = []
+        self.wall_time = 0.
+        self._num_done = 0
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __str__(self):
+        return 'CalcSuite of {} Calcs in {}'.format(len(self), self.proj)
+
+    __repr__ = __str__
+
+    def _calc(self, spec):
+        return calc_from_spec(spec, self.proj, self.variables, self.regions,
+                              self.dir_scratch)
+
+    def _print_verbose(self, result):
+        self._num_done += 1
+        if not self.verbose:
+            return
+        if result.error is not None:
+            status = 'failed: {!r}'.format(result.error)
+        else:
+            status = '{:.2f} s{}'.format(
+                result.compute_time or 0., ' (cached)' if result.cached
+                else '')
+        print('[{}/{}] {}: {}'.format(self._num_done, len(self),
+                                      result.calc.file_name, status))
+
+    def _write_records(self, backend, computed):
+        """Writes the tracking records of computed Calcs in one batch."""
+        records = [(calc, fingerprints) for calc, fingerprints in computed
+                   if calc.track()]
+        if backend is not None and records:
+            backend.set_all_input_fingerprints(records)
+
+    def run(self, max_workers=None, backend=None, use_cache=True,
+            share_inputs=True, batch_size=100):
+        """Computes the suite's Calcs, skipping those already cached.
+
+        A Calc is cached if its output was computed from its current input
+        files; see ``calc._cached_records``.  Workers are forked from this
+        process, so they are not available where processes can only be
+        spawned (e.g. Windows).
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            Number of worker processes.  Defaults to the number of CPUs.  If
+            1, the Calcs are computed serially in this process.
+        backend : AbstractBackend, optional
+            Backend to look up cached results in and write tracking records
+            to.  Defaults to the backend of the project.
+        use_cache : bool
+            Whether to skip Calcs whose output is cached.
+        share_inputs : bool
+            Whether to compute Calcs that select the same input data in the
+            same task, loading or deriving the variables they share once.
+            Fewer, larger tasks are then spread over the workers.
+        batch_size : int
+            Number of computed Calcs whose records are written to the
+            backend per transaction.
+
+        Returns
+        -------
+        list of CalcResult
+            In the order of ``self.calcs``.
+        """
+        global _worker_context
+        if backend is None:
+            backend = get_backend(self.proj)
+
+        results = [None] * len(self)
+        self._num_done = 0
+        cached = (_cached_records(self.calcs, {calc: backend for calc
+                                               in self.calcs})
+                  if use_cache else {})
+        groups = OrderedDict()
+        for index, calc in enumerate(self.calcs):
+            record = cached.get(calc)
+            if record is None:
+                key = _input_key(self.specs[index]) if share_inputs else index
+                groups.setdefault(key, []).append(index)
+                continue
+            calc.compute_time = record['compute_time']
+            cache_stats.record_hit(calc.run_str, calc.compute_time)
+            results[index] = CalcResult(calc, calc.compute_time, True, None)
+            self._print_verbose(results[index])
+
+        computed = []
+
+        def finish(index, compute_time=None, fingerprints=(), error=None,
+                   write_stats=None):
+            calc = self.calcs[index]
+            if error is None:
+                calc.compute_time = compute_time
+                calc.bytes_written, calc.write_time = write_stats
+                cache_stats.record_miss(calc.run_str)
+                computed.append((calc, fingerprints))
+            results[index] = CalcResult(calc, compute_time, False, error)
+            self._print_verbose(results[index])
+            if len(computed) >= batch_size:
+                self._write_records(backend, computed)
+                del computed[:]
+
+        start = time.time()
+        _worker_context = (self.proj, self.variables, self.regions,
+                           self.dir_scratch)
+        try:
+            if max_workers == 1:
+                for indices in groups.values():
+                    for result in _compute_specs(
+                            indices, [self.specs[i] for i in indices]):
+                        finish(*result)
+            elif groups:
+                with _process_pool(max_workers) as pool:
+                    futures = {
+                        pool.submit(_compute_specs, indices,
+                                    [self.specs[i] for i in indices]): indices
+                        for indices in groups.values()
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            group_results = future.result()
+                        except Exception as e:
+                            group_results = [(index, None, [], e, None)
+                                             for index in futures[future]]
+                        for result in group_results:
+                            finish(*result)
+        finally:
+            _worker_context = None
+        self._write_records(backend, computed)
+        self.wall_time = time.time() - start
+
+        self.results = results
+        if self.verbose:
+            print(self.report())
+        return results
+
+    def report(self):
+        """Summarizes the last run of the suite."""
+        computed = [r for r in self.results if not r.cached and
+                    r.error is None]
+        return ('{}: {} computed, {} cached, {} failed; {:.1f} s of '
+                'computation in {:.1f} s'.format(
+                    self, len(computed),
+                    sum(1 for r in self.results if r.cached),
+                    sum(1 for r in self.results if r.error is not None),
+                    sum(r.compute_time for r in computed),
+                    self.wall_time))
@@ -0,0 +1,151 @@
+"""coverage.py: the years of each run already computed for each variable.
+
+When a run is extended, or a sweep resumed, the Calcs worth computing are
+those over years not yet covered by a result.  ``covered_years`` reads the
+date ranges of all computed Calcs in a backend with one query and merges
+them into the ranges of whole years covered for each ``CoverageKey``: Calcs
+of the same model, run, ensemble member, variable, region, input data and
+output interval.  ``missing_years`` lists the gaps of a Calc's key in a given
+range.  Calcs over a range extending a covered one only compute the
+missing years; see ``calc.compute_all``.
+"""
+from collections import namedtuple
+
+from .db.registry import get_backend
+from .io import _parse_file_name
+
+
+class CoverageKey(namedtuple('CoverageKey', [
+        'model', 'run', 'ens_mem', 'var', 'region', 'intvl_in',
+        'dtype_in_time', 'dtype_in_vert', 'dtype_out_vert', 'intvl_out'])):
+    """Calcs whose years covered are merged, differing only in their date
+    range and time reduction.
+
+    The model, run, var and region are names; the other labels are as parsed
+    from the Calcs' file names (see ``io._parse_file_name``).
+    """
+    __slots__ = ()
+
+
+def _years(start_date, end_date):
+    """Returns the first and last whole years between two dates, or None
+    if there are none.
+    """
+    first = start_date.year + ((start_date.month, start_date.day) != (1, 1))
+    last = end_date.year - ((end_date.month, end_date.day) != (12, 31))
+    if first > last:
+        return None
+    return first, last
+
+
+def _merge(ranges):
+    """Merges overlapping or adjacent (first, last) year ranges."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _name(obj):
+    return getattr(obj, 'name', obj)
+
+
+def _key(model, run, var, region, intvl_out, labels):
+    return CoverageKey(model, run, labels['ens_mem'], var, region,
+                       labels['intvl_in'], labels['dtype_in_time'],
+                       labels['dtype_in_vert'], labels['dtype_out_vert'],
+                       intvl_out)
+
+
+def coverage_key(calc):
+    """Returns the CoverageKey of a Calc."""
+    labels = _parse_file_name(calc._file_name(calc.dtype_out_time),
+                              [(calc.model_str, calc.run_str_full)])
+    return _key(calc.model.name, calc.run.name, calc.var.name,
+                _name(calc.region) or None, calc.intvl_out, labels)
+
+
+def covered_years(backend, run=None, var=None, intvl_out=None,
+                  dtype_out_time=None, model=None):
+    """Returns the years covered by the Calcs in a backend that have been
+    computed; Calcs only registered, without a compute time, cover none.
+
+    Parameters
+    ----------
+    backend : AbstractBackend
+    run, var, model : Run or Var or Model or str, optional
+        Only the Calcs of this run, variable or model (or name of one).
+    intvl_out, dtype_out_time : str, optional
+        Only the Calcs of this output interval or time reduction.
+
+    Returns
+    -------
+    dict
+        Maps the CoverageKey of the Calcs to the sorted list of disjoint
+        (first, last) ranges of the whole years they span.
+    """
+    run, var, model = _name(run), _name(var), _name(model)
+    ranges = {}
+    for (model_name, run_name, var_name, region_name, calc_intvl_out,
+         calc_dtype_out_time, start_date, end_date,
+         file_name) in backend.get_calc_date_ranges(computed=True):
+        if ((model is not None and model_name != model) or
+                (run is not None and run_name != run) or
+                (var is not None and var_name != var) or
+                (intvl_out is not None and calc_intvl_out != intvl_out) or
+                (dtype_out_time is not None and
+                 calc_dtype_out_time != dtype_out_time) or
+                start_date is None or end_date is None or
+                file_name is None):
+            continue
+        labels = _parse_file_name(file_name)
+        years = _years(start_date, end_date)
+        if labels is None or years is None:
+            continue
+        key = _key(model_name, run_name, var_name, region_name,
+                   calc_intvl_out, labels)
+        ranges.setdefault(key, []).append(years)
+    return {key: _merge(years) for key, years in ranges.items()}
+
+
+def missing_years(calc, start_year, end_year, dtype_out_time=None,
+                  backend=None):
+    """Returns the years of a range not covered by any Calc with the same
+    CoverageKey as a Calc.
+
+    Parameters
+    ----------
+    calc : Calc
+    start_year, end_year : int
+        First and last year of the range.
+    dtype_out_time : str, optional
+        Only count the Calcs of this time reduction.
+    backend : AbstractBackend, optional
+        Defaults to the backend of the Calc or its parents.
+
+    Returns
+    -------
+    list of (int, int)
+        Sorted (first, last) ranges of the missing years.
+    """
+    if backend is None:
+        backend = get_backend(calc)
+    covered = covered_years(backend, calc.run, calc.var, calc.intvl_out,
+                            dtype_out_time, calc.model).get(
+        coverage_key(calc), [])
+    gaps = []
+    year = start_year
+    for first, last in covered:
+        if last < year:
+            continue
+        if first > end_year:
+            break
+        if first > year:
+            gaps.append((year, first - 1))
+        year = last + 1
+    if year <= end_year:
+        gaps.append((year, end_year))
+    return gaps
@@ -0,0 +1,187 @@
+"""dag.py: evaluate the variables of many Calcs as one dependency graph.
+
+A Var with a function depends on the Vars in its ``variables``, which may
+themselves have functions.  ``Plan`` resolves these dependencies recursively
+for every Calc of a batch into a directed acyclic graph whose nodes are
+(Var, input data selection) pairs, so that a Var needed by several Calcs, or
+several times by one Calc, is loaded or derived only once.  Each node's
+result is held only until the last node or Calc that consumes it has been
+evaluated.
+
+Only dependencies declared through ``Var.variables`` can be shared: a Var
+function that calls another function directly recomputes it.
+
+The Var of a Calc averaging over ensemble members (``ens_mem='avg'``) is a
+single node, loaded like a Var read from disk: the Var is loaded or derived
+for each member in turn and averaged as it goes (see ``ensemble``).
+"""
+import time
+
+
+def node_key(var, calc):
+    """Returns the key identifying a Var's data as selected by a Calc.
+
+    Calcs that differ only in their output reduction, region or vertical
+    output type select the same input data and so share nodes.  So do
+    Calcs of different output intervals once they are set to load the
+    union of their months (see ``Calc._chunk``).
+    """
+    return (var, calc.run, calc.ens_mem, calc.start_date, calc.end_date,
+            calc._loaded_months(), calc.intvl_in, calc.dtype_in_time,
+            calc.dtype_in_vert)
+
+
+def _is_derived(var):
+    return bool(getattr(var, 'variables', False))
+
+
+def loaded_vars(var):
+    """Returns the Vars loaded from disk that a Var is derived from, or just
+    the Var if it is loaded itself.
+    """
+    if not _is_derived(var):
+        return [var]
+    found = []
+    for input_var in var.variables:
+        for loaded in loaded_vars(input_var):
+            if loaded not in found:
+                found.append(loaded)
+    return found
+
+
+class Node(object):
+    """A Var whose data is loaded from disk or derived from other nodes.
+
+    Attributes
+    ----------
+    var : Var
+    calc : Calc
+        First Calc that needs the node; used to locate input files.
+    inputs : list of Node
+        Nodes the Var's function is applied to; empty for loaded Vars.
+    num_consumers : int
+        Number of nodes and Calcs that use this node's data.
+    paths : set
+        Input files the node's data is derived from, filled in once it is
+        evaluated.
+    eval_time : float
+        Time taken to evaluate the node alone, excluding its inputs.
+    """
+    def __init__(self, var, calc, inputs):
+        self.var = var
+        self.calc = calc
+        self.inputs = inputs
+        self.num_consumers = 0
+        self.paths = set()
+        self.eval_time = 0.
+
+    def __str__(self):
+        return 'Node "{}" of {}'.format(self.var.name, self.calc.run)
+
+    __repr__ = __str__
+
+    def evaluate(self, values):
+        """Loads or derives the node's data, given the data of its inputs."""
+        start = time.time()
+        if self.inputs:
+            data = self.var.func(*[values[node] for node in self.inputs])
+            for node in self.inputs:
+                self.paths.update(node.paths)
+        else:
+            data = self.calc._load_var(self.var)
+            self.paths.update(self.calc._get_input_data_paths(self.var))
+        self.eval_time = time.time() - start
+        return data
+
+    def closure(self):
+        """Returns this node and all nodes it depends on."""
+        nodes = {self}
+        for node in self.inputs:
+            nodes.update(node.closure())
+        return nodes
+
+
+class Plan(object):
+    """Dependency graph of the variables of a batch of Calcs.
+
+    Parameters
+    ----------
+    calcs : sequence of Calc
+
+    Attributes
+    ----------
+    nodes : list of Node
+        Unique nodes, in an order in which each node follows its inputs and
+        the nodes of each Calc are evaluated as closely together as
+        possible.
+    roots : list of Node
+        Node of each Calc's Var.
+    """
+    def __init__(self, calcs):
+        self.calcs = list(calcs)
+        self.nodes = []
+        self._nodes = {}
+        self.roots = [self._node(calc.var, calc) for calc in self.calcs]
+        for root in self.roots:
+            root.num_consumers += 1
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _node(self, var, calc):
+        key = node_key(var, calc)
+        if key in self._nodes:
+            return self._nodes[key]
+        inputs = []
+        if _is_derived(var) and calc.ens_mem != 'avg':
+            inputs = [self._node(v, calc) for v in var.variables]
+            for node in inputs:
+                node.num_consumers += 1
+        node = Node(var, calc, inputs)
+        self._nodes[key] = node
+        self.nodes.append(node)
+        return node
+
+    def execute(self, callback, load=None):
+        """Evaluates every node once, calling ``callback`` as soon as a
+        Calc's data is available.
+
+        Parameters
+        ----------
+        callback : callable
+            Called as ``callback(calc, data, paths, eval_time)`` for each
+            Calc, where ``paths`` are the input files the data derives from
+            and ``eval_time`` the time it would take to evaluate the Calc's
+            nodes alone.
+        load : callable, optional
+            Called as ``load(node)`` to get the data of each node loaded
+            from disk, which it must have evaluated, e.g. in the background
+            (see ``reader.BlockReader``).  By default the nodes are
+            evaluated in turn.
+        """
+        calcs_of_root = {}
+        for calc, root in zip(self.calcs, self.roots):
+            calcs_of_root.setdefault(root, []).append(calc)
+        remaining = dict((node, node.num_consumers) for node in self.nodes)
+        values = {}
+
+        def release(node):
+            remaining[node] -= 1
+            if not remaining[node]:
+                del values[node]
+
+        for node in self.nodes:
+            if load is not None and not node.inputs:
+                values[node] = load(node)
+            else:
+                values[node] = node.evaluate(values)
+            for input_node in node.inputs:
+                release(input_node)
+            for calc in calcs_of_root.get(node, ()):
+                eval_time = sum(n.eval_time for n in node.closure())
+                callback(calc, values[node], sorted(node.paths), eval_time)
+                release(node)
+
+    def num_loads(self):
+        """Number of variables loaded from disk."""
+        return sum(1 for node in self.nodes if not node.inputs)
@@ -0,0 +1,182 @@
+"""dataset_pool.py: a process-wide pool of open datasets shared by Calcs.
+
+Many Calcs of a sweep read the same files: the input files of a run for
+different variables or seasons, and the grid files of a model.  Opening a
+file means parsing its metadata (and on netCDF4 setting up HDF5), so the
+pool keeps recently used datasets open, keyed by path and open options,
+up to a number of open files, closing the least recently used first.
+Datasets in use are never closed.
+
+netCDF3 files are opened with scipy, if installed, which memory-maps them,
+so that selecting part of a variable, e.g. some months of a multi-year file,
+reads only the pages it spans instead of the whole variable.  Without scipy
+they are opened with xray's default engine.  Files read through
+netCDF4 are opened, and must be read, holding ``io.hdf5_lock``, since HDF5
+is not thread-safe; see ``io.hdf5_locked``.
+"""
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import threading
+
+import xray
+
+from .__config__ import MAX_OPEN_DATASETS
+from .io import _scipy_reads, hdf5_locked
+
+
+class DatasetPool(object):
+    """Least recently used pool of open xray Datasets.
+
+    Datasets are shared, so they must not be modified; copy a variable
+    before loading it in place, e.g. with ``DataArray.copy(deep=False)``.
+    A dataset whose file changed (in size or mtime) since it was opened is
+    not reused.  A pool inherited by a forked process is emptied, without
+    sharing the parent's file handles.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of datasets kept open, except for datasets in use.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of datasets requested that were, or were not, open.
+    evictions : int
+        Number of datasets closed to stay within ``maxsize``.
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._datasets = OrderedDict()
+        self._pins = {}
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def clear(self):
+        """Closes all datasets not in use and resets the statistics."""
+        with self._lock:
+            closing = [(key, self._datasets.pop(key))
+                       for key in list(self._datasets)
+                       if not self._pins.get(key)]
+            self.hits = self.misses = self.evictions = 0
+        self._close(closing)
+
+    @staticmethod
+    def _close(datasets):
+        """Closes (key, dataset) pairs removed from the pool."""
+        for key, ds in datasets:
+            with hdf5_locked([key[0]]):
+                ds.close()
+
+    @staticmethod
+    def _key(path, preprocess, options):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime,
+                preprocess, tuple(sorted(options.items())))
+
+    @staticmethod
+    def _open(path, options):
+        """Opens a dataset, memory-mapping netCDF3 files with scipy unless
+        an engine is given or scipy is not installed.
+        """
+        if 'engine' not in options and _scipy_reads(path):
+            return xray.open_dataset(path, engine='scipy', **options)
+        return xray.open_dataset(path, **options)
+
+    def _acquire(self, path, preprocess, options):
+        """Returns the key and dataset of a file, opening it if needed, and
+        marks it in use.
+        """
+        key = self._key(path, preprocess, options)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            ds = self._datasets.pop(key, None)
+            if ds is not None:
+                self.hits += 1
+                self._datasets[key] = ds
+                self._pins[key] = self._pins.get(key, 0) + 1
+                return key, ds
+            self.misses += 1
+        with hdf5_locked([path]):
+            ds = self._open(path, options)
+            if preprocess is not None:
+                ds = preprocess(ds)
+        duplicate = None
+        with self._lock:
+            if key in self._datasets:
+                # Opened meanwhile by another thread
+                duplicate = ds
+                ds = self._datasets.pop(key)
+            self._datasets[key] = ds
+            self._pins[key] = self._pins.get(key, 0) + 1
+        if duplicate is not None:
+            self._close([(key, duplicate)])
+        return key, ds
+
+    def _release(self, keys):
+        closing = []
+        with self._lock:
+            for key in keys:
+                self._pins[key] -= 1
+                if not self._pins[key]:
+                    del self._pins[key]
+            for key in list(self._datasets):
+                if len(self._datasets) - len(closing) <= self.maxsize:
+                    break
+                if not self._pins.get(key):
+                    closing.append((key, self._datasets.pop(key)))
+                    self.evictions += 1
+        self._close(closing)
+
+    @contextmanager
+    def datasets(self, paths, preprocess=None, **options):
+        """Opens files, or reuses them if open, and keeps them open while
+        in use.
+
+        Parameters
+        ----------
+        paths : sequence of str
+        preprocess : callable, optional
+            Applied to each dataset when it is opened, e.g.
+            ``timedate._prep_time_data``.  Part of the pool's key.
+        **options
+            Keyword arguments of ``xray.open_dataset``.
+
+        Yields
+        ------
+        list of Dataset
+            Their data must be read holding ``io.hdf5_locked(paths)``.
+        """
+        keys = []
+        try:
+            datasets = []
+            for path in paths:
+                key, ds = self._acquire(path, preprocess, options)
+                keys.append(key)
+                datasets.append(ds)
+            yield datasets
+        finally:
+            self._release(keys)
+
+    @contextmanager
+    def dataset(self, path, preprocess=None, **options):
+        """As ``datasets``, for a single file."""
+        with self.datasets([path], preprocess, **options) as datasets:
+            yield datasets[0]
+
+
+dataset_pool = DatasetPool(MAX_OPEN_DATASETS)
+# Close the files before the interpreter tears down the modules they use
+atexit.register(dataset_pool.clear)
@@ -19,6 +19,39 @@ class AbstractBackend(object):
         """Adds an instance of the given aospy_obj to the backend"""
         raise NotImplementedError
 
+    def add_all(self, aospy_objs, *args, **kwargs):
+        """Adds instances of all of the given aospy_objs to the backend.
+        Backends should override this to add them in a single transaction.
+        """
+        for aospy_obj in aospy_objs:
+            self.add(aospy_obj, *args, **kwargs)
+
+    def get_file_index(self, root):
+        """Returns the stored state of the FileIndex of a directory, or None.
+        Backends that persist file indexes should override this.
+        """
+        return None
+
+    def set_file_index(self, root, state):
+        """Stores the state of the FileIndex of a directory (see
+        ``FileIndex.state``).  Backends that persist file indexes should
+        override this.
+        """
+        pass
+
+    def get_tar_index(self, path):
+        """Returns the stored state of the TarIndex of an archive, or None.
+        Backends that persist archive indexes should override this.
+        """
+        return None
+
+    def set_tar_index(self, path, state):
+        """Stores the state of the TarIndex of an archive (see
+        ``TarIndex.state``).  Backends that persist archive indexes should
+        override this.
+        """
+        pass
+
     @abstractmethod
     def delete(self, aospy_obj, *args, **kwargs):
         """Deletes an instance of the given aospy_obj from the backend"""
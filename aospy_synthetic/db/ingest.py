@@ -0,0 +1,140 @@
+"""Index an existing tree of aospy output files without recomputing them.
+
+Output file names encode the variable, output and input labels, model, run,
+ensemble member, region and years of the Calc that produced them (see
+``Calc._file_name``).  ``ingest`` walks output directories, parses each file
+name back into Calc metadata, rebuilds the Calc against a project's objects
+and adds the recovered Calcs to a backend in batched transactions.
+"""
+from ..calc import Calc, CalcInterface
+from ..io import _parse_file_name
+from .reconcile import scan_outputs
+from .registry import get_registry
+
+
+def _model_runs(proj):
+    """Returns all (model string, run string) pairs of a project, along with
+    a mapping from each pair to the (model, run) objects.
+    """
+    model_runs = {}
+    for model in proj.models.values():
+        for run in model.runs.values():
+            model_runs[(str(model), run.name)] = (model, run)
+    return model_runs
+
+
+def calc_from_file_name(file_name, proj, variables, model_runs=None,
+                        regions=None):
+    """Rebuilds the Calc that produced an output file from its name.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of an aospy output file.
+    proj : Proj
+        Project the file belongs to.
+    variables : dict
+        Maps variable names to Var objects.
+    model_runs : dict, optional
+        Output of ``_model_runs(proj)``, to avoid recomputing it for every
+        file.
+    regions : dict, optional
+        Maps region names to Region objects.  Defaults to the project's
+        regions.
+
+    Returns
+    -------
+    Calc or None
+        None if the name could not be parsed, refers to objects not in the
+        project, or does not round-trip to the same file name.
+    """
+    if model_runs is None:
+        model_runs = _model_runs(proj)
+    if regions is None:
+        regions = proj.regions
+    meta = _parse_file_name(file_name, model_runs=list(model_runs))
+    if meta is None:
+        return None
+    try:
+        model, run = model_runs[(meta['model'], meta['run'])]
+        var = variables[meta['name']]
+        start_yr, end_yr = meta['yr_range']
+        region = None
+        if meta['region'] is not None:
+            region = regions[meta['region']]
+        calc = Calc(CalcInterface(
+            proj=proj, model=model, run=run, ens_mem=meta['ens_mem'],
+            var=var,
+            date_range=('{:04d}-01-01'.format(start_yr),
+                        '{:04d}-12-31'.format(end_yr)),
+            intvl_in=meta['intvl_in'], intvl_out=meta['intvl_out'],
+            dtype_in_time=meta['dtype_in_time'],
+            dtype_in_vert=meta['dtype_in_vert'],
+            dtype_out_time=meta['dtype_out_time'],
+            dtype_out_vert=meta['dtype_out_vert'], region=region,
+            verbose=False
+        ))
+    except (KeyError, IndexError, ValueError, AttributeError, AssertionError):
+        return None
+    # Ingested Calcs are added in explicit batches below
+    get_registry().discard(calc)
+    if calc._file_name(calc.dtype_out_time, meta['extension']) != file_name:
+        return None
+    return calc
+
+
+def ingest(backend, proj, variables, roots=None, batch_size=1000,
+           max_workers=16, regions=None):
+    """Adds the Calcs of all output files below the given directories to a
+    backend.
+
+    Parameters
+    ----------
+    backend : AbstractBackend
+        Backend to add the Calcs to.
+    proj : Proj
+        Project the files belong to.
+    variables : sequence of Var
+        Variables the files may hold.
+    roots : sequence of str, optional
+        Directories to scan.  Defaults to the project's ``direc_out``.
+    batch_size : int
+        Number of Calcs added per transaction.
+    max_workers : int
+        Number of threads used to scan the directories.
+    regions : sequence of Region, optional
+        Regions the files may be reduced over.  Defaults to the project's
+        regions.
+
+    Returns
+    -------
+    calcs : list of Calc
+        Calcs added to the backend.
+    unparsed : list of str
+        Paths of the output files that could not be matched to a Calc.
+    """
+    if roots is None:
+        roots = [proj.direc_out]
+    variables = {var.name: var for var in variables}
+    if regions is not None:
+        regions = {region.name: region for region in regions}
+    model_runs = _model_runs(proj)
+
+    calcs, unparsed, batch = [], [], []
+    for file_name, paths in sorted(scan_outputs(roots,
+                                                max_workers=max_workers)
+                                   .items()):
+        calc = calc_from_file_name(file_name, proj, variables, model_runs,
+                                   regions)
+        if calc is None or not calc.track():
+            unparsed.extend(paths)
+            continue
+        batch.append(calc)
+        if len(batch) >= batch_size:
+            backend.add_all(batch)
+            calcs.extend(batch)
+            batch = []
+    if batch:
+        backend.add_all(batch)
+        calcs.extend(batch)
+    return calcs, unparsed
@@ -0,0 +1,220 @@
+"""Record definitions for the append-only log-structured backend.
+
+These mirror the row objects in ``sqlalchemy_config`` so that both backends
+track the same metadata and enforce the same parent/child relationships.
+"""
+import datetime
+import json
+
+
+def _encode(value):
+    """JSON encoder hook for values json does not know how to serialize."""
+    if isinstance(value, datetime.datetime):
+        # strftime does not support years before 1900 on python 2
+        return {'__datetime__': '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'
+                .format(value.year, value.month, value.day, value.hour,
+                        value.minute, value.second)}
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def _decode(dct):
+    """JSON object hook reversing ``_encode``."""
+    if '__datetime__' in dct:
+        return datetime.datetime(
+            *[int(d) for d in dct['__datetime__'].replace('T', '-')
+              .replace(':', '-').split('-')]
+        )
+    return dct
+
+
+def dumps(record):
+    """Serialize a record to a single line of text."""
+    return json.dumps(record, default=_encode, sort_keys=True)
+
+
+def loads(line):
+    """Deserialize a single line of text into a record."""
+    return json.loads(line, object_hook=_decode)
+
+
+def record_key(cls_name, hashcode):
+    """Returns the index key of the record of a given class and hash."""
+    return '{}:{}'.format(cls_name, hashcode)
+
+
+class Record(object):
+    """Superclass for all record types stored by the log-structured backend.
+
+    A record type plays the same role as a ``UniqueMixin`` row class: it
+    lists the metadata attributes copied from the aospy core object and the
+    parent objects the record points to.
+    """
+    aospy_cls = ''
+
+    # Maps a record attribute name to an attribute name in the
+    # corresponding aospy object
+    _metadata_attrs = {}
+
+    # Maps a record attribute name to a dictionary, which maps
+    # 'record_cls' to the record class of the parent and 'aospy_obj_attr'
+    # to the attribute name of the parent in the aospy object
+    _db_attrs = {}
+
+    @classmethod
+    def metadata(cls, AospyObj):
+        """Returns the tracked metadata of an aospy core object.
+
+        Parameters
+        ----------
+        AospyObj
+            Aospy core object.
+
+        Returns
+        -------
+        dict
+        """
+        attrs = {}
+        for key, aospy_attr in cls._metadata_attrs.items():
+            if hasattr(AospyObj, aospy_attr):
+                attrs[key] = getattr(AospyObj, aospy_attr)
+        return attrs
+
+    @classmethod
+    def parents(cls, AospyObj):
+        """Returns the parents of an aospy core object that are tracked.
+
+        Parameters
+        ----------
+        AospyObj
+            Aospy core object.
+
+        Returns
+        -------
+        dict
+            Maps each record attribute name to a tuple of the parent's record
+            class and the parent aospy core object.
+        """
+        parents = {}
+        for key, spec in cls._db_attrs.items():
+            sub_obj = getattr(AospyObj, spec['aospy_obj_attr'], None)
+            if sub_obj:
+                parents[key] = (spec['record_cls'], sub_obj)
+        return parents
+
+
+class ProjRecord(Record):
+    """Record corresponding with Proj"""
+    aospy_cls = 'Proj'
+    _metadata_attrs = {
+        'name': 'name',
+        'direc_out': 'direc_out'
+    }
+
+
+class ModelRecord(Record):
+    """Record corresponding with Model"""
+    aospy_cls = 'Model'
+    _metadata_attrs = {
+        'name': 'name',
+        'description': 'description'
+    }
+    _db_attrs = {
+        'project': {
+            'record_cls': ProjRecord,
+            'aospy_obj_attr': 'proj'
+        }
+    }
+
+
+class RunRecord(Record):
+    """Record corresponding with Run"""
+    aospy_cls = 'Run'
+    _metadata_attrs = {
+        'name': 'name',
+        'description': 'description',
+        'data_in_start_date': 'data_in_start_date',
+        'data_in_end_date': 'data_in_end_date',
+        'data_in_dur': 'data_in_dur',
+        'data_in_direc': 'data_in_direc'
+    }
+    _db_attrs = {
+        'model': {
+            'record_cls': ModelRecord,
+            'aospy_obj_attr': 'model'
+        }
+    }
+
+
+class UnitsRecord(Record):
+    """Record corresponding with Units"""
+    aospy_cls = 'Units'
+    _metadata_attrs = {
+        'units': 'units',
+        'plot_units': 'plot_units',
+        'plot_units_conv': 'plot_units_conv',
+        'vert_int_plot_units': 'vert_int_plot_units',
+        'vert_int_plot_units_conv': 'vert_int_plot_units_conv'
+    }
+
+
+class VarRecord(Record):
+    """Record corresponding with Var"""
+    aospy_cls = 'Var'
+    _metadata_attrs = {
+        'name': 'name',
+        'description': 'description',
+    }
+    _db_attrs = {
+        'units': {
+            'record_cls': UnitsRecord,
+            'aospy_obj_attr': 'units'
+        }
+    }
+
+
+class RegionRecord(Record):
+    """Record corresponding with Region"""
+    aospy_cls = 'Region'
+    _metadata_attrs = {
+        'name': 'name',
+        'description': 'description'
+    }
+
+
+class CalcRecord(Record):
+    """Record corresponding with Calc"""
+    aospy_cls = 'Calc'
+    _metadata_attrs = {
+        'intvl_in': 'intvl_in',
+        'intvl_out': 'intvl_out',
+        'dtype_out_time': 'dtype_out_time',
+        'start_date': 'start_date',
+        'end_date': 'end_date',
+        'dtype_in_vert': 'dtype_in_vert',
+        'file_name': 'file_name',
+        'compute_time': 'compute_time',
+        'bytes_written': 'bytes_written',
+        'write_time': 'write_time'
+    }
+    _db_attrs = {
+        'run': {
+            'record_cls': RunRecord,
+            'aospy_obj_attr': 'run'
+        },
+        'var': {
+            'record_cls': VarRecord,
+            'aospy_obj_attr': 'var'
+        },
+        'region': {
+            'record_cls': RegionRecord,
+            'aospy_obj_attr': 'region'
+        }
+    }
+
+
+RECORD_CLASSES = {
+    rec_cls.aospy_cls: rec_cls for rec_cls in (
+        ProjRecord, ModelRecord, RunRecord, UnitsRecord, VarRecord,
+        RegionRecord, CalcRecord
+    )
+}
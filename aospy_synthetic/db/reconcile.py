@@ -0,0 +1,237 @@
+"""Reconcile the Calcs tracked in a backend with the output files on disk.
+
+Over time the ``calcs`` table and the files under ``Calc._dir_scratch()`` and
+``Calc._dir_archive()`` drift apart.  ``reconcile`` lists the file names of
+the computed Calcs that are missing on disk and the output files that are
+not tracked,
+comparing the two sets in memory: the backend is read with a single query and
+the output trees are listed and stat'ed in a thread pool.  Optionally the
+differences are resolved in bulk.
+
+Usage::
+
+    python -m aospy_synthetic.db.reconcile sqlite:///aospy.db /work/$USER/proj
+"""
+from __future__ import print_function
+import argparse
+import os
+import stat
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from ..reductions import STATS_EXT
+from ..tar_index import tar_index
+
+ARCHIVE_NAME = 'data.tar'
+
+
+class Reconciliation(object):
+    """Differences between the Calcs in a backend and the files on disk.
+
+    Attributes
+    ----------
+    missing : set
+        File names of the computed Calcs in the backend that were not found
+        on disk.
+    pending : set
+        File names of the Calcs in the backend never computed (without a
+        compute time), e.g. registered when they were created, that were not
+        found on disk.
+    untracked : dict
+        Maps the name of each output file not tracked in the backend to the
+        paths it was found at.  Members of ``data.tar`` archives are listed
+        as ``<archive path>/<member name>``.
+    num_files : int
+        Number of output files found on disk.
+    """
+    def __init__(self, missing, untracked, num_files, pending=()):
+        self.missing = missing
+        self.pending = set(pending)
+        self.untracked = untracked
+        self.num_files = num_files
+
+    def __str__(self):
+        return ('Reconciliation: {} files on disk, {} tracked files missing, '
+                '{} pending, {} files untracked'.format(
+                    self.num_files, len(self.missing), len(self.pending),
+                    len(self.untracked)))
+
+    __repr__ = __str__
+
+
+def _is_output(name, extension):
+    """Whether a file name is that of an output file, rather than of the
+    running statistics stored next to it.
+    """
+    return name.endswith(extension) and not name.endswith(STATS_EXT)
+
+
+def _list_dir(direc, extension):
+    """Lists a directory, stat'ing every entry.
+
+    Returns
+    -------
+    subdirs : list of str
+    files : list of (file name, path)
+    """
+    subdirs, files = [], []
+    try:
+        names = os.listdir(direc)
+    except OSError:
+        return subdirs, files
+    for name in names:
+        path = os.path.join(direc, name)
+        try:
+            mode = os.lstat(path).st_mode
+        except OSError:
+            continue
+        if stat.S_ISDIR(mode):
+            subdirs.append(path)
+        elif name == ARCHIVE_NAME:
+            try:
+                members = tar_index(path).members
+            except (tarfile.TarError, IOError, OSError):
+                continue
+            files.extend((os.path.basename(member),
+                          os.path.join(path, member))
+                         for member in members
+                         if _is_output(member, extension))
+        elif _is_output(name, extension):
+            files.append((name, path))
+    return subdirs, files
+
+
+def scan_outputs(roots, max_workers=16, extension='.nc'):
+    """Finds all output files below the given directories.
+
+    Each directory is listed, and its entries stat'ed, by a worker of a
+    thread pool, so that many directories are read concurrently; on network
+    filesystems this is limited by latency rather than throughput.
+
+    Parameters
+    ----------
+    roots : sequence of str
+        Directories to scan recursively.
+    max_workers : int
+        Number of threads.
+    extension : str
+        Only files with this extension are listed.
+
+    Returns
+    -------
+    dict
+        Maps each file name to the list of paths it was found at.
+    """
+    found = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = set(executor.submit(_list_dir, root, extension)
+                      for root in set(roots))
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, files = future.result()
+                for name, path in files:
+                    found.setdefault(name, []).append(path)
+                futures.update(executor.submit(_list_dir, subdir, extension)
+                               for subdir in subdirs)
+    return found
+
+
+def output_roots(calcs):
+    """Returns the scratch and archive directories of the given Calcs."""
+    roots = set()
+    for calc in calcs:
+        roots.add(calc.dir_scratch)
+        roots.add(calc.dir_archive)
+    return sorted(roots)
+
+
+def reconcile(backend, roots, calcs=(), delete_missing=False,
+              register=False, max_workers=16):
+    """Compares the Calcs tracked in a backend with the files on disk.
+
+    Parameters
+    ----------
+    backend : AbstractBackend
+        Backend tracking the Calcs.
+    roots : sequence of str
+        Output directories to scan, e.g. ``output_roots(calcs)``.
+    calcs : sequence of Calc, optional
+        Known Calcs.  Those whose output file is untracked are added to the
+        backend if ``register`` is True.
+    delete_missing : bool
+        Whether to delete the computed Calcs whose output file is missing
+        from the backend, in a single transaction.  Calcs never computed are
+        kept.
+    register : bool
+        Whether to add the Calcs in ``calcs`` whose output file is untracked
+        to the backend, in a single transaction.
+    max_workers : int
+        Number of threads used to scan the output directories.
+
+    Returns
+    -------
+    Reconciliation
+    """
+    tracked = backend.get_calc_file_names()
+    computed = backend.get_calc_file_names(computed=True)
+    on_disk = scan_outputs(roots, max_workers=max_workers)
+
+    missing = computed - set(on_disk)
+    pending = tracked - computed - set(on_disk)
+    untracked = {name: paths for name, paths in on_disk.items()
+                 if name not in tracked}
+
+    if delete_missing and missing:
+        backend.delete_calcs(missing)
+    if register:
+        to_register = [calc for calc in calcs
+                       if calc.file_name in untracked and calc.track()]
+        if to_register:
+            backend.add_all(to_register)
+    return Reconciliation(missing, untracked,
+                          sum(len(paths) for paths in on_disk.values()),
+                          pending)
+
+
+def _open_backend(db):
+    """Opens a SQLAlchemy database from a URL, or a log-structured database
+    from a directory.
+    """
+    if '://' in db:
+        from .sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+        return SQLAlchemyDB(db)
+    from .logfile.logfile_db import LogFileDB
+    return LogFileDB(db)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='List computed Calcs whose output file is missing and '
+                    'output files that are not tracked.'
+    )
+    parser.add_argument('db', help='database URL or log-structured database '
+                                   'directory')
+    parser.add_argument('roots', nargs='+', help='output directories to scan')
+    parser.add_argument('--delete-missing', action='store_true',
+                        help='delete computed Calcs whose output is '
+                             'missing')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='number of threads used to scan directories')
+    args = parser.parse_args(argv)
+
+    result = reconcile(_open_backend(args.db), args.roots,
+                       delete_missing=args.delete_missing,
+                       max_workers=args.workers)
+    for name in sorted(result.missing):
+        print('missing', name)
+    for name in sorted(result.pending):
+        print('pending', name)
+    for name in sorted(result.untracked):
+        for path in result.untracked[name]:
+            print('untracked', path)
+    print(result)
+
+
+if __name__ == '__main__':
+    main()
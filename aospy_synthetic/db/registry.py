@@ -0,0 +1,176 @@
+"""Automatic, deferred registration of aospy core objects with a backend.
+
+Aospy core objects that were given a ``backend`` (directly or through one of
+their parents) register themselves here when they are created.  Registrations
+are coalesced in a pending set per backend and written with a single
+``add_all`` call when the registry is flushed: at the end of a ``batch()``
+block, when more than ``max_pending`` objects are pending, on an explicit
+``flush()``, or at interpreter exit.
+
+Examples
+--------
+Track every Calc of a sweep with about one transaction:
+
+.. ipython:: python
+
+    from aospy_synthetic.db import registry
+    with registry.batch():
+        calcs = [Calc(calc_interface) for calc_interface in interfaces]
+"""
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def get_backend(aospy_obj):
+    """Returns the backend of an aospy core object, falling back to that of
+    its closest parent with one set.
+    """
+    backend = getattr(aospy_obj, 'backend', None)
+    if backend is not None:
+        return backend
+    for parent in ('run', 'model', 'proj'):
+        parent_obj = getattr(aospy_obj, parent, None)
+        if parent_obj:
+            return get_backend(parent_obj)
+    return None
+
+
+def _is_tracked(aospy_obj):
+    """Returns whether an object is tracked, treating objects whose parent
+    tree is still incomplete as not tracked.
+    """
+    try:
+        return aospy_obj.track()
+    except AttributeError:
+        return False
+
+
+class PendingRegistry(object):
+    """Pending set of aospy core objects to add to their backends."""
+
+    def __init__(self, flush_at_exit=True, max_pending=None):
+        """
+        Parameters
+        ----------
+        flush_at_exit : bool
+            Whether to flush all pending objects at interpreter exit.
+        max_pending : int, optional
+            Flush a backend's pending set once it holds this many objects.
+        """
+        self.flush_at_exit = flush_at_exit
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._batch_depth = 0
+
+    def __len__(self):
+        return sum(len(objs) for objs in self._pending.values())
+
+    def register(self, aospy_obj, backend=None):
+        """Adds an aospy core object to the pending set of its backend.
+
+        Objects without a backend are ignored.  Registering the same object
+        more than once has no further effect.  Whether the object is tracked
+        is checked when the pending set is flushed, so objects may be
+        registered before their parents are attached.
+
+        Parameters
+        ----------
+        aospy_obj
+            Aospy core object.
+        backend : AbstractBackend, optional
+            Backend to add the object to.  Defaults to ``get_backend``.
+        """
+        if backend is None:
+            backend = get_backend(aospy_obj)
+        if backend is None:
+            return
+        pending = self._pending.setdefault(backend, OrderedDict())
+        pending[id(aospy_obj)] = aospy_obj
+        if self.max_pending and len(pending) >= self.max_pending:
+            self.flush(backend)
+
+    def discard(self, aospy_obj):
+        """Removes an aospy core object from all pending sets."""
+        for pending in self._pending.values():
+            pending.pop(id(aospy_obj), None)
+
+    def clear(self):
+        """Drops all pending objects without adding them."""
+        self._pending.clear()
+
+    def flush(self, backend=None):
+        """Adds all pending objects that are tracked to their backends.
+
+        Parameters
+        ----------
+        backend : AbstractBackend, optional
+            Only flush the pending set of this backend.
+
+        Returns
+        -------
+        int
+            Number of objects added.
+        """
+        if backend is None:
+            backends = list(self._pending)
+        else:
+            backends = [backend]
+        num_added = 0
+        for backend in backends:
+            pending = self._pending.pop(backend, None)
+            if not pending:
+                continue
+            aospy_objs = [obj for obj in pending.values() if _is_tracked(obj)]
+            if not aospy_objs:
+                continue
+            try:
+                backend.add_all(aospy_objs)
+            except Exception:
+                # Keep the objects pending so a later flush can retry
+                pending.update(self._pending.get(backend, {}))
+                self._pending[backend] = pending
+                raise
+            num_added += len(aospy_objs)
+        return num_added
+
+    @contextmanager
+    def batch(self):
+        """Flushes all pending objects at the end of the outermost batch
+        block.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+        if not self._batch_depth:
+            self.flush()
+
+    def _flush_at_exit(self):
+        if self.flush_at_exit:
+            self.flush()
+
+
+_registry = PendingRegistry()
+atexit.register(_registry._flush_at_exit)
+
+
+def get_registry():
+    """Returns the process-wide registry used by aospy core objects."""
+    return _registry
+
+
+def register(aospy_obj, backend=None):
+    """Registers an aospy core object with the process-wide registry."""
+    _registry.register(aospy_obj, backend=backend)
+
+
+def flush(backend=None):
+    """Flushes the process-wide registry."""
+    return _registry.flush(backend=backend)
+
+
+def batch():
+    """Returns a batch context of the process-wide registry."""
+    return _registry.batch()
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text
 from sqlalchemy import create_engine, ForeignKey
 from sqlalchemy.orm import relationship
 
@@ -385,7 +385,10 @@ class CalcDB(UniqueMixin, Base):
         'start_date': 'start_date',
         'end_date': 'end_date',
         'dtype_in_vert': 'dtype_in_vert',
-        'file_name': 'file_name'
+        'file_name': 'file_name',
+        'compute_time': 'compute_time',
+        'bytes_written': 'bytes_written',
+        'write_time': 'write_time'
     }
     _db_attrs = {
         'run': {
@@ -412,6 +415,12 @@ class CalcDB(UniqueMixin, Base):
     region_id = Column(Integer, ForeignKey('regions.id'))
     region = relationship('RegionDB', back_populates='calcs')
 
+    input_files = relationship(
+        'InputFileDB',
+        back_populates='calc',
+        cascade='all, delete-orphan'
+    )
+
     # _metadata_attrs
     intvl_in = Column(String)
     intvl_out = Column(String)
@@ -420,3 +429,43 @@ class CalcDB(UniqueMixin, Base):
     end_date = Column(DateTime)
     dtype_in_vert = Column(String)
     file_name = Column(String)
+    compute_time = Column(Float)
+    bytes_written = Column(Integer)
+    write_time = Column(Float)
+
+
+class InputFileDB(Base):
+    """Database row object holding the fingerprint of an input file read by
+    a Calc.
+    """
+    __tablename__ = 'input_files'
+    id = Column(Integer, primary_key=True)
+    calc_id = Column(Integer, ForeignKey('calcs.id'))
+    calc = relationship('CalcDB', back_populates='input_files')
+
+    path = Column(String)
+    size = Column(Integer)
+    mtime = Column(Float)
+    content_hash = Column(String)
+
+
+class FileIndexDB(Base):
+    """Database row object holding the state of the FileIndex of a
+    directory of input data, as JSON.
+    """
+    __tablename__ = 'file_indices'
+    id = Column(Integer, primary_key=True)
+
+    root = Column(String, unique=True)
+    state = Column(Text)
+
+
+class TarIndexDB(Base):
+    """Database row object holding the state of the TarIndex of an
+    archive of outputs, as JSON.
+    """
+    __tablename__ = 'tar_indices'
+    id = Column(Integer, primary_key=True)
+
+    path = Column(String, unique=True)
+    state = Column(Text)
@@ -1,3 +1,5 @@
+import json
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
@@ -5,7 +7,9 @@ from contextlib import contextmanager
 from ..abstract_db import AbstractBackend
 from sqlalchemy_config import (initialize_db,
                                ProjDB, ModelDB, RunDB,
-                               VarDB, CalcDB, RegionDB, UnitsDB)
+                               VarDB, CalcDB, RegionDB, UnitsDB,
+                               InputFileDB, FileIndexDB,
+                               TarIndexDB)
 
 
 class SQLAlchemyDB(AbstractBackend):
@@ -112,6 +116,32 @@ class SQLAlchemyDB(AbstractBackend):
         else:
             raise RuntimeError('aospy object not set to be tracked in DB')
 
+    def add_all(self, AospyObjs):
+        """Adds aospy core objects to the database in a single transaction if
+        tracking is enabled for all of the objects and their parents.
+
+        Parameters
+        ----------
+        AospyObjs : iterable
+            Aospy core objects.
+
+        Raises
+        ------
+        RuntimeError
+            If AospyObj.track() is False for any of the objects.  In that
+            case none of the objects are added.
+        """
+        AospyObjs = list(AospyObjs)
+        if not all(AospyObj.track() for AospyObj in AospyObjs):
+            raise RuntimeError('aospy object not set to be tracked in DB')
+        with self._session_scope() as session:
+            for AospyObj in AospyObjs:
+                db_obj = self._db_cls_from_aospy_cls(AospyObj).as_unique(
+                    session,
+                    AospyObj
+                )
+                session.add(db_obj)
+
     def delete(self, AospyObj):
         """Deletes an aospy object from the database if it exists.
 
@@ -129,6 +159,221 @@ class SQLAlchemyDB(AbstractBackend):
     def query():
         raise NotImplementedError()
 
+    def get_metadata(self, AospyObj):
+        """Returns the tracked metadata of an aospy core object as stored in
+        the database.
+
+        Parameters
+        ----------
+        AospyObj
+            Aospy core object.
+
+        Returns
+        -------
+        dict or None
+            Maps each metadata attribute name to its value, or None if the
+            object is not in the database.
+        """
+        with self._session_scope() as session:
+            db_obj = self._get_db_obj_query(session, AospyObj).first()
+            if db_obj is None:
+                return None
+            return {key: getattr(db_obj, key)
+                    for key in db_obj._metadata_attrs}
+
+    def get_calc_file_names(self, computed=False):
+        """Returns the set of output file names of all Calcs in the database,
+        or only of those computed (with a compute time), using a single
+        query.
+        """
+        with self._session_scope() as session:
+            q = session.query(CalcDB.file_name)
+            if computed:
+                q = q.filter(CalcDB.compute_time.isnot(None))
+            return set(file_name for file_name, in q)
+
+    def get_calc_date_ranges(self, computed=False):
+        """Returns the date range of every Calc in the database, or only of
+        those computed (with a compute time), using a single query.
+
+        Returns
+        -------
+        list of tuple
+            (model name, run name, var name, region name, intvl_out,
+            dtype_out_time, start_date, end_date, file_name) of each Calc;
+            the region name is None for Calcs without a region.
+        """
+        with self._session_scope() as session:
+            q = session.query(
+                ModelDB.name, RunDB.name, VarDB.name, RegionDB.name,
+                CalcDB.intvl_out, CalcDB.dtype_out_time, CalcDB.start_date,
+                CalcDB.end_date, CalcDB.file_name
+            ).join(CalcDB.run).outerjoin(RunDB.model).join(CalcDB.var)
+            q = q.outerjoin(CalcDB.region)
+            if computed:
+                q = q.filter(CalcDB.compute_time.isnot(None))
+            return list(q)
+
+    def delete_calcs(self, file_names, chunk_size=500):
+        """Deletes all Calcs with the given output file names from the
+        database in a single transaction.
+
+        Parameters
+        ----------
+        file_names : iterable of str
+            Output file names.
+        chunk_size : int
+            Maximum number of file names per query.
+        """
+        file_names = list(file_names)
+        with self._session_scope() as session:
+            for i in range(0, len(file_names), chunk_size):
+                q = session.query(CalcDB).filter(
+                    CalcDB.file_name.in_(file_names[i:i + chunk_size])
+                )
+                for db_obj in q:
+                    session.delete(db_obj)
+
+    def set_input_fingerprints(self, AospyObj, fingerprints):
+        """Replaces the fingerprints of the input files read by a Calc,
+        adding the Calc to the database if needed.
+
+        Parameters
+        ----------
+        AospyObj : Calc
+            Aospy Calc object.
+        fingerprints : sequence
+            (path, size, mtime, content_hash) of each input file.
+        """
+        self.set_all_input_fingerprints([(AospyObj, fingerprints)])
+
+    def set_all_input_fingerprints(self, calc_fingerprints):
+        """Replaces the input file fingerprints of many Calcs in a single
+        transaction, adding the Calcs to the database if needed.
+
+        Parameters
+        ----------
+        calc_fingerprints : iterable
+            (Calc, fingerprints) pairs, with fingerprints as in
+            ``set_input_fingerprints``.
+        """
+        with self._session_scope() as session:
+            for AospyObj, fingerprints in calc_fingerprints:
+                db_obj = CalcDB.as_unique(session, AospyObj)
+                session.add(db_obj)
+                db_obj.input_files = [
+                    InputFileDB(path=path, size=size, mtime=mtime,
+                                content_hash=content_hash)
+                    for path, size, mtime, content_hash in fingerprints
+                ]
+
+    def get_input_fingerprints(self, AospyObjs, chunk_size=500):
+        """Returns the stored input file fingerprints of many Calcs, using
+        one query per chunk of Calcs.
+
+        Parameters
+        ----------
+        AospyObjs : sequence of Calc
+            Aospy Calc objects.
+        chunk_size : int
+            Maximum number of Calcs per query.
+
+        Returns
+        -------
+        dict
+            Maps the hash of each Calc in the database to a list of
+            (path, size, mtime, content_hash) tuples.
+        """
+        hashes = list(set(str(hash(AospyObj)) for AospyObj in AospyObjs))
+        fingerprints = {}
+        with self._session_scope() as session:
+            for i in range(0, len(hashes), chunk_size):
+                q = session.query(
+                    CalcDB.hashcode, InputFileDB.path, InputFileDB.size,
+                    InputFileDB.mtime, InputFileDB.content_hash
+                ).outerjoin(CalcDB.input_files).filter(
+                    CalcDB.hashcode.in_(hashes[i:i + chunk_size])
+                )
+                for hashcode, path, size, mtime, content_hash in q:
+                    files = fingerprints.setdefault(int(hashcode), [])
+                    if path is not None:
+                        files.append((path, size, mtime, content_hash))
+        return fingerprints
+
+    def get_file_index(self, root):
+        """Returns the stored state of the FileIndex of a directory.
+
+        Parameters
+        ----------
+        root : str
+            Indexed directory.
+
+        Returns
+        -------
+        dict or None
+            See ``FileIndex.state``; None if there is no index of ``root``.
+        """
+        with self._session_scope() as session:
+            db_obj = session.query(FileIndexDB).filter_by(root=root).first()
+            if db_obj is None:
+                return None
+            return json.loads(db_obj.state)
+
+    def set_file_index(self, root, state):
+        """Stores the state of the FileIndex of a directory, replacing any
+        previous one.
+
+        Parameters
+        ----------
+        root : str
+            Indexed directory.
+        state : dict
+            See ``FileIndex.state``.
+        """
+        with self._session_scope() as session:
+            db_obj = session.query(FileIndexDB).filter_by(root=root).first()
+            if db_obj is None:
+                db_obj = FileIndexDB(root=root)
+                session.add(db_obj)
+            db_obj.state = json.dumps(state)
+
+    def get_tar_index(self, path):
+        """Returns the stored state of the TarIndex of an archive.
+
+        Parameters
+        ----------
+        path : str
+            Path of the archive.
+
+        Returns
+        -------
+        dict or None
+            See ``TarIndex.state``; None if there is no index of ``path``.
+        """
+        with self._session_scope() as session:
+            db_obj = session.query(TarIndexDB).filter_by(path=path).first()
+            if db_obj is None:
+                return None
+            return json.loads(db_obj.state)
+
+    def set_tar_index(self, path, state):
+        """Stores the state of the TarIndex of an archive, replacing any
+        previous one.
+
+        Parameters
+        ----------
+        path : str
+            Path of the archive.
+        state : dict
+            See ``TarIndex.state``.
+        """
+        with self._session_scope() as session:
+            db_obj = session.query(TarIndexDB).filter_by(path=path).first()
+            if db_obj is None:
+                db_obj = TarIndexDB(path=path)
+                session.add(db_obj)
+            db_obj.state = json.dumps(state)
+
     @classmethod
     def _get_db_obj_query(cls, session, AospyObj):
         """Returns a sqlalchemy query result for a single aospy core object.
@@ -252,7 +497,10 @@ class SQLAlchemyDB(AbstractBackend):
             If any corresponding attributes do not match.
         """
         for attr in db_obj._metadata_attrs:
-            cls._checkAttrMatches(db_obj, AospyObj, attr)
+            # Attributes the aospy object does not have are left untouched
+            # in the database; see _set_metadata_attrs
+            if hasattr(AospyObj, db_obj._metadata_attrs[attr]):
+                cls._checkAttrMatches(db_obj, AospyObj, attr)
 
     @classmethod
     def _checkAllDBAttrsMatchRecursive(cls, db_obj, AospyObj):
@@ -0,0 +1,134 @@
+"""ensemble.py: ensemble means streamed over the members of a run.
+
+A Run with ``ens_mem_prefix``, ``ens_mem_ext`` and ``ens_mem_suffix`` has one
+input directory per ensemble member, and a Calc with ``ens_mem='avg'``
+reduces the mean over all of them.  Rather than loading every member's data
+and averaging them, the members are loaded (and their Var derived) one at a
+time and added to a running sum and count, so that the memory used does not
+grow with the size of the ensemble.  Members may be loaded by several
+threads, holding at most one member's data per thread besides the sum.
+
+The threads loading members are shared by all ensemble means, rather than
+started anew by each one on the thread loading its Calc's data ahead (see
+``reader.BlockReader``).  Files read through netCDF4 are read holding
+``io.hdf5_lock`` (see ``Calc._read_var``), so their members are loaded in
+turn; members in netCDF3 files are read at once.
+"""
+import copy
+import itertools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from .dag import Plan
+
+# Threads loading ensemble members, shared by all ensemble means
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+class EnsembleMean(object):
+    """Mean over ensemble members, from a running sum and count of the
+    valid values.
+
+    Missing values are skipped, as by ``DataArray.mean``.  The members'
+    data must have the same coordinates.
+    """
+    def __init__(self):
+        self.total = None
+        self.count = None
+        self.num_members = 0
+        self.name = None
+        self.attrs = {}
+
+    def add(self, arr):
+        """Adds the data of one member, in place."""
+        if self.total is None:
+            self.total = arr.fillna(0.).astype(np.float64)
+            self.count = arr.notnull().astype(np.int32)
+            self.name = arr.name
+            self.attrs = dict(arr.attrs)
+        else:
+            self.total += arr.fillna(0.)
+            self.count += arr.notnull()
+        self.num_members += 1
+
+    def result(self):
+        """Returns the mean of the members added."""
+        mean = self.total / self.count
+        mean.name = self.name
+        mean.attrs.update(self.attrs)
+        return mean
+
+
+def member_data(calc, var):
+    """Loads, or derives from the Vars it depends on, a Var's data as
+    selected by the Calc of a single ensemble member.
+    """
+    if not getattr(var, 'variables', False):
+        return calc._load_var(var)
+    calc = copy.copy(calc)
+    calc.var = var
+    result = []
+    Plan([calc]).execute(lambda calc, data, paths, eval_time:
+                         result.append(data))
+    return result[0]
+
+
+def _executor(max_workers):
+    """Returns the shared pool of threads loading members, with at least a
+    number of workers.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool_workers < max_workers:
+            # The previous pool is not shut down, since ensemble means using
+            # it may still submit members to it; its threads exit once they
+            # are done with it and it is garbage collected
+            _pool = ThreadPoolExecutor(max_workers=max_workers)
+            _pool_workers = max_workers
+        return _pool
+
+
+def ensemble_mean(members, var, max_workers=1):
+    """Returns the mean of a Var's data over ensemble members.
+
+    Parameters
+    ----------
+    members : sequence of Calc
+        Calc of each member, e.g. from ``Calc._ens_members``.
+    var : Var
+    max_workers : int
+        Number of members loaded at once, each by a thread of a pool shared
+        by all ensemble means.  With a single worker, the members are loaded
+        in turn by the calling thread.
+
+    Returns
+    -------
+    DataArray
+    """
+    mean = EnsembleMean()
+    if max_workers <= 1:
+        for member in members:
+            mean.add(member_data(member, var))
+        return mean.result()
+    members = iter(members)
+    pool = _executor(max_workers)
+    # At most one member's data per worker is held besides the sum
+    pending = set(pool.submit(member_data, member, var) for member
+                  in itertools.islice(members, max_workers))
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                mean.add(future.result())
+                member = next(members, None)
+                if member is not None:
+                    pending.add(pool.submit(member_data, member, var))
+    finally:
+        for future in pending:
+            future.cancel()
+    return mean.result()
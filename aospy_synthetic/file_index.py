@@ -0,0 +1,183 @@
+"""file_index.py: index of the input files in a Run's directory tree.
+
+Listing an archive-style directory tree for every Calc is slow.  A FileIndex
+lists the tree once and maps (domain, variable, dtype_in_time, intvl_in,
+data_in_dur) to the files holding each span of years, so that Calcs resolve
+their input files with dictionary lookups.
+
+The listing of each directory is kept along with its mtime.  Refreshing an
+index re-lists only the directories whose mtime changed, i.e. those in which
+files or subdirectories were added, removed or renamed, and indexes are
+persisted in the Run's backend so that other processes start from them.
+"""
+import os
+import re
+
+GFDL_FILE_RE = re.compile(r'^(?P<domain>[^.]+)\.(?P<start>\d{4})\d{2}-'
+                          r'(?P<end>\d{4})\d{2}\.(?P<var>[^.]+)\.nc$')
+GFDL_DUR_RE = re.compile(r'^(?P<dur>\d+)yr$')
+
+
+class FileIndex(object):
+    """Index of the files in the 'gfdl' directory structure under a root
+    directory, i.e. of
+    ``<root>/<domain>/<dtype_in_time>/<intvl_in>/<dur>yr/<file>``.
+
+    Parameters
+    ----------
+    root : str
+        Directory to index.
+    dirs : dict, optional
+        Listings of the directories under ``root``, keyed by their path
+        relative to it, as returned by ``state``.
+    """
+    def __init__(self, root, dirs=None):
+        self.root = root
+        self.dirs = {} if dirs is None else dirs
+        self.num_listed = 0
+        self._table = None
+
+    @classmethod
+    def scan(cls, root):
+        """Returns a new index of a directory tree."""
+        index = cls(root)
+        index.refresh()
+        return index
+
+    @classmethod
+    def from_state(cls, state):
+        """Returns an index from the output of ``state``."""
+        return cls(state['root'], {rel: tuple(listing) for rel, listing
+                                   in state['dirs'].items()})
+
+    def state(self):
+        """Returns the index as JSON-serializable data."""
+        return {'root': self.root,
+                'dirs': {rel: list(listing)
+                         for rel, listing in self.dirs.items()}}
+
+    def refresh(self):
+        """Brings the index up to date with the directory tree.
+
+        Every directory is stat'ed, but only those whose mtime changed since
+        they were last listed, and new ones, are listed again.
+
+        Returns
+        -------
+        bool
+            Whether the index changed.
+        """
+        dirs = {}
+        changed = False
+        stack = ['']
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.root, rel)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            listing = self.dirs.get(rel)
+            if listing is None or listing[0] != mtime:
+                names = sorted(os.listdir(path))
+                subdirs = [name for name in names
+                           if os.path.isdir(os.path.join(path, name))]
+                files = [name for name in names if name not in subdirs]
+                listing = (mtime, files, subdirs)
+                self.num_listed += 1
+                changed = True
+            dirs[rel] = listing
+            stack.extend(os.path.join(rel, name) for name in listing[2])
+        if set(dirs) != set(self.dirs):
+            changed = True
+        self.dirs = dirs
+        if changed:
+            self._table = None
+        return changed
+
+    def _lookup_table(self):
+        """Returns a dict mapping (domain, variable, dtype_in_time, intvl_in,
+        data_in_dur) to a sorted list of (start year, end year, path).
+        """
+        if self._table is not None:
+            return self._table
+        table = {}
+        for rel, (_, files, _) in self.dirs.items():
+            parts = rel.split(os.sep)
+            if len(parts) != 4 or not GFDL_DUR_RE.match(parts[3]):
+                continue
+            domain, dtype_in_time, intvl_in, dur_dir = parts
+            dur = int(GFDL_DUR_RE.match(dur_dir).group('dur'))
+            for name in files:
+                match = GFDL_FILE_RE.match(name)
+                if match is None or match.group('domain') != domain:
+                    continue
+                key = (domain, match.group('var'), dtype_in_time, intvl_in,
+                       dur)
+                table.setdefault(key, []).append(
+                    (int(match.group('start')), int(match.group('end')),
+                     os.path.join(self.root, rel, name))
+                )
+        for spans in table.values():
+            spans.sort()
+        self._table = table
+        return table
+
+    def paths(self, names, domain, dtype_in_time, intvl_in, dur, start_year,
+              end_year):
+        """Returns the paths of the files of a variable spanning some years.
+
+        Parameters
+        ----------
+        names : sequence of str
+            Names the variable may be stored under; the first one with any
+            files is used.
+        domain, dtype_in_time, intvl_in : str
+        dur : int
+            Number of years per file.
+        start_year, end_year : int
+            Years to span, inclusive.
+
+        Returns
+        -------
+        list of str
+            Paths in chronological order; empty if there are none.
+        """
+        table = self._lookup_table()
+        for name in names:
+            spans = table.get((domain, name, dtype_in_time, intvl_in, dur))
+            if spans:
+                return [path for start, end, path in spans
+                        if start <= end_year and end >= start_year]
+        return []
+
+
+def run_file_index(run, root, backend=None):
+    """Returns the FileIndex of a directory of a Run's input data.
+
+    The index is kept on the Run.  The first time it is needed in a process
+    it is loaded from the backend, if it has one, refreshed and, if it
+    changed, saved back; otherwise the directory tree is scanned.
+
+    Parameters
+    ----------
+    run : Run
+    root : str
+        Directory of the Run's input data.
+    backend : AbstractBackend, optional
+        Backend in which indexes are persisted.
+    """
+    indices = run._file_indices
+    if root in indices:
+        return indices[root]
+    state = None if backend is None else backend.get_file_index(root)
+    if state is None:
+        index = FileIndex.scan(root)
+        changed = True
+    else:
+        index = FileIndex.from_state(state)
+        changed = index.refresh()
+    if changed and backend is not None:
+        backend.set_file_index(root, index.state())
+    indices[root] = index
+    return index
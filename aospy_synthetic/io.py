@@ -1,6 +1,63 @@
 """io.py: utility methods used internally by aospy for input/output, etc."""
+from contextlib import contextmanager
+import re
+import threading
+
 import numpy as np
 
+try:
+    import scipy.io  # noqa: F401
+except ImportError:
+    _HAS_SCIPY = False
+else:
+    _HAS_SCIPY = True
+_TIME_LABELS = {'jfm': (1, 2, 3), 'fma': (2, 3, 4), 'mam': (3,  4,  5),
+                'amj': (4, 5, 6), 'mjj': (5, 6, 7), 'jja': (6,  7,  8),
+                'jas': (7, 8, 9), 'aso': (8, 9,10), 'son': (9, 10, 11),
+                'ond':(10,11,12), 'ndj': (11,12,1), 'djf': (1,  2, 12),
+                'jjas': (6,7,8,9), 'djfm': (12, 1, 2, 3),
+                'ann': range(1,13)}
+_DTYPE_IN_VERT_LABELS = ('sigma', 'pressure')
+_DTYPE_OUT_VERT_LABELS = ('vert_av', 'vert_int')
+# Magic numbers of classic and 64-bit offset netCDF3 files
+_NETCDF3_MAGIC = (b'CDF\x01', b'CDF\x02')
+# The HDF5 library underlying netCDF4 is not thread-safe: every open, read,
+# write and close of a file through netCDF4 holds this lock
+hdf5_lock = threading.RLock()
+
+
+def _is_netcdf3(path):
+    """Whether a file is in a netCDF3 format that scipy can read."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) in _NETCDF3_MAGIC
+    except IOError:
+        return False
+
+
+def _scipy_reads(path):
+    """Whether a file is memory-mapped by scipy: in a netCDF3 format, with
+    scipy installed.
+    """
+    return _HAS_SCIPY and _is_netcdf3(path)
+
+
+def _uses_hdf5(path):
+    """Whether a file is read through the netCDF4 library rather than
+    memory-mapped by scipy.
+    """
+    return not _scipy_reads(path)
+
+
+@contextmanager
+def hdf5_locked(paths):
+    """Holds ``hdf5_lock`` if any of the files is read through netCDF4."""
+    if any(_uses_hdf5(path) for path in paths):
+        with hdf5_lock:
+            yield
+    else:
+        yield
+
 
 def _data_in_label(intvl_in, dtype_in_time, dtype_in_vert=False):
     """Create string label specifying the input data of a calculation."""
@@ -33,6 +90,13 @@ def _ens_label(ens_mem):
         return 'mem' + str(ens_mem + 1)
 
 
+def _region_label(region):
+    """Create label of the region a Calc is reduced over, if any."""
+    if not region:
+        return ''
+    return 'region_' + region.name
+
+
 def _yr_label(yr_range):
     """Create label of start and end years for aospy data I/O."""
     assert yr_range is not None, "yr_range is None"
@@ -53,13 +117,7 @@ def _time_label(intvl, return_val=True):
         value = np.array([intvl])
     # Seasonal and annual time labels are short strings.
     else:
-        labels = {'jfm': (1, 2, 3), 'fma': (2, 3, 4), 'mam': (3,  4,  5),
-                  'amj': (4, 5, 6), 'mjj': (5, 6, 7), 'jja': (6,  7,  8),
-                  'jas': (7, 8, 9), 'aso': (8, 9,10), 'son': (9, 10, 11),
-                  'ond':(10,11,12), 'ndj': (11,12,1), 'djf': (1,  2, 12),
-                  'jjas': (6,7,8,9), 'djfm': (12, 1, 2, 3),
-                  'ann': range(1,13)}
-        for lbl, vals in labels.items():
+        for lbl, vals in _TIME_LABELS.items():
             if intvl == lbl or set(intvl) == set(vals):
                 label = lbl
                 value = np.array(vals)
@@ -68,3 +126,144 @@ def _time_label(intvl, return_val=True):
         return label, value
     else:
         return label
+
+
+def _parse_time_label(label):
+    """Invert _time_label: return the interval a time label was made from,
+    or None if the string is not a time label.
+    """
+    if re.match(r'^\d{2}$', label) and 1 <= int(label) <= 12:
+        return int(label)
+    if label in _TIME_LABELS:
+        return label
+    return None
+
+
+def _parse_data_in_label(label):
+    """Invert _data_in_label.
+
+    Returns
+    -------
+    intvl_in, dtype_in_time, dtype_in_vert
+    """
+    assert label.startswith('from_'), "not a data in label: " + label
+    tokens = label[len('from_'):].split('_')
+    intvl_in = tokens[0]
+    if len(tokens) > 2 and tokens[-1] in _DTYPE_IN_VERT_LABELS:
+        return intvl_in, '_'.join(tokens[1:-1]), tokens[-1]
+    return intvl_in, '_'.join(tokens[1:]), False
+
+
+def _parse_ens_label(label):
+    """Invert _ens_label."""
+    if not label:
+        return None
+    if label == 'ens_mean':
+        return 'avg'
+    return int(label[len('mem'):]) - 1
+
+
+def _parse_region_label(label):
+    """Invert _region_label, returning the region's name."""
+    if not label:
+        return None
+    return label[len('region_'):]
+
+
+def _parse_yr_label(label):
+    """Invert _yr_label, returning the (start, end) years."""
+    years = [int(yr) for yr in label.split('-')]
+    return years[0], years[-1]
+
+
+def _split_model_run(label, model_runs=None):
+    """Split the '<model>.<run>' part of a file name, in which both the
+    model and the run string may themselves contain dots.
+    """
+    if model_runs:
+        for model_str, run_str in model_runs:
+            if label == '.'.join([model_str, run_str]):
+                return model_str, run_str
+        return None
+    # Model strings are 'Model instance "<name>"'
+    if '".' in label:
+        model_str, run_str = label.split('".', 1)
+        return model_str + '"', run_str
+    if '.' in label:
+        return tuple(label.split('.', 1))
+    return None
+
+
+def _parse_file_name(file_name, model_runs=None):
+    """Invert Calc._file_name, recovering the metadata of a Calc.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of an aospy output file.
+    model_runs : sequence of (str, str), optional
+        Candidate (model string, run string) pairs, used to split model and
+        run strings that contain dots.
+
+    Returns
+    -------
+    dict or None
+        Keys are 'name', 'intvl_out', 'dtype_out_time', 'dtype_out_vert',
+        'intvl_in', 'dtype_in_time', 'dtype_in_vert', 'model', 'run',
+        'ens_mem', 'region' (the region's name), 'yr_range' and 'extension'.
+        None if the string is not an aospy file name.
+    """
+    segments = file_name.split('.')
+    if len(segments) < 7:
+        return None
+    extension = segments.pop()
+    yr_lbl = segments.pop()
+    if not re.match(r'^\d{4}(-\d{4})?$', yr_lbl):
+        return None
+    region = None
+    if segments[-1].startswith('region_'):
+        region = _parse_region_label(segments.pop())
+    ens_mem = None
+    if re.match(r'^(ens_mean|mem\d+)$', segments[-1]):
+        ens_mem = _parse_ens_label(segments.pop())
+
+    from_inds = [i for i, seg in enumerate(segments)
+                 if seg.startswith('from_')]
+    if not from_inds:
+        return None
+    in_ind = from_inds[0]
+    model_run = _split_model_run('.'.join(segments[in_ind + 1:]), model_runs)
+    if model_run is None:
+        return None
+    intvl_in, dtype_in_time, dtype_in_vert = _parse_data_in_label(
+        segments[in_ind]
+    )
+
+    out_segments = segments[:in_ind]
+    time_inds = [i for i, seg in enumerate(out_segments)
+                 if i > 0 and _parse_time_label(seg) is not None]
+    if not time_inds:
+        return None
+    time_ind = time_inds[0]
+    dtype_out_vert = False
+    if out_segments[-1] in _DTYPE_OUT_VERT_LABELS:
+        dtype_out_vert = out_segments.pop()
+    dtype_out_time = '.'.join(out_segments[time_ind + 1:])
+    if not dtype_out_time:
+        return None
+
+    return {
+        'name': '.'.join(out_segments[:time_ind]),
+        'intvl_out': _parse_time_label(out_segments[time_ind]),
+        'dtype_out_time': dtype_out_time,
+        'dtype_out_vert': dtype_out_vert,
+        'intvl_in': intvl_in,
+        'dtype_in_time': dtype_in_time,
+        'dtype_in_vert': dtype_in_vert,
+        'model': model_run[0],
+        'run': model_run[1],
+        'ens_mem': ens_mem,
+        'region': region,
+        'yr_range': _parse_yr_label(yr_lbl),
+        'extension': extension
+    }
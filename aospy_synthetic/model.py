@@ -1,4 +1,5 @@
 """model.py: Model class of aospy for storing attributes of a GCM."""
+from .db.registry import register
 from .utils import dict_name_keys
 
 
@@ -39,6 +40,10 @@ class Model(object):
 
         self.grid_data_is_set = False
 
+        register(self)
+        for run in self.runs.values():
+            register(run)
+
     def __str__(self):
         return 'Model instance "' + self.name + '"'
 
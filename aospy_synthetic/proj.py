@@ -1,6 +1,7 @@
 """proj.py: aospy.Proj class for organizing work in single project."""
 import time
 
+from .db.registry import register
 from .utils import dict_name_keys
 
 
@@ -40,6 +41,14 @@ class Proj(object):
             for obj in obj_dict.values():
                 setattr(obj, 'proj', self)
 
+        # Models and runs created before this project can now resolve its
+        # backend
+        register(self)
+        for model in self.models.values():
+            register(model)
+            for run in model.runs.values():
+                register(run)
+
     def __str__(self):
         return 'Project instance "' + self.name + '"'
 
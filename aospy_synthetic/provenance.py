@@ -0,0 +1,209 @@
+"""provenance.py: fingerprints of the input files read by a Calc.
+
+A fingerprint records the path, size and modification time of an input file,
+and optionally a hash of its contents.  Fingerprints are stored in the backend
+alongside each Calc, so that a later sweep can skip Calcs whose output exists
+and whose inputs are unchanged, in the manner of make.
+"""
+import errno
+import hashlib
+import os
+from collections import namedtuple
+
+from past.builtins import basestring
+
+from .db.registry import get_backend
+
+
+class Fingerprint(namedtuple('Fingerprint',
+                             ['path', 'size', 'mtime', 'content_hash'])):
+    """Identity of an input file at the time it was read."""
+    __slots__ = ()
+
+
+def content_hash(path, block_size=1 << 20):
+    """Returns the hex md5 digest of the contents of a file."""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class StatCache(object):
+    """Caches the size and modification time of files one directory at a
+    time, so that the inputs of many Calcs are checked with one listing and
+    one stat per file rather than repeated stats of the same paths.
+    """
+    def __init__(self):
+        self._dirs = {}
+
+    def scan(self, direc):
+        """Stats every file in a directory tree at once.
+
+        Parameters
+        ----------
+        direc : str or sequence of str
+            Root directory (or directories) to scan, e.g. a Run's
+            ``data_in_direc``.
+        """
+        if not isinstance(direc, basestring):
+            for d in direc:
+                self.scan(d)
+            return
+        for root, dirs, files in os.walk(direc):
+            self._scan_dir(root, files)
+
+    def _scan_dir(self, direc, names=None):
+        if names is None:
+            try:
+                names = os.listdir(direc)
+            except OSError:
+                names = []
+        stats = {}
+        for name in names:
+            try:
+                st = os.stat(os.path.join(direc, name))
+            except OSError:
+                continue
+            stats[name] = (st.st_size, st.st_mtime)
+        self._dirs[direc] = stats
+        return stats
+
+    def stat(self, path):
+        """Returns (size, mtime) of a file, or None if it does not exist."""
+        direc, name = os.path.split(os.path.abspath(path))
+        stats = self._dirs.get(direc)
+        if stats is None:
+            stats = self._scan_dir(direc)
+        return stats.get(name)
+
+    def invalidate(self, path=None):
+        """Forgets cached stats of a file's directory, or of all files."""
+        if path is None:
+            self._dirs.clear()
+        else:
+            self._dirs.pop(os.path.dirname(os.path.abspath(path)), None)
+
+
+def fingerprint(path, with_content_hash=False, stat_cache=None):
+    """Returns the Fingerprint of an existing file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    with_content_hash : bool
+        Whether to also hash the contents of the file.
+    stat_cache : StatCache, optional
+        Cache to look up the size and modification time in.
+
+    Raises
+    ------
+    OSError
+        If the file does not exist.
+    """
+    path = os.path.abspath(path)
+    if stat_cache is None:
+        st = os.stat(path)
+        size, mtime = st.st_size, st.st_mtime
+    else:
+        stats = stat_cache.stat(path)
+        if stats is None:
+            raise OSError(errno.ENOENT, 'No such file', path)
+        size, mtime = stats
+    digest = content_hash(path) if with_content_hash else None
+    return Fingerprint(path, size, mtime, digest)
+
+
+def _matches(stored, stat_cache, check_content):
+    """Returns whether a file still matches its stored fingerprint."""
+    current = stat_cache.stat(stored.path)
+    if current is None:
+        return False
+    size, mtime = current
+    if size != stored.size:
+        return False
+    if mtime == stored.mtime:
+        return True
+    # Touched but possibly unchanged
+    return bool(check_content and stored.content_hash and
+                content_hash(stored.path) == stored.content_hash)
+
+
+def record_inputs(calc, paths, backend=None, with_content_hash=False):
+    """Stores fingerprints of the input files a Calc read in its backend.
+
+    Parameters
+    ----------
+    calc : Calc
+        Calc whose inputs were read.
+    paths : sequence of str
+        Paths of the input files.
+    backend : AbstractBackend, optional
+        Defaults to the backend of the Calc or its parents.
+    with_content_hash : bool
+        Whether to also hash the contents of each input file.
+
+    Returns
+    -------
+    list of Fingerprint
+    """
+    if backend is None:
+        backend = get_backend(calc)
+    fingerprints = [fingerprint(path, with_content_hash) for path in paths]
+    backend.set_input_fingerprints(calc, fingerprints)
+    return fingerprints
+
+
+def stale_calcs(calcs, backend=None, check_content=False, stat_cache=None):
+    """Returns the Calcs that need to be (re)computed.
+
+    A Calc is up to date if its output file exists, fingerprints of its
+    inputs are stored in the backend, and every input still has the stored
+    size and modification time (or, if ``check_content`` is True and a
+    content hash was stored, the same contents).  Each Run's
+    ``data_in_direc`` is scanned once and the stored fingerprints of all Calcs
+    are fetched with a single backend query.
+
+    Parameters
+    ----------
+    calcs : sequence of Calc
+    backend : AbstractBackend, optional
+        Defaults to the backend of the first Calc or its parents.
+    check_content : bool
+        Whether to compare content hashes of touched input files.
+    stat_cache : StatCache, optional
+        Shared cache of file stats; a new one is used if not given.
+
+    Returns
+    -------
+    list of Calc
+    """
+    calcs = list(calcs)
+    if not calcs:
+        return []
+    if backend is None:
+        backend = get_backend(calcs[0])
+    if stat_cache is None:
+        stat_cache = StatCache()
+
+    scanned = set()
+    for calc in calcs:
+        direc = calc.run.data_in_direc
+        key = (direc if isinstance(direc, basestring)
+               else tuple(direc or ()))
+        if direc and key not in scanned:
+            stat_cache.scan(direc)
+            scanned.add(key)
+
+    stored = backend.get_input_fingerprints(calcs)
+    stale = []
+    for calc in calcs:
+        fingerprints = [Fingerprint(*fp) for fp in stored.get(hash(calc), ())]
+        if (not fingerprints or
+                stat_cache.stat(calc.path_scratch) is None or
+                not all(_matches(fp, stat_cache, check_content)
+                        for fp in fingerprints)):
+            stale.append(calc)
+    return stale
@@ -0,0 +1,116 @@
+"""reader.py: load the input data of upcoming time chunks in the background.
+
+A Calc spanning many ``data_in_dur``-year input files is computed one time
+chunk at a time (see ``Calc._time_chunks``), each through a ``dag.Plan``.
+Loading a chunk's variables (reading and decoding its files) and reducing
+them alternate, so the CPU idles while files are read and the disk while
+data is reduced.  A BlockReader loads the variables of the next chunks on a
+background thread while the current one is reduced, up to a number of
+chunks ahead and a number of bytes of loaded data waiting to be used.
+Inputs read through netCDF4 are read holding ``io.hdf5_lock``, as are grid
+files read while reducing, so HDF5 is never entered by two threads at once;
+netCDF3 inputs, memory-mapped by scipy, are read without it.
+"""
+import functools
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class BlockReader(object):
+    """Loads the input variables of a sequence of Plans ahead of their
+    execution.
+
+    Iterating over a BlockReader yields each Plan with a function returning
+    the data of its loaded nodes, to be passed to ``Plan.execute``.  The
+    variables are loaded in order, one at a time.
+
+    Parameters
+    ----------
+    plans : sequence of Plan
+    depth : int
+        Number of Plans after the current one to load ahead; 0 to load
+        each Plan only when it is executed.
+    max_bytes : int, optional
+        Loading ahead stops while the loaded data of the Plans after the
+        current one, plus the size of the largest Plan's data so far as an
+        estimate of the next one, would exceed this.  The first Plan is
+        loaded before any other to estimate their size.  Unlimited by
+        default.
+
+    Attributes
+    ----------
+    bytes_loaded : int
+    wait_time : float
+        Seconds spent waiting for data still being loaded.
+    """
+    def __init__(self, plans, depth=1, max_bytes=None):
+        self.plans = list(plans)
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.bytes_loaded = 0
+        self.wait_time = 0.
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        # Futures of the loaded nodes, and bytes loaded so far, of each Plan
+        # started
+        self._loads = {}
+        self._bytes = {}
+
+    def __len__(self):
+        return len(self.plans)
+
+    def __iter__(self):
+        try:
+            for i, plan in enumerate(self.plans):
+                self._fill(i)
+                yield plan, functools.partial(self._result, self._loads.pop(i))
+        finally:
+            for loads in self._loads.values():
+                for future in loads.values():
+                    future.cancel()
+            self._loads.clear()
+            self._pool.shutdown()
+
+    def _result(self, loads, node):
+        """Waits for and returns the data of a loaded node."""
+        future = loads.pop(node)
+        start = time.time()
+        data = future.result()
+        with self._lock:
+            self.wait_time += time.time() - start
+        return data
+
+    def _load(self, index, node):
+        data = node.evaluate({})
+        with self._lock:
+            self._bytes[index] += data.nbytes
+            self.bytes_loaded += data.nbytes
+        return data
+
+    def _fill(self, current):
+        """Starts loading the current Plan, if not yet started, and the
+        following ones within the depth and memory limits.
+        """
+        while (len(self._bytes) < len(self.plans) and
+               len(self._bytes) <= current + self.depth):
+            index = len(self._bytes)
+            if index > current and self.max_bytes is not None:
+                if current == 0:
+                    wait(self._loads[0].values())
+                with self._lock:
+                    estimate = max(self._bytes[i] for i in range(current + 1))
+                    pending = sum(
+                        max(self._bytes[i], estimate) if any(
+                            not future.done() for future in loads.values()
+                        ) else self._bytes[i]
+                        for i, loads in self._loads.items() if i > current
+                    )
+                if pending + estimate > self.max_bytes:
+                    break
+            self._bytes[index] = 0
+            self._loads[index] = {
+                node: self._pool.submit(self._load, index, node)
+                for node in self.plans[index].nodes if not node.inputs
+            }
@@ -0,0 +1,174 @@
+"""reductions.py: time reductions computed one chunk of data at a time.
+
+Each accumulator keeps running statistics of the data it has been given, so
+that a Calc's inputs can be loaded, derived and reduced one time chunk at a
+time, with memory bounded by a single chunk rather than the whole date
+range.  Missing values are skipped, as by the corresponding xray reductions.
+
+The running statistics are sufficient statistics: those of disjoint date
+ranges combine into those of their union.  Calcs store them next to their
+outputs (see ``Accumulator.state``), so that the output over a longer date
+range is computed from the stored statistics of part of it and the data of
+the remaining years only.
+"""
+import numpy as np
+import pandas as pd
+import xray
+
+from .__config__ import TIME_STR, YEAR_STR
+from .timedate import time_index
+
+# Extension of the files holding the running statistics of Calc outputs
+STATS_EXT = '.stats.nc'
+
+
+class Accumulator(object):
+    """Reduces data along time from successive chunks."""
+    def add(self, arr):
+        """Adds a chunk of data with a time dimension."""
+        raise NotImplementedError()
+
+    def result(self):
+        """Returns the reduction of all data added."""
+        raise NotImplementedError()
+
+    def state(self):
+        """Returns the running statistics of all data added, as a
+        Dataset.
+        """
+        raise NotImplementedError()
+
+    def merge_state(self, state):
+        """Combines the running statistics with those of other data, as
+        returned by ``state``.
+        """
+        raise NotImplementedError()
+
+
+class MeanAccumulator(Accumulator):
+    """Time mean, from running sums and counts."""
+    def __init__(self):
+        self.total = None
+        self.count = None
+
+    def add(self, arr):
+        self._combine(arr.sum(TIME_STR), arr.count(TIME_STR))
+
+    def _combine(self, total, count):
+        if self.total is None:
+            self.total, self.count = total, count
+        else:
+            self.total = self.total + total
+            self.count = self.count + count
+
+    def result(self):
+        return self.total / self.count
+
+    def state(self):
+        return xray.Dataset({'total': self.total, 'count': self.count})
+
+    def merge_state(self, state):
+        self._combine(state['total'], state['count'])
+
+
+class StdAccumulator(Accumulator):
+    """Time standard deviation, from running counts, means and sums of
+    squared deviations from the mean.
+
+    The chunks are combined as in Chan et al. (1979), which, unlike a sum of
+    squares, does not lose precision when the standard deviation is small
+    compared to the mean.
+    """
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def add(self, arr):
+        count = arr.count(TIME_STR)
+        mean = (arr.sum(TIME_STR) / count).fillna(0.)
+        self._combine(count, mean, ((arr - mean) ** 2).sum(TIME_STR))
+
+    def _combine(self, count, mean, m2):
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        total_count = self.count + count
+        delta = mean - self.mean
+        self.mean = ((self.count * self.mean + count * mean) /
+                     total_count).fillna(0.)
+        self.m2 = (self.m2 + m2 +
+                   (delta ** 2 * self.count * count / total_count).fillna(0.))
+        self.count = total_count
+
+    def result(self):
+        return np.sqrt(self.m2 / self.count)
+
+    def state(self):
+        return xray.Dataset({'count': self.count, 'mean': self.mean,
+                             'm2': self.m2})
+
+    def merge_state(self, state):
+        self._combine(state['count'], state['mean'], state['m2'])
+
+
+class YearlyMeanAccumulator(Accumulator):
+    """Time series of yearly means, from running sums and counts per year.
+
+    A year may span several chunks.
+    """
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, arr):
+        years = time_index(arr[TIME_STR]).year
+        for year in np.unique(years):
+            part = arr.isel(**{TIME_STR: np.flatnonzero(years == year)})
+            self._combine(int(year), part.sum(TIME_STR),
+                          part.count(TIME_STR))
+
+    def _combine(self, year, total, count):
+        if year in self.totals:
+            self.totals[year] = self.totals[year] + total
+            self.counts[year] = self.counts[year] + count
+        else:
+            self.totals[year] = total
+            self.counts[year] = count
+
+    def result(self):
+        years = sorted(self.totals)
+        return xray.concat(
+            [self.totals[year] / self.counts[year] for year in years],
+            dim=pd.Index(years, name=YEAR_STR)
+        )
+
+    def state(self):
+        years = pd.Index(sorted(self.totals), name=YEAR_STR)
+        return xray.Dataset({
+            'total': xray.concat([self.totals[year] for year in years],
+                                 dim=years),
+            'count': xray.concat([self.counts[year] for year in years],
+                                 dim=years)
+        })
+
+    def merge_state(self, state):
+        for i, year in enumerate(state[YEAR_STR].values):
+            part = state.isel(**{YEAR_STR: i}).drop(YEAR_STR)
+            self._combine(int(year), part['total'], part['count'])
+
+
+ACCUMULATORS = {
+    'av': MeanAccumulator,
+    'avg': MeanAccumulator,
+    'std': StdAccumulator,
+    'ts': YearlyMeanAccumulator
+}
+
+
+def accumulator(reduction):
+    """Returns a new accumulator for the given dtype_out_time."""
+    try:
+        return ACCUMULATORS[reduction]()
+    except KeyError:
+        raise ValueError("Unsupported dtype_out_time '{}'".format(reduction))
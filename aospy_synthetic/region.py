@@ -1,4 +1,10 @@
 """region.py: Region class and region_inst()."""
+import hashlib
+
+import numpy as np
+import xray
+
+from .__config__ import LAT_STR, LON_STR, REGION_STR
 
 
 class Region(object):
@@ -28,3 +34,171 @@ class Region(object):
         return hash(self.name)
 
     __repr__ = __str__
+
+    def digest(self):
+        """Returns a digest of the attributes that determine the mask."""
+        bounds = [(tuple(lat_bounds), tuple(lon_bounds))
+                  for lat_bounds, lon_bounds in self.mask_bounds]
+        return hashlib.md5(
+            repr((bounds, self.do_land_mask)).encode('utf-8')
+        ).hexdigest()
+
+    def mask(self, lat, lon):
+        """Returns a boolean (lat, lon) array of the grid points within the
+        region's bounds.
+
+        Bounds are inclusive.  Longitudes are compared modulo 360, and a
+        longitude range whose start exceeds its end wraps around 0.
+        """
+        lat = np.asarray(lat)[:, np.newaxis]
+        lon = np.mod(np.asarray(lon), 360.)[np.newaxis, :]
+        mask = np.zeros((lat.size, lon.size), dtype=bool)
+        for (lat0, lat1), (lon0, lon1) in self.mask_bounds:
+            in_lat = (lat >= lat0) & (lat <= lat1)
+            if lon1 - lon0 >= 360.:
+                in_lon = np.ones_like(lon, dtype=bool)
+            else:
+                lon0, lon1 = np.mod(lon0, 360.), np.mod(lon1, 360.)
+                if lon0 <= lon1:
+                    in_lon = (lon >= lon0) & (lon <= lon1)
+                else:
+                    in_lon = (lon >= lon0) | (lon <= lon1)
+            mask |= in_lat & in_lon
+        return mask
+
+    def weights(self, lat, lon, area, land_mask=None):
+        """Returns the (lat, lon) area weights of the region's grid points.
+
+        Parameters
+        ----------
+        lat, lon : array
+            Grid coordinates.
+        area : array
+            (lat, lon) area of each grid cell.
+        land_mask : array, optional
+            (lat, lon) land fraction of each grid cell; required if
+            ``do_land_mask`` is set.  With ``do_land_mask='ocean'`` the
+            ocean fraction is used instead.
+        """
+        weights = self.mask(lat, lon) * np.asarray(area, dtype=float)
+        if self.do_land_mask:
+            if land_mask is None:
+                raise ValueError("{} requires a land mask".format(self))
+            land_mask = np.asarray(land_mask, dtype=float)
+            if self.do_land_mask == 'ocean':
+                land_mask = 1. - land_mask
+            weights = weights * land_mask
+        return weights
+
+
+def _digest(*arrays):
+    md5 = hashlib.md5()
+    for arr in arrays:
+        if arr is None:
+            md5.update(b'None')
+        else:
+            arr = np.ascontiguousarray(arr, dtype=float)
+            md5.update(repr(arr.shape).encode('utf-8'))
+            md5.update(arr.tobytes())
+    return md5.hexdigest()
+
+
+def grid_area(lat, lon):
+    """Returns (lat, lon) weights proportional to the area of the cells of a
+    regular grid, i.e. the cosine of latitude.
+    """
+    return np.repeat(np.cos(np.deg2rad(np.asarray(lat)))[:, np.newaxis],
+                     len(lon), axis=1)
+
+
+class MaskCache(object):
+    """Cache of the area weights of regions on model grids, keyed by
+    (region digest, grid digest).
+    """
+    def __init__(self):
+        self._weights = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._weights)
+
+    def clear(self):
+        self._weights.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def weights(self, regions, lat, lon, area=None, land_mask=None):
+        """Returns a (region, lat * lon) matrix of area weights.
+
+        Parameters
+        ----------
+        regions : sequence of Region
+        lat, lon : array
+            Grid coordinates.
+        area : array, optional
+            (lat, lon) cell areas.  Defaults to ``grid_area(lat, lon)``.
+        land_mask : array, optional
+            (lat, lon) land fraction, for regions with ``do_land_mask``.
+        """
+        grid = _digest(lat, lon, area, land_mask)
+        if area is None:
+            area = grid_area(lat, lon)
+        rows = []
+        for region in regions:
+            key = (region.digest(), grid)
+            if key in self._weights:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._weights[key] = region.weights(
+                    lat, lon, area, land_mask
+                ).ravel()
+            rows.append(self._weights[key])
+        return np.vstack(rows)
+
+
+mask_cache = MaskCache()
+
+
+def regional_averages(arr, regions, area=None, land_mask=None, cache=None):
+    """Area-weighted averages of an array over several regions at once.
+
+    The latitude and longitude dimensions are flattened and the averages
+    of all regions computed as one matrix product with the regions' weights.
+    Missing values are skipped.
+
+    Parameters
+    ----------
+    arr : DataArray
+        Array with latitude and longitude dimensions.
+    regions : sequence of Region
+    area, land_mask : array, optional
+        See ``MaskCache.weights``.
+    cache : MaskCache, optional
+        Defaults to the module's ``mask_cache``.
+
+    Returns
+    -------
+    DataArray
+        The latitude and longitude dimensions of ``arr`` are replaced by a
+        region dimension, labeled by the regions' names.
+    """
+    if cache is None:
+        cache = mask_cache
+    weights = cache.weights(regions, arr[LAT_STR].values,
+                            arr[LON_STR].values, area, land_mask)
+    other_dims = [dim for dim in arr.dims if dim not in (LAT_STR, LON_STR)]
+    arr = arr.transpose(*(other_dims + [LAT_STR, LON_STR]))
+    values = arr.values.reshape(-1, weights.shape[1])
+    valid = ~np.isnan(values)
+    totals = np.dot(np.where(valid, values, 0.), weights.T)
+    norms = np.dot(valid.astype(float), weights.T)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = totals / norms
+
+    shape = [arr[dim].size for dim in other_dims] + [len(regions)]
+    coords = {dim: arr[dim] for dim in other_dims if dim in arr.coords}
+    coords[REGION_STR] = [region.name for region in regions]
+    return xray.DataArray(averages.reshape(shape), coords=coords,
+                          dims=other_dims + [REGION_STR], name=arr.name)
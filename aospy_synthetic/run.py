@@ -1,5 +1,6 @@
 """`Run` class; for storing attributes of a model run or obs product."""
 
+from .db.registry import register
 from .timedate import TimeManager
 
 
@@ -50,6 +51,10 @@ class Run(object):
         self.ens_mem_suffix = ens_mem_suffix
         self.data_in_direc = self._set_direc(data_in_direc, ens_mem_prefix,
                                              ens_mem_ext, ens_mem_suffix)
+        # FileIndex of each input directory; see file_index.run_file_index
+        self._file_indices = {}
+
+        register(self)
 
     def __hash__(self):
         return hash((str(type(self)), self.name, self.model))
@@ -0,0 +1,199 @@
+"""staging.py: background staging of input files from archive to scratch.
+
+Input data often lives on a slow archive filesystem, while Calcs are best
+run on copies on a fast scratch filesystem.  A Stager copies archive files
+to the same relative paths under a scratch root with a bounded pool of
+threads, so that the inputs of upcoming Calcs (or time chunks) are copied
+while earlier ones are computed.  Staged files are evicted least recently
+used first to keep the scratch copies under a byte quota; files in use are
+never evicted.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import errno
+import os
+import shutil
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .__config__ import ARCHIVE_ROOT, SCRATCH_ROOT
+
+
+class Stager(object):
+    """Copies files under an archive root to a scratch root in background
+    threads.
+
+    Parameters
+    ----------
+    archive_root, scratch_root : str, optional
+        Default to ``ARCHIVE_ROOT`` and ``SCRATCH_ROOT`` of ``__config__``.
+        Files outside ``archive_root`` are used in place.
+    max_workers : int
+        Maximum number of files copied at once.
+    quota : int, optional
+        Maximum number of bytes of staged files to keep, except for files in
+        use.  Unlimited by default.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of files that were, or were not yet, staged when needed.
+    evictions : int
+        Number of staged files removed to stay under the quota.
+    bytes_copied : int
+    """
+    def __init__(self, archive_root=None, scratch_root=None, max_workers=4,
+                 quota=None):
+        self.archive_root = os.path.abspath(archive_root or ARCHIVE_ROOT)
+        self.scratch_root = os.path.abspath(scratch_root or SCRATCH_ROOT)
+        self.quota = quota
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_copied = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        # Future of the size of each staged file, least recently used first
+        self._staged = OrderedDict()
+        self._pins = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def __len__(self):
+        return len(self._staged)
+
+    def shutdown(self, wait=True):
+        """Stops the copying threads.  Files already staged are kept."""
+        self._pool.shutdown(wait=wait)
+
+    def scratch_path(self, path):
+        """Returns the path a file is staged to, or None if it is not under
+        the archive root.
+        """
+        rel = os.path.relpath(os.path.abspath(path), self.archive_root)
+        if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+            return None
+        return os.path.join(self.scratch_root, rel)
+
+    def staged_bytes(self):
+        """Total size of the files staged so far."""
+        with self._lock:
+            return sum(future.result() for future in self._staged.values()
+                       if future.done() and future.exception() is None)
+
+    def prefetch(self, paths):
+        """Starts staging files, in order, without waiting for them."""
+        for path in paths:
+            self._stage(path)
+
+    def _stage(self, path, pin=False):
+        """Returns the Future of the staging of a file, starting it if
+        needed and marking the file most recently used; None if the file is
+        not under the archive root.
+        """
+        dest = self.scratch_path(path)
+        if dest is None:
+            return None
+        with self._lock:
+            future = self._staged.pop(dest, None)
+            if future is None or (future.done() and
+                                  future.exception() is not None):
+                future = self._pool.submit(self._copy, path, dest)
+            self._staged[dest] = future
+            if pin:
+                self._pins[dest] = self._pins.get(dest, 0) + 1
+        return future
+
+    def _copy(self, path, dest):
+        """Copies a file unless an identical copy is already staged, then
+        evicts files over the quota.  Returns the file's size.
+        """
+        stat = os.stat(path)
+        try:
+            dest_stat = os.stat(dest)
+        except OSError:
+            dest_stat = None
+        if (dest_stat is None or dest_stat.st_size != stat.st_size or
+                int(dest_stat.st_mtime) != int(stat.st_mtime)):
+            try:
+                os.makedirs(os.path.dirname(dest))
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            tmp = '{}.{}.tmp'.format(dest, threading.current_thread().ident)
+            shutil.copy2(path, tmp)
+            os.rename(tmp, dest)
+            with self._lock:
+                self.bytes_copied += stat.st_size
+        self._evict(keep=dest)
+        return stat.st_size
+
+    def _evict(self, keep=None):
+        """Removes staged files, least recently used first, until the rest
+        fit in the quota.  Files in use or being copied are kept.
+        """
+        if self.quota is None:
+            return
+        with self._lock:
+            sizes = OrderedDict(
+                (dest, future.result())
+                for dest, future in self._staged.items()
+                if future.done() and future.exception() is None
+            )
+            total = sum(sizes.values())
+            if keep is not None and keep not in sizes:
+                total += os.path.getsize(keep)
+            for dest, size in sizes.items():
+                if total <= self.quota:
+                    break
+                if self._pins.get(dest) or dest == keep:
+                    continue
+                try:
+                    os.remove(dest)
+                except OSError:
+                    pass
+                del self._staged[dest]
+                total -= size
+                self.evictions += 1
+
+    @contextmanager
+    def staged(self, paths):
+        """Stages files, waiting for them, and keeps them from being
+        evicted while in use.
+
+        Yields
+        ------
+        list of str
+            Path to read each file from: its scratch copy, or the file
+            itself if it is not under the archive root.
+        """
+        local_paths = []
+        pinned = []
+        try:
+            for path in paths:
+                future = self._stage(path, pin=True)
+                if future is None:
+                    local_paths.append(path)
+                    continue
+                dest = self.scratch_path(path)
+                pinned.append(dest)
+                with self._lock:
+                    if future.done():
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                future.result()
+                local_paths.append(dest)
+            yield local_paths
+        finally:
+            with self._lock:
+                for dest in pinned:
+                    self._pins[dest] -= 1
+                    if not self._pins[dest]:
+                        del self._pins[dest]
+            self._evict()
@@ -0,0 +1,280 @@
+"""tar_index.py: indexed random access to the members of tar archives.
+
+The outputs of a run are archived in a single ``data.tar`` (see
+``Calc._path_archive``).  Finding a member with ``tarfile`` means reading
+every header before it, and appending with ``tarfile`` reads the whole
+archive to find its end.  A TarIndex maps each member's name to the offset
+and size of its data, so that a member is read with one seek, members are
+appended at the recorded end of the archive without rewriting it, and many
+members are extracted in one pass in offset order.
+
+Indexes are kept in a sidecar file next to each archive and, optionally, in
+a backend.  They record the size and mtime of the archive when indexed and
+are rebuilt by scanning the archive if it was changed by other means.
+Appends hold an exclusive lock on the archive, so that processes archiving
+the outputs of the same run concurrently append one after the other.
+"""
+import errno
+import fcntl
+import json
+import os
+import tarfile
+
+INDEX_EXT = '.idx'
+_COPY_SIZE = 1 << 20
+
+
+def _stamp(path):
+    """Returns the [size, mtime] of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+
+def _copy(src, dst, size):
+    """Copies ``size`` bytes from one open file to another."""
+    while size > 0:
+        data = src.read(min(size, _COPY_SIZE))
+        if not data:
+            raise IOError('Unexpected end of file')
+        dst.write(data)
+        size -= len(data)
+
+
+class StaleIndexError(IOError):
+    """The archive changed since it was indexed."""
+
+
+class TarIndex(object):
+    """Index of the regular file members of a tar archive.
+
+    Attributes
+    ----------
+    path : str
+        Path of the archive.
+    members : dict
+        Maps each member name to the (offset, size) of its data.  If a name
+        occurs more than once, the last member wins, as on extraction.
+    end : int
+        Offset just past the data of the last member, where the next member
+        is appended.
+    stamp : list
+        [size, mtime] of the archive when indexed; None if it did not exist.
+    backend : AbstractBackend, optional
+        Backend the index is stored in along with its sidecar file.
+    """
+    def __init__(self, path, members=None, end=0, stamp=None, backend=None):
+        self.path = path
+        self.members = {} if members is None else members
+        self.end = end
+        self.stamp = stamp
+        self.backend = backend
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, name):
+        return name in self.members
+
+    @property
+    def sidecar_path(self):
+        return self.path + INDEX_EXT
+
+    def is_current(self):
+        """Whether the archive is unchanged since it was indexed."""
+        return self.stamp == _stamp(self.path)
+
+    @classmethod
+    def scan(cls, path, backend=None):
+        """Indexes an archive by reading all of its headers."""
+        members = {}
+        end = 0
+        if os.path.exists(path):
+            try:
+                with tarfile.open(path) as tar:
+                    for member in tar:
+                        if member.isfile():
+                            members[member.name] = (member.offset_data,
+                                                    member.size)
+                    end = tar.offset
+            except tarfile.ReadError:
+                # An archive without members is empty or all zeros
+                with open(path, 'rb') as f:
+                    if f.read(tarfile.BLOCKSIZE).strip(b'\0'):
+                        raise
+        return cls(path, members, end, _stamp(path), backend)
+
+    def state(self):
+        """Returns the index as JSON-serializable data."""
+        return {'members': {name: list(span)
+                            for name, span in self.members.items()},
+                'end': self.end, 'stamp': self.stamp}
+
+    @classmethod
+    def from_state(cls, path, state, backend=None):
+        """Returns an index from the output of ``state``."""
+        return cls(path, {name: tuple(span) for name, span
+                          in state['members'].items()},
+                   state['end'], state['stamp'], backend)
+
+    def save(self):
+        """Stores the index in the backend and writes the sidecar file."""
+        if self.backend is not None:
+            self.backend.set_tar_index(self.path, self.state())
+        tmp_path = '{}.{}.tmp'.format(self.sidecar_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state(), f)
+        os.rename(tmp_path, self.sidecar_path)
+
+    def read(self, name):
+        """Returns the data of a member."""
+        offset, size = self.members[name]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def extract(self, targets):
+        """Extracts members to files, reading them in offset order.
+
+        Parameters
+        ----------
+        targets : dict
+            Maps member names to the paths to write them to.
+        """
+        names = sorted(targets, key=lambda name: self.members[name][0])
+        with open(self.path, 'rb') as f:
+            for name in names:
+                offset, size = self.members[name]
+                dest = targets[name]
+                try:
+                    os.makedirs(os.path.dirname(dest))
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                tmp_path = '{}.{}.tmp'.format(dest, os.getpid())
+                f.seek(offset)
+                with open(tmp_path, 'wb') as out:
+                    _copy(f, out, size)
+                os.rename(tmp_path, dest)
+
+    def append(self, files):
+        """Appends files to the archive at its recorded end, without reading
+        or rewriting the existing members, and updates the index.
+
+        Parameters
+        ----------
+        files : sequence
+            (member name, path) of each file to add.  A member of the same
+            name as an existing one supersedes it.
+
+        Raises
+        ------
+        StaleIndexError
+            If the archive changed since it was indexed, e.g. by another
+            process appending to it; see ``append_files``.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, 'r+b') as f:
+            # Held until the file is closed
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # An archive created just now by this open is still empty
+            if not (self.is_current() or (self.stamp is None and
+                                          os.fstat(fd).st_size == 0)):
+                raise StaleIndexError(
+                    '{} changed since it was indexed'.format(self.path)
+                )
+            f.seek(self.end)
+            for name, src_path in files:
+                info = tarfile.TarInfo(name)
+                stat = os.stat(src_path)
+                info.size = stat.st_size
+                info.mtime = int(stat.st_mtime)
+                info.mode = 0o644
+                header = info.tobuf(tarfile.GNU_FORMAT)
+                f.write(header)
+                with open(src_path, 'rb') as src:
+                    _copy(src, f, info.size)
+                remainder = info.size % tarfile.BLOCKSIZE
+                if remainder:
+                    f.write(b'\0' * (tarfile.BLOCKSIZE - remainder))
+                self.members[name] = (self.end + len(header), info.size)
+                self.end = f.tell()
+            # End-of-archive marker
+            f.write(b'\0' * (2 * tarfile.BLOCKSIZE))
+            f.truncate()
+            f.flush()
+            self.stamp = _stamp(self.path)
+            self.save()
+
+
+_indices = {}
+
+
+def tar_index(path, backend=None):
+    """Returns an up-to-date TarIndex of an archive.
+
+    The index is taken from memory, the sidecar file or the backend,
+    whichever is current first, and otherwise rebuilt by scanning the
+    archive and saved.  A missing archive has an empty index.
+
+    Parameters
+    ----------
+    path : str
+        Path of the archive.
+    backend : AbstractBackend, optional
+        Backend in which indexes are stored.
+    """
+    index = _indices.get(path)
+    if index is not None and index.is_current():
+        index.backend = backend
+        return index
+
+    stamp = _stamp(path)
+    states = []
+    try:
+        with open(path + INDEX_EXT) as f:
+            states.append(json.load(f))
+    except (IOError, OSError, ValueError):
+        pass
+    if backend is not None:
+        states.append(backend.get_tar_index(path))
+    for state in states:
+        if state is not None and state['stamp'] == stamp:
+            index = TarIndex.from_state(path, state, backend)
+            break
+    else:
+        index = TarIndex.scan(path, backend)
+        if stamp is not None:
+            try:
+                index.save()
+            except (IOError, OSError):
+                # Read-only archive directory; the index is rebuilt next time
+                pass
+    _indices[path] = index
+    return index
+
+
+def append_files(path, files, backend=None, max_attempts=5):
+    """Appends files to an archive, reindexing it if another process
+    appended to it since it was last indexed.
+
+    Parameters
+    ----------
+    path : str
+        Path of the archive.
+    files : sequence
+        (member name, path) of each file to add; see ``TarIndex.append``.
+    backend : AbstractBackend, optional
+        Backend in which indexes are stored.
+    max_attempts : int
+        Number of times the archive is reindexed before giving up.
+    """
+    for attempt in range(max_attempts):
+        try:
+            tar_index(path, backend).append(files)
+            return
+        except StaleIndexError:
+            if attempt == max_attempts - 1:
+                raise
@@ -0,0 +1,185 @@
+"""Synthetic model output for testing Calc computations.
+
+Writes small netCDF files in the 'one_dir' directory structure and builds
+the Proj, Model and Run objects pointing at them.
+"""
+import datetime
+import os
+
+import numpy as np
+import xray
+
+from aospy_synthetic.calc import Calc, CalcInterface
+from aospy_synthetic.model import Model
+from aospy_synthetic.proj import Proj
+from aospy_synthetic.run import Run
+from aospy_synthetic.timedate import days_from_date
+
+LAT = np.array([-45., -15., 15., 45.])
+LON = np.array([60., 180., 300.])
+TIME_UNITS = 'days since 0001-01-01 00:00:00'
+
+
+def monthly_times(start_year, end_year, calendar=None):
+    """Days since 0001-01-01 of the middle of each month."""
+    if calendar is not None:
+        years, months = np.divmod(np.arange(12 * start_year,
+                                            12 * (end_year + 1)), 12)
+        return days_from_date(years, months + 1, 15,
+                              calendar).astype(float)
+    ref = datetime.datetime(1, 1, 1)
+    return np.array([
+        (datetime.datetime(year, month, 15) - ref).days
+        for year in range(start_year, end_year + 1) for month in range(1, 13)
+    ], dtype=float)
+
+
+def make_data(name, times, seed=0, calendar=None):
+    """Returns a (time, lat, lon) Dataset of random values."""
+    values = np.random.RandomState(seed).rand(len(times), len(LAT), len(LON))
+    time_attrs = {'units': TIME_UNITS}
+    if calendar is not None:
+        time_attrs['calendar'] = calendar
+    return xray.Dataset(
+        {name: (('time', 'lat', 'lon'), values)},
+        coords={'time': ('time', times, time_attrs),
+                'lat': ('lat', LAT), 'lon': ('lon', LON)}
+    )
+
+
+def write_run(direc, var_names, start_year=1, end_year=4, name='synthetic',
+              backend=None, data_in_dur=None, calendar=None, times=None):
+    """Writes one monthly file per variable and returns the Proj, Model and
+    Run objects describing them.
+
+    ``times``, in days since 0001-01-01, default to the middle of each
+    month.
+
+    Returns
+    -------
+    proj, model, run, data
+        ``data`` maps each variable name to the Dataset written.
+    """
+    if times is None:
+        times = monthly_times(start_year, end_year, calendar)
+    data = {}
+    files = {}
+    for seed, var_name in enumerate(var_names):
+        data[var_name] = make_data(var_name, times, seed=seed,
+                                   calendar=calendar)
+        files[var_name] = '{}.nc'.format(var_name)
+        data[var_name].to_netcdf(os.path.join(direc, files[var_name]))
+    run = Run(
+        name=name,
+        description='Synthetic run',
+        data_in_direc=direc,
+        data_in_dir_struc='one_dir',
+        data_in_dur=data_in_dur or end_year - start_year + 1,
+        data_in_start_date='{:04d}-01-01'.format(start_year),
+        data_in_end_date='{:04d}-12-31'.format(end_year),
+        data_in_files={'monthly': files}
+    )
+    model = Model(name=name, runs=[run])
+    proj = Proj(name, direc_out=direc, models=[model], verbose=False,
+                backend=backend)
+    return proj, model, run, data
+
+
+def write_ensemble_run(direc, var_names, num_members=3, start_year=1,
+                       end_year=4, name='synthetic_ens', backend=None):
+    """Writes the monthly files of each variable for each ensemble member,
+    in one directory per member, and returns the Proj, Model and Run
+    objects describing them, as ``write_run``.
+
+    ``data`` maps each variable name to the list of each member's Dataset.
+    """
+    times = monthly_times(start_year, end_year)
+    exts = ['{:02d}'.format(i + 1) for i in range(num_members)]
+    data = {var_name: [] for var_name in var_names}
+    files = {}
+    for i, ext in enumerate(exts):
+        member_direc = os.path.join(direc, 'ens' + ext)
+        os.makedirs(member_direc)
+        for seed, var_name in enumerate(var_names):
+            ds = make_data(var_name, times, seed=10 * i + seed)
+            files[var_name] = '{}.nc'.format(var_name)
+            ds.to_netcdf(os.path.join(member_direc, files[var_name]))
+            data[var_name].append(ds)
+    run = Run(
+        name=name,
+        description='Synthetic ensemble',
+        data_in_dir_struc='one_dir',
+        data_in_dur=end_year - start_year + 1,
+        data_in_start_date='{:04d}-01-01'.format(start_year),
+        data_in_end_date='{:04d}-12-31'.format(end_year),
+        data_in_files={'monthly': files},
+        ens_mem_prefix=os.path.join(direc, 'ens'),
+        ens_mem_ext=exts,
+        ens_mem_suffix=os.sep
+    )
+    model = Model(name=name, runs=[run])
+    proj = Proj(name, direc_out=direc, models=[model], verbose=False,
+                backend=backend)
+    return proj, model, run, data
+
+
+def gfdl_path(root, var_name, start, dur, domain='atmos',
+              dtype_in_time='ts', intvl_in='monthly'):
+    """Path of a file of the 'gfdl' directory structure."""
+    return os.path.join(
+        root, domain, dtype_in_time, intvl_in, '{}yr'.format(dur),
+        '{}.{:04d}01-{:04d}12.{}.nc'.format(domain, start, start + dur - 1,
+                                            var_name)
+    )
+
+
+def write_gfdl_run(direc, var_names, start_year=1, end_year=4, dur=2,
+                   name='synthetic_gfdl', backend=None):
+    """Writes ``dur``-year monthly files per variable in the 'gfdl'
+    directory structure and returns the Proj, Model and Run objects
+    describing them, as ``write_run``.
+    """
+    data = {}
+    for seed, var_name in enumerate(var_names):
+        data[var_name] = make_data(
+            var_name, monthly_times(start_year, end_year), seed=seed
+        )
+        for start in range(start_year, end_year + 1, dur):
+            path = gfdl_path(direc, var_name, start, dur)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            data[var_name].isel(
+                time=slice(12 * (start - start_year),
+                           12 * (start - start_year + dur))
+            ).to_netcdf(path)
+    run = Run(
+        name=name,
+        description='Synthetic run',
+        data_in_direc=direc,
+        data_in_dir_struc='gfdl',
+        data_in_dur=dur,
+        data_in_start_date='{:04d}-01-01'.format(start_year),
+        data_in_end_date='{:04d}-12-31'.format(end_year)
+    )
+    model = Model(name=name, runs=[run])
+    proj = Proj(name, direc_out=direc, models=[model], verbose=False,
+                backend=backend)
+    return proj, model, run, data
+
+
+def make_calc(proj, model, run, var, scratch_dir, date_range=None,
+              intvl_out='ann', dtype_out_time='avg', **kwargs):
+    """Builds a Calc of a synthetic run that writes to ``scratch_dir``."""
+    if date_range is None:
+        date_range = ('{:04d}-01-01'.format(run.data_in_start_date.year),
+                      '{:04d}-12-31'.format(run.data_in_end_date.year))
+    calc = Calc(CalcInterface(
+        proj=proj, model=model, run=run, var=var, date_range=date_range,
+        intvl_in='monthly', intvl_out=intvl_out, dtype_in_time='ts',
+        dtype_in_vert=False, dtype_out_time=dtype_out_time,
+        dtype_out_vert=False, level=False, verbose=False, **kwargs
+    ))
+    calc.dir_scratch = scratch_dir
+    calc.path_scratch = os.path.join(scratch_dir, calc.file_name)
+    calc.path_stats = calc._path_stats(calc.dtype_out_time)
+    return calc
@@ -0,0 +1,342 @@
+"""Test suite for computing Calcs and caching their results."""
+import datetime
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.calc import Calc, cache_stats
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.provenance import stale_calcs
+from aospy_synthetic.region import Region
+from aospy_synthetic.timedate import TimeManager
+
+from . import AospyTestCase
+from .synthetic_data import write_run, make_calc
+
+
+class TestCompute(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa'], backend=self.db
+        )
+        self.scratch = os.path.join(self.tmpdir, 'scratch')
+        cache_stats.reset()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _calc(self, var=variables.olr, **kwargs):
+        return make_calc(self.proj, self.model, self.run, var, self.scratch,
+                         **kwargs)
+
+    def test_avg(self):
+        result = self._calc().compute()
+        expected = self.data['olr']['olr'].values.mean(axis=0)
+        np.testing.assert_allclose(result.values, expected)
+        self.assertTrue(os.path.isfile(self._calc().path_scratch))
+
+    def test_seasonal_std(self):
+        result = self._calc(intvl_out='son', dtype_out_time='std').compute()
+        values = self.data['olr']['olr'].values
+        son = values[[m for m in range(len(values)) if m % 12 in (8, 9, 10)]]
+        np.testing.assert_allclose(result.values, son.std(axis=0))
+
+    def test_ts(self):
+        result = self._calc(dtype_out_time='ts',
+                            date_range=('0002-01-01', '0003-12-31')).compute()
+        values = self.data['olr']['olr'].values
+        np.testing.assert_array_equal(result['year'].values, [2, 3])
+        np.testing.assert_allclose(result.values[0],
+                                   values[12:24].mean(axis=0))
+
+    def test_function(self):
+        result = self._calc(var=variables.net_sw_toa).compute()
+        expected = (self.data['swdn_toa']['swdn_toa'].values -
+                    self.data['swup_toa']['swup_toa'].values).mean(axis=0)
+        np.testing.assert_allclose(result.values, expected)
+
+    def test_cache(self):
+        calc = self._calc()
+        calc.compute()
+        self.db._assertNoDuplicates(calc)
+        self.assertEqual(stale_calcs([calc], backend=self.db), [])
+
+        cached = self._calc()
+        result = cached.compute()
+        np.testing.assert_allclose(result.values,
+                                   calc.data_out['avg'].values)
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (1, 1))
+        self.assertAlmostEqual(cache_stats.time_saved, calc.compute_time)
+        self.assertEqual(cache_stats.by_run[self.run.name]['hits'], 1)
+
+    def test_cache_requires_file(self):
+        calc = self._calc()
+        calc.compute()
+        os.remove(calc.path_scratch)
+        self._calc().compute()
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (0, 2))
+
+    def test_cache_requires_current_inputs(self):
+        self._calc().compute()
+        data = self.data['olr'].copy(deep=True)
+        data['olr'].values += 1.
+        path = os.path.join(self.tmpdir, 'olr.nc')
+        os.remove(path)
+        data.to_netcdf(path)
+        os.utime(path, (1, 1))
+        result = self._calc().compute()
+        np.testing.assert_allclose(result.values,
+                                   data['olr'].values.mean(axis=0))
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (0, 2))
+
+    def test_cache_requires_compute_time(self):
+        # Calcs are registered when created, before they are computed
+        calc = self._calc()
+        registry.get_registry().flush()
+        os.makedirs(self.scratch)
+        self._calc(dtype_out_time='std').compute()
+        os.rename(self._calc(dtype_out_time='std').path_scratch,
+                  calc.path_scratch)
+        self.assertIsNotNone(self.db.get_metadata(calc))
+        result = self._calc().compute()
+        np.testing.assert_allclose(result.values,
+                                   self.data['olr']['olr'].values.mean(axis=0))
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (0, 2))
+
+
+
+class TestChunked(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa'], end_year=5,
+            data_in_dur=2
+        )
+        self.scratch = os.path.join(self.tmpdir, 'scratch')
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _calc(self, chunk_len, var=variables.olr, **kwargs):
+        return make_calc(self.proj, self.model, self.run, var, self.scratch,
+                         chunk_len=chunk_len, **kwargs)
+
+    def test_time_chunks(self):
+        calc = self._calc(2, date_range=('0002-03-01', '0005-12-31'))
+        self.assertEqual(
+            [(start.year, stop.year) for start, stop in calc._time_chunks()],
+            [(2, 4), (4, 6)]
+        )
+        self.assertEqual(calc._time_chunks()[0][0].month, 3)
+        self.assertEqual(calc._time_chunks()[-1][1],
+                         datetime.datetime(6, 1, 1))
+        calc = self._calc(True, date_range=('0002-03-01', '0005-12-31'))
+        self.assertEqual(
+            [(start.year, stop.year) for start, stop in calc._time_chunks()],
+            [(2, 3), (3, 5), (5, 6)]
+        )
+        self.assertEqual(len(self._calc(False)._time_chunks()), 1)
+
+    def test_matches_unchunked(self):
+        for dtype in ('avg', 'std', 'ts'):
+            for intvl_out in ('ann', 'djf'):
+                expected = self._calc(False, intvl_out=intvl_out,
+                                      dtype_out_time=dtype).compute()
+                for chunk_len in (True, 2, 3):
+                    result = self._calc(
+                        chunk_len, var=variables.olr, intvl_out=intvl_out,
+                        dtype_out_time=dtype
+                    ).compute(use_cache=False)
+                    np.testing.assert_allclose(result.values,
+                                               expected.values)
+
+    def test_last_day(self):
+        for calendar, times in (('noleap', np.arange(2 * 365) + 0.5),
+                                ('360_day', np.arange(0, 2 * 360, 0.25))):
+            direc = os.path.join(self.tmpdir, calendar)
+            os.mkdir(direc)
+            proj, model, run, data = write_run(
+                direc, ['olr'], end_year=2, data_in_dur=1, calendar=calendar,
+                times=times
+            )
+            values = data['olr']['olr'].values
+            for chunk_len in (False, True):
+                calc = make_calc(proj, model, run, variables.olr,
+                                 os.path.join(direc, 'scratch'),
+                                 chunk_len=chunk_len, dtype_out_time='avg')
+                np.testing.assert_allclose(
+                    calc.compute(use_cache=False).values, values.mean(axis=0)
+                )
+
+    def test_function(self):
+        calc = self._calc(True, var=variables.net_sw_toa,
+                          dtype_out_time='std')
+        result = calc.compute()
+        expected = (self.data['swdn_toa']['swdn_toa'].values -
+                    self.data['swup_toa']['swup_toa'].values).std(axis=0)
+        np.testing.assert_allclose(result.values, expected)
+        self.assertEqual(len(calc._input_paths), 2)
+
+
+class TestMultiOutput(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr'], backend=self.db
+        )
+        self.proj.regions = {'nh': Region(name='nh', lat_bounds=(0, 90),
+                                          lon_bounds=(0, 360))}
+        self.dtypes = ('avg', 'std', 'ts', 'reg.av', 'reg.std')
+        self.calc = make_calc(self.proj, self.model, self.run,
+                              variables.olr,
+                              os.path.join(self.tmpdir, 'scratch'),
+                              dtype_out_time=self.dtypes)
+        self.num_loads = 0
+        self._load_var = Calc._load_var
+
+        def counting_load_var(calc, var):
+            self.num_loads += 1
+            return self._load_var(calc, var)
+
+        Calc._load_var = counting_load_var
+
+    def tearDown(self):
+        Calc._load_var = self._load_var
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_outputs(self):
+        outputs = self.calc.outputs()
+        self.assertEqual([o.dtype_out_time for o in outputs],
+                         list(self.dtypes))
+        self.assertEqual(len(set(o.path_scratch for o in outputs)), 5)
+        for output in outputs:
+            self.assertEqual(os.path.basename(output.path_scratch),
+                             output.file_name)
+            self.assertTrue(output.file_name.startswith(
+                'olr.ann.{}.'.format(output.dtype_out_time)))
+        self.assertEqual(self.calc._path_scratch('std'),
+                         outputs[1].path_scratch)
+
+    def test_one_pass(self):
+        results = self.calc.compute()
+        self.assertEqual(self.num_loads, 1)
+        self.assertEqual(sorted(results), sorted(self.dtypes))
+        values = self.data['olr']['olr'].values
+        np.testing.assert_allclose(results['std'].values, values.std(axis=0))
+        self.assertEqual(results['reg.av'].dims, ('region',))
+        for output in self.calc.outputs():
+            self.assertTrue(os.path.isfile(output.path_scratch))
+        self.db._assertNoDuplicates(*self.calc.outputs())
+
+        self.calc.compute()
+        self.assertEqual(self.num_loads, 1)
+
+
+class TestCalendar(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_model_calendars(self):
+        for calendar in ('noleap', '360_day'):
+            direc = os.path.join(self.tmpdir, calendar)
+            os.makedirs(direc)
+            proj, model, run, data = write_run(direc, ['olr'],
+                                               calendar=calendar)
+            calc = make_calc(proj, model, run, variables.olr,
+                             os.path.join(direc, 'scratch'),
+                             intvl_out='djf', dtype_out_time=('ts', 'avg'))
+            results = calc.compute()
+            self.assertEqual(results['ts']['year'].values.tolist(),
+                             [1, 2, 3, 4])
+            values = data['olr']['olr'].values
+            inds = np.in1d(np.tile(np.arange(1, 13), 4), [12, 1, 2])
+            np.testing.assert_allclose(results['avg'].values,
+                                       values[inds].mean(axis=0))
+
+
+class TestMultiInterval(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr']
+        )
+        self.intvls = ('ann', 'djf', 'jja', 'mam', 'son')
+        self.calc = make_calc(self.proj, self.model, self.run,
+                              variables.olr,
+                              os.path.join(self.tmpdir, 'scratch'),
+                              intvl_out=self.intvls,
+                              dtype_out_time=('avg', 'ts'))
+        self.num_loads = 0
+        self._load_var = Calc._load_var
+
+        def counting_load_var(calc, var):
+            self.num_loads += 1
+            return self._load_var(calc, var)
+
+        Calc._load_var = counting_load_var
+
+    def tearDown(self):
+        Calc._load_var = self._load_var
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_date_range(self):
+        self.assertNotIn('date_range', vars(self.calc))
+        output = self.calc.outputs()[2]
+        self.assertEqual(output.intvl_out, 'djf')
+        self.assertEqual(len(output.date_range), 12)
+        self.assertEqual(len(self.calc.date_range), 48)
+
+    def test_month_indices(self):
+        self.assertEqual(list(TimeManager.month_indices('djf')), [12, 1, 2])
+        self.assertEqual(list(TimeManager.month_indices('son')),
+                         [9, 10, 11])
+
+    def test_outputs(self):
+        outputs = self.calc.outputs()
+        self.assertEqual(len(set(o.path_scratch for o in outputs)), 10)
+        for output in outputs:
+            self.assertTrue(output.file_name.startswith('olr.{}.{}.'.format(
+                output.intvl_out, output.dtype_out_time)))
+
+    def test_one_pass(self):
+        results = self.calc.compute()
+        self.assertEqual(self.num_loads, 1)
+        self.assertEqual(len(results), 10)
+        arr = self.data['olr']['olr']
+        months = np.tile(np.arange(1, 13), 4)
+        for intvl in self.intvls:
+            inds = np.in1d(months, TimeManager.month_indices(intvl))
+            np.testing.assert_allclose(results[intvl, 'avg'].values,
+                                       arr.values[inds].mean(axis=0))
+            self.assertEqual(results[intvl, 'ts'].shape[0], 4)
+
+    def test_matches_separate_calc(self):
+        results = self.calc.compute()
+        calc = make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'separate'),
+                         intvl_out='djf', dtype_out_time='ts')
+        np.testing.assert_allclose(results['djf', 'ts'].values,
+                                   calc.compute().values)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
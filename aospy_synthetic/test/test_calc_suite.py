@@ -0,0 +1,134 @@
+"""Test suite for computing many Calcs in parallel."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.calc import cache_stats
+from aospy_synthetic.calc_suite import CalcSuite, _process_pool
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.provenance import stale_calcs
+from aospy_synthetic.region import Region
+
+from . import AospyTestCase
+from .synthetic_data import write_run
+
+
+class TestCalcSuite(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa'], backend=self.db
+        )
+        self.scratch = os.path.join(self.tmpdir, 'scratch')
+        cache_stats.reset()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _suite(self):
+        return CalcSuite(self.proj, [variables.olr, variables.net_sw_toa],
+                         intvl_out=('ann', 'jja'),
+                         dtype_out_time=('avg', 'std'),
+                         dir_scratch=self.scratch, verbose=False)
+
+    def _check_outputs(self, suite):
+        for calc in suite.calcs:
+            self.assertTrue(os.path.isfile(calc.path_scratch))
+        self.db._assertNoDuplicates(*suite.calcs)
+        self.assertEqual(stale_calcs(suite.calcs, backend=self.db), [])
+
+    def test_expand(self):
+        registry.get_registry().clear()
+        suite = self._suite()
+        self.assertEqual(len(suite), 8)
+        self.assertEqual(len(set(calc.file_name for calc in suite.calcs)), 8)
+        self.assertEqual(len(registry.get_registry()), 0)
+
+    def test_process_pool(self):
+        suite = self._suite()
+        results = suite.run(max_workers=2)
+        self.assertTrue(all(r.error is None and not r.cached
+                            for r in results))
+        self._check_outputs(suite)
+        self.assertEqual(cache_stats.misses, 8)
+
+        calc = suite.calcs[0]
+        self.assertEqual((calc.name, calc.intvl_out, calc.dtype_out_time),
+                         ('olr', 'ann', 'avg'))
+        np.testing.assert_allclose(
+            calc._load_output(calc.path_scratch).values,
+            self.data['olr']['olr'].values.mean(axis=0)
+        )
+        self.assertEqual(self.db.get_metadata(calc)['compute_time'],
+                         results[0].compute_time)
+
+    def test_serial(self):
+        suite = self._suite()
+        suite.run(max_workers=1)
+        self._check_outputs(suite)
+
+    def test_cached(self):
+        self._suite().run(max_workers=2)
+        results = self._suite().run(max_workers=2)
+        self.assertTrue(all(r.cached for r in results))
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (8, 8))
+
+    def test_changed_inputs(self):
+        self._suite().run(max_workers=1)
+        path = os.path.join(self.tmpdir, 'olr.nc')
+        data = self.data['olr'].copy(deep=True)
+        data['olr'].values += 1.
+        os.remove(path)
+        data.to_netcdf(path)
+        os.utime(path, (1, 1))
+        results = self._suite().run(max_workers=1)
+        self.assertEqual([r.calc.name for r in results if not r.cached],
+                         ['olr'] * 4)
+        calc = results[0].calc
+        np.testing.assert_allclose(
+            calc._load_output(calc.path_scratch).values,
+            data['olr'].values.mean(axis=0)
+        )
+
+    def test_regions(self):
+        regions = [Region(name='nh', lat_bounds=(0, 90), lon_bounds=(0, 360)),
+                   Region(name='sh', lat_bounds=(-90, 0),
+                          lon_bounds=(0, 360))]
+        suite = CalcSuite(self.proj, [variables.olr], regions=regions,
+                          dtype_out_time='reg.av', dir_scratch=self.scratch,
+                          verbose=False)
+        suite.run(max_workers=2)
+        self._check_outputs(suite)
+        self.assertEqual(len(set(calc.path_scratch for calc in suite.calcs)),
+                         2)
+        for calc, region in zip(suite.calcs, regions):
+            output = calc._load_output(calc.path_scratch)
+            self.assertEqual(list(output['region'].values), [region.name])
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     'process pools take a start method from Python 3.7')
+    def test_forked_workers(self):
+        with _process_pool(1) as pool:
+            self.assertEqual(pool._mp_context.get_start_method(), 'fork')
+
+    def test_error(self):
+        os.remove(os.path.join(self.tmpdir, 'olr.nc'))
+        results = self._suite().run(max_workers=2)
+        failed = [r.calc.name for r in results if r.error is not None]
+        self.assertEqual(failed, ['olr'] * 4)
+        self.db._assertNotInDB(*[r.calc for r in results if r.error])
+        self.db._assertNoDuplicates(*[r.calc for r in results
+                                      if not r.error])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
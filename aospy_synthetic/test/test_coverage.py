@@ -0,0 +1,150 @@
+"""Test suite for extending Calcs from stored results and finding the years
+already covered.
+"""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.calc import _stored_bases, compute_all
+from aospy_synthetic.coverage import (CoverageKey, coverage_key,
+                                      covered_years, missing_years)
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_run
+
+
+class CoverageTestCase(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _write_run(self, backend):
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr'], end_year=6, backend=backend
+        )
+
+    def _calc(self, first, last, scratch='scratch', **kwargs):
+        kwargs.setdefault('dtype_out_time', ('avg', 'std', 'ts'))
+        return make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, scratch),
+                         date_range=('{:04d}-01-01'.format(first),
+                                     '{:04d}-12-31'.format(last)),
+                         **kwargs)
+
+    def _backends(self):
+        return (
+            SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir, 'test.db')),
+            LogFileDB(os.path.join(self.tmpdir, 'logdb'))
+        )
+
+
+class TestExtend(CoverageTestCase):
+    def _check_backend(self, backend):
+        self._write_run(backend)
+        compute_all([self._calc(1, 3), self._calc(5, 6)])
+
+        extended = self._calc(1, 6)
+        outputs = extended.outputs()
+        bases = _stored_bases(outputs, {output: backend
+                                        for output in outputs})
+        self.assertEqual(len(bases), 3)
+        for base in bases.values():
+            self.assertEqual((base.start_date.year, base.end_date.year),
+                             (1, 3))
+            self.assertEqual(len(base._input_paths), 1)
+
+        result = extended.compute()
+        expected = self._calc(1, 6, scratch='full').compute(use_cache=False)
+        for dtype_out_time in ('avg', 'std', 'ts'):
+            np.testing.assert_allclose(result[dtype_out_time].values,
+                                       expected[dtype_out_time].values)
+        np.testing.assert_array_equal(result['ts']['year'], np.arange(1, 7))
+        for output in extended.outputs():
+            self.assertTrue(output.is_up_to_date(backend))
+
+    def test_sqlalchemy(self):
+        self._check_backend(self._backends()[0])
+
+    def test_logfile(self):
+        self._check_backend(self._backends()[1])
+
+    def test_partial_years(self):
+        self._write_run(self._backends()[0])
+        compute_all([self._calc(1, 3)])
+        calc = self._calc(1, 6, dtype_out_time='avg')
+        calc.start_date = calc.start_date.replace(month=3)
+        self.assertEqual(_stored_bases([calc], {calc: self.proj.backend}), {})
+
+    def test_other_labels(self):
+        # Stored statistics of Calcs differing in more than their years are
+        # not bases
+        self._write_run(self._backends()[0])
+        compute_all([self._calc(1, 4, intvl_out='djf', dtype_out_time='avg'),
+                     self._calc(5, 6, dtype_out_time='std'),
+                     self._calc(3, 4, dtype_out_time='avg')])
+        calc = self._calc(1, 6, dtype_out_time='avg')
+        base = _stored_bases([calc], {calc: self.proj.backend})[calc]
+        self.assertEqual((base.start_date.year, base.end_date.year), (3, 4))
+
+    def test_stale_base(self):
+        self._write_run(self._backends()[0])
+        compute_all([self._calc(1, 3)])
+        input_path = os.path.join(self.tmpdir, 'olr.nc')
+        os.utime(input_path, (0, 0))
+        calc = self._calc(1, 6, dtype_out_time='avg')
+        self.assertEqual(_stored_bases([calc], {calc: self.proj.backend}), {})
+
+
+class TestCoverage(CoverageTestCase):
+    def _check_backend(self, backend):
+        self._write_run(backend)
+        djf = self._calc(1, 6, intvl_out='djf', dtype_out_time='avg')
+        compute_all([self._calc(1, 2), self._calc(2, 3), self._calc(6, 6),
+                     djf])
+
+        key = CoverageKey('synthetic', 'synthetic', None, 'olr', None,
+                          'monthly', 'ts', False, False, 'ann')
+        self.assertEqual(coverage_key(self._calc(1, 8)), key)
+        self.assertEqual(covered_years(backend), {
+            key: [(1, 3), (6, 6)],
+            key._replace(intvl_out='djf'): [(1, 6)]
+        })
+        self.assertEqual(
+            covered_years(backend, run=self.run, intvl_out='djf',
+                          dtype_out_time='ts'), {}
+        )
+        self.assertEqual(covered_years(backend, model='other'), {})
+        self.assertEqual(missing_years(self._calc(1, 8), 1, 8),
+                         [(4, 5), (7, 8)])
+        self.assertEqual(missing_years(djf, 2, 5), [])
+        self.assertEqual(
+            missing_years(self._calc(1, 6, intvl_out='jja'), 2, 5), [(2, 5)]
+        )
+        # Calcs of another ensemble member are not merged
+        self.assertEqual(missing_years(self._calc(1, 6, ens_mem=1), 1, 6),
+                         [(1, 6)])
+        # Calcs registered but never computed cover no years
+        backend.add(self._calc(4, 5))
+        self.assertEqual(missing_years(self._calc(1, 8), 1, 8),
+                         [(4, 5), (7, 8)])
+
+    def test_sqlalchemy(self):
+        self._check_backend(self._backends()[0])
+
+    def test_logfile(self):
+        self._check_backend(self._backends()[1])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,93 @@
+"""Test suite for evaluating the variables of many Calcs as one graph."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables, units
+from aospy_synthetic.calc import cache_stats, compute_all
+from aospy_synthetic.dag import Plan
+from aospy_synthetic.db import registry
+from aospy_synthetic.var import Var
+
+from . import AospyTestCase
+from .synthetic_data import write_run, make_calc
+
+
+class TestPlan(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa']
+        )
+        self.scratch = os.path.join(self.tmpdir, 'scratch')
+        self.num_calls = {}
+
+        # net_sw_toa is an input of both derived variables
+        self.net_toa = Var(name='net_toa', units=units.W_m2,
+                           variables=(variables.net_sw_toa, variables.olr),
+                           func=self._counted('net_toa',
+                                              lambda sw, lw: sw - lw))
+        self.double_sw = Var(name='double_sw', units=units.W_m2,
+                             variables=(variables.net_sw_toa,),
+                             func=self._counted('double_sw',
+                                                lambda sw: 2 * sw))
+        cache_stats.reset()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _counted(self, name, func):
+        def counted(*args):
+            self.num_calls[name] = self.num_calls.get(name, 0) + 1
+            return func(*args)
+        return counted
+
+    def _calc(self, var, **kwargs):
+        return make_calc(self.proj, self.model, self.run, var, self.scratch,
+                         **kwargs)
+
+    def _values(self, name):
+        return self.data[name][name].values
+
+    def test_shared_nodes(self):
+        calcs = [self._calc(var, dtype_out_time=dtype)
+                 for var in (self.net_toa, self.double_sw,
+                             variables.net_sw_toa)
+                 for dtype in ('avg', 'std')]
+        plan = Plan(calcs)
+        # olr, swdn_toa, swup_toa, net_sw_toa, net_toa, double_sw
+        self.assertEqual(len(plan), 6)
+        self.assertEqual(plan.num_loads(), 3)
+
+    def test_separate_selections(self):
+        calcs = [self._calc(self.net_toa, intvl_out=intvl)
+                 for intvl in ('ann', 'jja')]
+        self.assertEqual(len(Plan(calcs)), 10)
+
+    def test_compute_all(self):
+        calcs = [self._calc(var, dtype_out_time=dtype)
+                 for var in (self.net_toa, self.double_sw)
+                 for dtype in ('avg', 'std')]
+        results = compute_all(calcs)
+        self.assertEqual(self.num_calls, {'net_toa': 1, 'double_sw': 1})
+
+        net_sw = self._values('swdn_toa') - self._values('swup_toa')
+        np.testing.assert_allclose(
+            results[0].values, (net_sw - self._values('olr')).mean(axis=0)
+        )
+        np.testing.assert_allclose(results[3].values,
+                                   (2 * net_sw).std(axis=0))
+        for calc in calcs:
+            self.assertTrue(os.path.isfile(calc.path_scratch))
+        self.assertEqual(len(calcs[0]._input_paths), 3)
+        self.assertEqual(len(calcs[2]._input_paths), 2)
+        self.assertEqual(cache_stats.misses, 4)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,223 @@
+"""Test suite for the pool of open datasets."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import xray
+
+from test_objs import variables
+from aospy_synthetic import io
+from aospy_synthetic.calc import compute_all
+from aospy_synthetic.dataset_pool import DatasetPool, dataset_pool
+from aospy_synthetic.db import registry
+from aospy_synthetic.io import _is_netcdf3, hdf5_lock, hdf5_locked
+from aospy_synthetic.timedate import _prep_time_data
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_run
+
+
+class TestDatasetPool(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir, 'file{}.nc'.format(i))
+            xray.Dataset({'x': ('t', np.arange(4.) + i)}).to_netcdf(path)
+            self.paths.append(path)
+        self.pool = DatasetPool(maxsize=2)
+
+    def tearDown(self):
+        self.pool.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_reuse(self):
+        with self.pool.dataset(self.paths[0]) as ds:
+            first = ds
+        with self.pool.datasets(self.paths[:2]) as datasets:
+            self.assertIs(datasets[0], first)
+            np.testing.assert_array_equal(datasets[1]['x'].values,
+                                          np.arange(4.) + 1)
+        self.assertEqual((self.pool.hits, self.pool.misses), (1, 2))
+
+        # Open options are part of the key
+        with self.pool.dataset(self.paths[0], decode_times=False) as ds:
+            self.assertIsNot(ds, first)
+        self.assertEqual(self.pool.misses, 3)
+
+    def test_preprocess(self):
+        def double(ds):
+            ds['x'] = ds['x'] * 2
+            return ds
+        with self.pool.dataset(self.paths[1], preprocess=double) as ds:
+            np.testing.assert_array_equal(ds['x'].values,
+                                          2 * (np.arange(4.) + 1))
+        with self.pool.dataset(self.paths[1], preprocess=double):
+            pass
+        self.assertEqual(self.pool.hits, 1)
+
+    def test_lru(self):
+        for path in self.paths[:2]:
+            with self.pool.dataset(path):
+                pass
+        with self.pool.dataset(self.paths[0]):
+            pass
+        # file1 is least recently used
+        with self.pool.dataset(self.paths[2]):
+            pass
+        self.assertEqual(self.pool.evictions, 1)
+        self.assertEqual(len(self.pool), 2)
+        with self.pool.dataset(self.paths[0]):
+            pass
+        self.assertEqual(self.pool.hits, 2)
+
+        # Datasets in use are kept open over the limit
+        with self.pool.datasets(self.paths) as datasets:
+            self.assertEqual(len(self.pool), 3)
+            np.testing.assert_array_equal(datasets[0]['x'].values,
+                                          np.arange(4.))
+        self.assertEqual(len(self.pool), 2)
+
+    def test_changed_file(self):
+        with self.pool.dataset(self.paths[0]):
+            pass
+        xray.Dataset({'x': ('t', np.zeros(5))}).to_netcdf(self.paths[0])
+        with self.pool.dataset(self.paths[0]) as ds:
+            np.testing.assert_array_equal(ds['x'].values, np.zeros(5))
+        self.assertEqual(self.pool.misses, 2)
+
+    def test_fork(self):
+        with self.pool.dataset(self.paths[0]):
+            pass
+        self.pool._pid = -1
+        with self.pool.dataset(self.paths[0]):
+            pass
+        self.assertEqual((self.pool.hits, self.pool.misses), (0, 1))
+
+
+class TestNetCDF3(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'data.nc')
+        xray.Dataset({'x': (('t', 'y'), np.ones((120, 50)))}).to_netcdf(
+            self.path, engine='scipy'
+        )
+        self.pool = DatasetPool()
+
+    def tearDown(self):
+        self.pool.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_detect(self):
+        self.assertTrue(_is_netcdf3(self.path))
+        hdf5_path = os.path.join(self.tmpdir, 'data4.nc')
+        with open(hdf5_path, 'wb') as f:
+            f.write(b'\x89HDF\r\n\x1a\n')
+        self.assertFalse(_is_netcdf3(hdf5_path))
+        self.assertFalse(_is_netcdf3(os.path.join(self.tmpdir, 'none.nc')))
+
+    def test_hdf5_locked(self):
+        hdf5_path = os.path.join(self.tmpdir, 'data4.nc')
+        with open(hdf5_path, 'wb') as f:
+            f.write(b'\x89HDF\r\n\x1a\n')
+        held = []
+
+        def try_lock():
+            held.append(not hdf5_lock.acquire(False))
+            if not held[-1]:
+                hdf5_lock.release()
+
+        for paths, expected in (([self.path], False),
+                                ([self.path, hdf5_path], True)):
+            with hdf5_locked(paths):
+                thread = threading.Thread(target=try_lock)
+                thread.start()
+                thread.join()
+            self.assertEqual(held[-1], expected)
+
+    def test_mmap(self):
+        with self.pool.dataset(self.path) as ds:
+            self.assertTrue(ds._file_obj.ds.use_mmap)
+            subset = ds['x'].copy(deep=False).isel(t=[0, 12, 24]).load()
+            np.testing.assert_array_equal(subset.values, np.ones((3, 50)))
+            self.assertFalse(isinstance(ds['x'].variable._data, np.ndarray))
+
+    def test_read_subset(self):
+        # Only the months selected are read from the memory-mapped file
+        wrapper = xray.backends.scipy_.ScipyArrayWrapper
+        getitem = wrapper.__getitem__
+        shapes = []
+
+        def record(self, key):
+            data = getitem(self, key)
+            shapes.append(data.shape)
+            return data
+
+        wrapper.__getitem__ = record
+        try:
+            with self.pool.dataset(self.path) as ds:
+                subset = ds['x'].copy(deep=False).isel(t=slice(12, 15))
+                subset.load()
+        finally:
+            wrapper.__getitem__ = getitem
+        np.testing.assert_array_equal(subset.values, np.ones((3, 50)))
+        self.assertEqual(shapes, [(3, 50)])
+
+    def test_without_scipy(self):
+        opened = []
+        open_dataset = xray.open_dataset
+
+        def record(path, **options):
+            opened.append(options)
+            return open_dataset(path, **options)
+
+        io._HAS_SCIPY = False
+        xray.open_dataset = record
+        try:
+            self.assertTrue(io._uses_hdf5(self.path))
+            with self.pool.dataset(self.path) as ds:
+                np.testing.assert_array_equal(ds['x'].values,
+                                              np.ones((120, 50)))
+        finally:
+            io._HAS_SCIPY = True
+            xray.open_dataset = open_dataset
+        self.assertEqual(opened, [{}])
+
+
+class TestCalcPool(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr']
+        )
+        dataset_pool.clear()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        dataset_pool.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared(self):
+        calcs = [make_calc(self.proj, self.model, self.run, variables.olr,
+                           os.path.join(self.tmpdir, 'scratch'),
+                           intvl_out=intvl_out)
+                 for intvl_out in ('djf', 'jja')]
+        for calc in calcs:
+            compute_all([calc], use_cache=False)
+        # The second Calc reads the files opened by the first
+        self.assertGreater(dataset_pool.misses, 0)
+        self.assertEqual(dataset_pool.hits, dataset_pool.misses)
+        # Loading data does not fill the pooled datasets
+        path = calcs[0]._get_input_data_paths(variables.olr)[0]
+        with dataset_pool.dataset(path, preprocess=_prep_time_data,
+                                  decode_times=False) as ds:
+            self.assertFalse(isinstance(ds['olr'].variable._data,
+                                        np.ndarray))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
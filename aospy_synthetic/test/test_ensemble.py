@@ -0,0 +1,184 @@
+"""Test suite for ensemble means streamed over the members of a run."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import xray
+
+from test_objs import variables
+from aospy_synthetic import ensemble
+from aospy_synthetic.calc import compute_all
+from aospy_synthetic.db import registry
+from aospy_synthetic.ensemble import EnsembleMean, ensemble_mean
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_ensemble_run, write_run
+
+
+class _Member(object):
+    """Stand-in for the Calc of a member, recording concurrent loads."""
+    def __init__(self, value, state):
+        self.value = value
+        self.state = state
+
+    def _load_var(self, var):
+        with self.state['lock']:
+            self.state['active'] += 1
+            self.state['max_active'] = max(self.state['max_active'],
+                                           self.state['active'])
+            self.state['loaded'].append(self.value)
+        time.sleep(0.01)
+        with self.state['lock']:
+            self.state['active'] -= 1
+        return xray.DataArray(np.zeros(4) + self.value, dims=['x'],
+                              name='olr')
+
+
+class TestEnsembleMean(AospyTestCase):
+    def test_missing_values(self):
+        members = [xray.DataArray([1., np.nan, 3.], dims=['x']),
+                   xray.DataArray([3., np.nan, np.nan], dims=['x'])]
+        mean = EnsembleMean()
+        for member in members:
+            mean.add(member)
+        np.testing.assert_array_equal(mean.result().values,
+                                      [2., np.nan, 3.])
+        self.assertEqual(mean.num_members, 2)
+
+    def test_workers(self):
+        for max_workers in (1, 3):
+            state = {'lock': threading.Lock(), 'active': 0, 'max_active': 0,
+                     'loaded': []}
+            members = [_Member(i, state) for i in range(8)]
+            result = ensemble_mean(members, variables.olr, max_workers)
+            np.testing.assert_allclose(result.values, 3.5)
+            self.assertEqual(result.name, 'olr')
+            self.assertEqual(sorted(state['loaded']), list(range(8)))
+            self.assertLessEqual(state['max_active'], max_workers)
+
+    def test_shared_pool(self):
+        # Ensemble means computed on several threads share the threads
+        # loading their members
+        state = {'lock': threading.Lock(), 'active': 0, 'max_active': 0,
+                 'loaded': []}
+        results = []
+
+        def compute():
+            members = [_Member(i, state) for i in range(4)]
+            results.append(ensemble_mean(members, variables.olr, 2))
+            results.append(ensemble._pool)
+
+        threads = [threading.Thread(target=compute) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for result in results[::2]:
+            np.testing.assert_allclose(result.values, 1.5)
+        self.assertEqual(len(set(results[1::2])), 1)
+        self.assertLessEqual(state['max_active'], ensemble._pool_workers)
+
+    def test_growing_pool(self):
+        # A mean keeps submitting members to the shared pool it started
+        # with while a mean with more workers replaces the pool
+        state = {'lock': threading.Lock(), 'active': 0, 'max_active': 0,
+                 'loaded': []}
+        # The members first submitted wait until the pool is replaced
+        workers = max(ensemble._pool_workers, 2)
+        members = [_Member(i, state) for i in range(workers + 4)]
+        started = [threading.Event() for _ in range(workers)]
+        resume = threading.Event()
+        for member, event in zip(members, started):
+            def load_var(var, member=member, event=event):
+                event.set()
+                resume.wait()
+                return _Member._load_var(member, var)
+            member._load_var = load_var
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            ensemble_mean(members, variables.olr, workers)))
+        thread.start()
+        for event in started:
+            event.wait()
+        pool = ensemble._pool
+        others = [_Member(i, state) for i in range(4)]
+        np.testing.assert_allclose(
+            ensemble_mean(others, variables.olr, workers + 1).values, 1.5
+        )
+        self.assertIsNot(ensemble._pool, pool)
+        resume.set()
+        thread.join()
+        np.testing.assert_allclose(results[0].values, (workers + 3) / 2.)
+
+
+class TestCalcEnsemble(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_ensemble_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa']
+        )
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _compute(self, var, **kwargs):
+        calc = make_calc(self.proj, self.model, self.run, var,
+                         os.path.join(self.tmpdir, 'scratch'), ens_mem='avg',
+                         dtype_out_time=('avg', 'ts'), **kwargs)
+        return calc, compute_all([calc], use_cache=False)[0]
+
+    def _members(self, name):
+        return np.array([ds[name].values for ds in self.data[name]])
+
+    def test_loaded(self):
+        calc, result = self._compute(variables.olr)
+        expected = self._members('olr').mean(axis=0)
+        np.testing.assert_allclose(result['avg'].values,
+                                   expected.mean(axis=0))
+        np.testing.assert_allclose(
+            result['ts'].values,
+            expected.reshape(4, 12, 4, 3).mean(axis=1)
+        )
+        self.assertEqual(
+            calc._get_input_data_paths(variables.olr),
+            [os.path.join(self.tmpdir, 'ens{:02d}'.format(i + 1), 'olr.nc')
+             for i in range(3)]
+        )
+        self.assertIn('ens_mean', calc.file_name)
+
+    def test_derived(self):
+        calc, result = self._compute(variables.net_sw_toa, ens_workers=2)
+        expected = (self._members('swdn_toa') -
+                    self._members('swup_toa')).mean(axis=0)
+        np.testing.assert_allclose(result['avg'].values,
+                                   expected.mean(axis=0))
+        self.assertEqual(
+            len(calc._get_input_data_paths(variables.net_sw_toa)), 6
+        )
+
+    def test_not_ensemble(self):
+        direc = os.path.join(self.tmpdir, 'single')
+        os.mkdir(direc)
+        proj, model, run, _ = write_run(direc, ['olr'], name='single')
+        calc = make_calc(proj, model, run, variables.olr,
+                         os.path.join(self.tmpdir, 'scratch'), ens_mem='avg')
+        with self.assertRaises(ValueError):
+            calc._ens_members()
+
+    def test_member(self):
+        calc = make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'scratch'), ens_mem=1)
+        np.testing.assert_allclose(
+            calc.compute(use_cache=False).values,
+            self.data['olr'][1]['olr'].values.mean(axis=0)
+        )
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
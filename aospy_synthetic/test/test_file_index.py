@@ -0,0 +1,164 @@
+"""Test suite for the index of a Run's input files."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.file_index import FileIndex, run_file_index
+from aospy_synthetic.run import Run
+
+from . import AospyTestCase
+from .synthetic_data import gfdl_path, make_calc, write_gfdl_run
+
+
+def _touch(path):
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError:
+        pass
+    open(path, 'w').close()
+
+
+class TestFileIndex(AospyTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for start in (1, 3, 5):
+            _touch(gfdl_path(self.root, 'olr', start, 2))
+            _touch(gfdl_path(self.root, 'temp', start, 2))
+        _touch(gfdl_path(self.root, 'olr', 1, 6))
+        _touch(gfdl_path(self.root, 'olr', 1, 2, intvl_in='daily'))
+        _touch(os.path.join(self.root, 'atmos', 'README'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_paths(self):
+        index = FileIndex.scan(self.root)
+        self.assertEqual(
+            index.paths(['olr'], 'atmos', 'ts', 'monthly', 2, 2, 5),
+            [gfdl_path(self.root, 'olr', start, 2) for start in (1, 3, 5)]
+        )
+        self.assertEqual(
+            index.paths(['rlut', 'olr'], 'atmos', 'ts', 'monthly', 6, 1, 6),
+            [gfdl_path(self.root, 'olr', 1, 6)]
+        )
+        self.assertEqual(
+            index.paths(['olr'], 'atmos', 'ts', 'monthly', 2, 3, 4),
+            [gfdl_path(self.root, 'olr', 3, 2)]
+        )
+        self.assertEqual(
+            index.paths(['olr'], 'atmos', 'av', 'monthly', 2, 1, 6), []
+        )
+
+    def test_refresh(self):
+        index = FileIndex.scan(self.root)
+        num_dirs = len(index.dirs)
+        self.assertEqual(index.num_listed, num_dirs)
+        self.assertFalse(index.refresh())
+        self.assertEqual(index.num_listed, num_dirs)
+
+        _touch(gfdl_path(self.root, 'olr', 7, 2))
+        _touch(gfdl_path(self.root, 'olr', 1, 2, dtype_in_time='av'))
+        self.assertTrue(index.refresh())
+        # The 2yr directory, and the new directories and their parent
+        self.assertEqual(index.num_listed - num_dirs, 5)
+        self.assertEqual(
+            len(index.paths(['olr'], 'atmos', 'ts', 'monthly', 2, 1, 8)), 4
+        )
+        self.assertEqual(
+            len(index.paths(['olr'], 'atmos', 'av', 'monthly', 2, 1, 8)), 1
+        )
+
+        shutil.rmtree(os.path.join(self.root, 'atmos', 'ts', 'monthly',
+                                   '2yr'))
+        self.assertTrue(index.refresh())
+        self.assertEqual(
+            index.paths(['olr'], 'atmos', 'ts', 'monthly', 2, 1, 8), []
+        )
+
+    def test_state(self):
+        index = FileIndex.scan(self.root)
+        restored = FileIndex.from_state(index.state())
+        self.assertFalse(restored.refresh())
+        self.assertEqual(restored.num_listed, 0)
+        self.assertEqual(
+            restored.paths(['temp'], 'atmos', 'ts', 'monthly', 2, 1, 6),
+            index.paths(['temp'], 'atmos', 'ts', 'monthly', 2, 1, 6)
+        )
+
+
+class TestPersistence(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'data')
+        _touch(gfdl_path(self.root, 'olr', 1, 2))
+        self.run = Run(name='gfdl_run', data_in_direc=self.root)
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _check_backend(self, make_backend):
+        backend = make_backend()
+        index = run_file_index(self.run, self.root, backend)
+        self.assertIs(run_file_index(self.run, self.root, backend), index)
+        self.assertEqual(backend.get_file_index(self.root), index.state())
+
+        # Another process starts from the stored index
+        other = Run(name='gfdl_run', data_in_direc=self.root)
+        _touch(gfdl_path(self.root, 'olr', 3, 2))
+        index = run_file_index(other, self.root, make_backend())
+        self.assertEqual(index.num_listed, 1)
+        self.assertEqual(
+            len(index.paths(['olr'], 'atmos', 'ts', 'monthly', 2, 1, 4)), 2
+        )
+        self.assertEqual(make_backend().get_file_index(self.root),
+                         index.state())
+
+    def test_sqlalchemy(self):
+        url = 'sqlite:///' + os.path.join(self.tmpdir, 'test.db')
+        self._check_backend(lambda: SQLAlchemyDB(url))
+
+    def test_logfile(self):
+        db_dir = os.path.join(self.tmpdir, 'logdb')
+        self._check_backend(lambda: LogFileDB(db_dir))
+        backend = LogFileDB(db_dir)
+        backend.compact()
+        self.assertIsNotNone(LogFileDB(db_dir).get_file_index(self.root))
+
+
+class TestCalcGFDL(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_gfdl_run(
+            os.path.join(self.tmpdir, 'data'), ['olr']
+        )
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _calc(self, date_range):
+        return make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'scratch'),
+                         date_range=date_range)
+
+    def test_compute(self):
+        result = self._calc(('0002-01-01', '0004-12-31')).compute()
+        values = self.data['olr']['olr'].values[12:]
+        np.testing.assert_allclose(result.values, values.mean(axis=0))
+
+    def test_missing(self):
+        with self.assertRaises(IOError):
+            self._calc(('0005-01-01', '0006-12-31')).compute()
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
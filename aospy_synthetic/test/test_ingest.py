@@ -0,0 +1,82 @@
+"""Test suite for ingesting existing aospy output trees into a backend."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+from test_objs import projects, models, runs, variables, regions
+from aospy_synthetic.calc import Calc, CalcInterface
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.db.ingest import calc_from_file_name, ingest
+
+from . import AospyTestCase
+
+
+class TestIngest(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.variables = [variables.mse, variables.dse, variables.gz]
+        # Other tests modify calc_objs.c in place
+        self.calc = Calc(CalcInterface(proj=projects.p,
+                                       model=models.m,
+                                       run=runs.r,
+                                       var=variables.mse,
+                                       date_range=('0021-01-01', '0080-12-31'),
+                                       intvl_in='monthly',
+                                       intvl_out='son',
+                                       dtype_in_time='ts',
+                                       dtype_in_vert='sigma',
+                                       dtype_out_time='avg',
+                                       dtype_out_vert=False,
+                                       region=regions.nh,
+                                       level=False,
+                                       verbose=False))
+        self.file_names = [
+            self.calc.file_name,
+            self.calc.file_name.replace('.avg.', '.std.'),
+            self.calc.file_name.replace('mse.', 'dse.', 1),
+        ]
+        direc = os.path.join(self.tmpdir, 'mse')
+        os.makedirs(direc)
+        for file_name in self.file_names + ['unknown.son.avg.nc']:
+            with open(os.path.join(direc, file_name), 'w') as f:
+                f.write('')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_calc_from_file_name(self):
+        calc = calc_from_file_name(self.calc.file_name, projects.p,
+                                   {'mse': variables.mse},
+                                   regions={'nh': regions.nh})
+        self.assertEqual(calc.file_name, self.calc.file_name)
+        self.assertEqual(calc.start_date, self.calc.start_date)
+        self.assertIs(calc.run, self.calc.run)
+        self.assertIs(calc.region, regions.nh)
+
+    def test_unknown_region(self):
+        self.assertIsNone(calc_from_file_name(self.calc.file_name,
+                                              projects.p,
+                                              {'mse': variables.mse}))
+
+    def test_unknown_var(self):
+        self.assertIsNone(calc_from_file_name(self.calc.file_name,
+                                              projects.p, {}))
+
+    def test_ingest(self):
+        calcs, unparsed = ingest(self.db, projects.p, self.variables,
+                                 roots=[self.tmpdir], batch_size=2,
+                                 regions=[regions.nh])
+        self.assertEqual(sorted(calc.file_name for calc in calcs),
+                         sorted(self.file_names))
+        self.assertEqual([os.path.basename(path) for path in unparsed],
+                         ['unknown.son.avg.nc'])
+        self.assertEqual(self.db.get_calc_file_names(), set(self.file_names))
+        self.db._assertNoDuplicates(*calcs)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,95 @@
+"""Test suite for the aospy_synthetic file name labels."""
+import unittest
+import sys
+
+from aospy_synthetic.io import (_data_in_label, _data_out_label, _ens_label,
+                                _region_label, _yr_label,
+                                _parse_data_in_label, _parse_ens_label,
+                                _parse_region_label, _parse_yr_label,
+                                _parse_file_name)
+from test_objs import projects, models, runs, variables, regions
+from aospy_synthetic.calc import Calc, CalcInterface
+from . import AospyTestCase
+
+
+class TestParseLabels(AospyTestCase):
+    def test_data_in_label(self):
+        for args in (('monthly', 'ts', 'sigma'), ('3-hourly', 'inst', False),
+                     ('daily', 'av_from_ts', 'pressure')):
+            self.assertEqual(_parse_data_in_label(_data_in_label(*args)),
+                             args)
+
+    def test_ens_label(self):
+        for ens_mem in (None, 'avg', 1, 11):
+            self.assertEqual(_parse_ens_label(_ens_label(ens_mem)), ens_mem)
+
+    def test_region_label(self):
+        self.assertIsNone(_parse_region_label(_region_label(None)))
+        self.assertEqual(_parse_region_label(_region_label(regions.nh)), 'nh')
+
+    def test_yr_label(self):
+        for yr_range in ((21, 80), (3, 3)):
+            self.assertEqual(_parse_yr_label(_yr_label(yr_range)), yr_range)
+
+
+class TestParseFileName(AospyTestCase):
+    def setUp(self):
+        # Other tests modify calc_objs.c in place
+        self.calc = Calc(CalcInterface(proj=projects.p,
+                                       model=models.m,
+                                       run=runs.r,
+                                       var=variables.mse,
+                                       date_range=('0021-01-01', '0080-12-31'),
+                                       intvl_in='monthly',
+                                       intvl_out='son',
+                                       dtype_in_time='ts',
+                                       dtype_in_vert='sigma',
+                                       dtype_out_time='avg',
+                                       dtype_out_vert=False,
+                                       region=regions.nh,
+                                       level=False,
+                                       verbose=False))
+
+    def _file_name(self, name, intvl_out, dtype_out_time, dtype_out_vert,
+                   model_str, run_str, ens_mem):
+        return '.'.join(
+            [name, _data_out_label(intvl_out, dtype_out_time, dtype_out_vert),
+             _data_in_label('monthly', 'ts', 'sigma'), model_str, run_str,
+             _ens_label(ens_mem), _yr_label((21, 80)), 'nc']
+        ).replace('..', '.')
+
+    def test_calc_file_name(self):
+        meta = _parse_file_name(self.calc.file_name)
+        self.assertEqual(meta['name'], self.calc.name)
+        self.assertEqual(meta['intvl_out'], self.calc.intvl_out)
+        self.assertEqual(meta['dtype_out_time'], self.calc.dtype_out_time)
+        self.assertEqual(meta['dtype_out_vert'], self.calc.dtype_out_vert)
+        self.assertEqual(meta['intvl_in'], self.calc.intvl_in)
+        self.assertEqual(meta['dtype_in_time'], self.calc.dtype_in_time)
+        self.assertEqual(meta['dtype_in_vert'], self.calc.dtype_in_vert)
+        self.assertEqual(meta['model'], self.calc.model_str)
+        self.assertEqual(meta['run'], self.calc.run_str_full)
+        self.assertEqual(meta['ens_mem'], self.calc.ens_mem)
+        self.assertEqual(meta['region'], 'nh')
+        self.assertEqual(meta['yr_range'], (21, 80))
+
+    def test_dotted_labels(self):
+        file_name = self._file_name('mse', 7, 'reg.av', 'vert_int',
+                                    'am2', 'extratropics_0.037_T85', 2)
+        meta = _parse_file_name(
+            file_name, model_runs=[('am2', 'extratropics_0.037_T85')]
+        )
+        self.assertEqual(meta['intvl_out'], 7)
+        self.assertEqual(meta['dtype_out_time'], 'reg.av')
+        self.assertEqual(meta['dtype_out_vert'], 'vert_int')
+        self.assertEqual(meta['run'], 'extratropics_0.037_T85')
+        self.assertEqual(meta['ens_mem'], 2)
+        self.assertIsNone(meta['region'])
+
+    def test_not_aospy_file(self):
+        self.assertIsNone(_parse_file_name('README.txt'))
+        self.assertIsNone(_parse_file_name('a.b.c.d.e.f.g.nc'))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
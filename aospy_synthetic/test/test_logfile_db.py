@@ -0,0 +1,169 @@
+"""Test suite for the aospy_synthetic log-structured file backend."""
+import unittest
+import shutil
+import sys
+
+from test_objs import (
+    runs, models, projects, variables, regions, calc_objs, units
+)
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+
+from . import AospyTestCase
+from . import test_db
+
+DB_DIR = 'test_logdb'
+
+
+class SharedLogFileDBTests(test_db.SharedDBTests):
+    def tearDown(self):
+        shutil.rmtree(DB_DIR)
+
+
+class TestProjLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = projects.p
+        self.ex_str_attr = 'direc_out'
+
+
+class TestModelLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = models.m
+        self.ex_str_attr = 'description'
+
+
+class TestRunLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = runs.r
+        self.ex_str_attr = 'description'
+
+
+class TestVarLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = variables.mse
+        self.ex_str_attr = 'description'
+
+
+class TestRegionLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = regions.nh
+        self.ex_str_attr = 'description'
+
+
+class TestCalcLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = calc_objs.c
+        self.ex_str_attr = 'dtype_out_time'
+
+
+class TestUnitsLogFileDB(SharedLogFileDBTests, AospyTestCase):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.AospyObj = units.J_kg1
+        self.ex_str_attr = 'plot_units'
+
+
+class TestLogFileDeleteCascade(test_db.TestDeleteCascade):
+    def setUp(self):
+        self.db = LogFileDB(DB_DIR)
+        self.calc = calc_objs.c
+        self.run = self.calc.run
+        self.model = self.run.model
+        self.proj = self.model.proj
+        self.var = self.calc.var
+        self.units = self.var.units
+        self.region = self.calc.region
+
+        self.db.add(self.calc)
+
+    def tearDown(self):
+        shutil.rmtree(DB_DIR)
+
+
+class TestSegmentMerge(AospyTestCase):
+    def setUp(self):
+        self.writers = [LogFileDB(DB_DIR, writer_id=name)
+                        for name in ('writer_a', 'writer_b')]
+        self.calc = calc_objs.c
+        self.run = self.calc.run
+
+    def tearDown(self):
+        shutil.rmtree(DB_DIR)
+
+    def test_uniqueness_across_writers(self):
+        for db in self.writers:
+            db.add(self.calc)
+        reader = LogFileDB(DB_DIR)
+        reader._assertNoDuplicates(self.calc, self.run, self.run.model)
+        reader._assertEqualAttrsRecursive(self.calc)
+
+    def test_delete_from_other_writer(self):
+        self.writers[0].add(self.calc)
+        self.writers[1].delete(self.run)
+        self.writers[0]._assertNotInDB(self.calc, self.run)
+        self.writers[0]._assertNoDuplicates(self.run.model)
+
+    def test_readd_after_delete(self):
+        self.writers[0].add(self.calc)
+        self.writers[1].delete(self.calc)
+        self.writers[0].add(self.calc)
+        LogFileDB(DB_DIR)._assertNoDuplicates(self.calc)
+
+    def test_compaction(self):
+        self.writers[0].add(self.calc)
+        self.writers[1].delete(self.run)
+        self.writers[0].compact()
+        self.writers[1].close()
+        self.writers[0].compact()
+
+        reader = LogFileDB(DB_DIR)
+        self.assertEqual(reader._list_segments(), {})
+        reader._assertNotInDB(self.calc, self.run)
+        reader._assertNoDuplicates(self.run.model, self.calc.var)
+
+    def test_parent_read_late(self):
+        self.writers[0].add(self.calc)
+        path = self.writers[0]._segment_path(self.writers[0]._segment_stem)
+        entries, _ = LogFileDB._read_segment(path, 0)
+        reader = LogFileDB(DB_DIR)
+        reader._reset_index()
+        # Children first, as if their parents' segment was read later
+        for entry in reversed(entries):
+            reader._apply(entry)
+        self.assertEqual(reader._records, LogFileDB(DB_DIR)._records)
+        self.assertEqual(dict(reader._orphans), {})
+
+    def test_concurrent_compaction(self):
+        self.writers[0].add(self.calc)
+        writer = self.writers[1]
+        refresh = writer.refresh
+
+        def refresh_then_compact_other():
+            # The other writer compacts between this writer's refresh and
+            # its link of the same generation
+            refresh()
+            writer.refresh = refresh
+            self.writers[0].compact()
+
+        writer.refresh = refresh_then_compact_other
+        writer._since_compaction = 5
+        writer.compact()
+        self.assertEqual(writer._since_compaction, 0)
+        self.assertEqual(writer._list_snapshots(), [1])
+        self.assertEqual(writer._generation, 1)
+        writer._assertEqualAttrsRecursive(self.calc)
+
+    def test_automatic_compaction(self):
+        db = LogFileDB(DB_DIR, compact_every=1)
+        db.add(self.calc)
+        self.assertEqual(db._list_snapshots(), [1])
+        LogFileDB(DB_DIR)._assertEqualAttrsRecursive(self.calc)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
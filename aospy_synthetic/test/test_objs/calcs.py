@@ -2,6 +2,7 @@
 """
 
 from aospy_synthetic.__config__ import PFULL_STR
+from aospy_synthetic.utils import reverse_cumulative_vert_int
 
 
 def dp(ps, bk, pk, arr):
@@ -23,44 +24,33 @@ def pfull(p):
 
 def gz(temp, sphum, dp, p):
     """Geopotential calculated from hydrostatic relation."""
-    pass
-#    integrand = (287.0 * (1.0 + 0.608 * sphum) * temp) / p
-#    integrand = integrand * dp
-#    gz = integrand.copy(deep=True)
-#    v = vert_coord_name(dp)
-#    print(v)
-#    for k in range(len(dp[v])):
-#        gz[{v: k}] = integrand.isel(**{v: slice(k, None)}).sum(dim=v)
-#    return gz
+    integrand = (287.0 * (1.0 + 0.608 * sphum) * temp) / p
+    return reverse_cumulative_vert_int(integrand, dp)
 
 
-def dse(temp, sphum, dp, p):
+def dse(temp, gz):
     """ Returns the dry static energy at each gridbox.
 
     $s = c_p T + gz$
     """
-    return (1005.0 * temp + gz(temp, sphum, dp, p))
+    return (1005.0 * temp + gz)
 
 
-def mse(temp, sphum, dp, p):
+def mse(dse, sphum):
     """ Returns the moist static energy at each gridbox.
 
     $m = c_p T + L_v q + gz$
 
     Parameters
     ----------
-    temp : array
-        temperature
+    dse : array
+        dry static energy
     sphum : array
         specific humidity
-    p : array
-        pressure at sigma levels
-    dp : array
-        thickness of pressure levels
 
     Returns
     -------
     mse : array
         moist static energy
     """
-    return (dse(temp, sphum, dp, p) + 2.5e6 * sphum)
+    return (dse + 2.5e6 * sphum)
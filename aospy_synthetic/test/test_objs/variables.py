@@ -142,7 +142,7 @@ dse = Var(
     name='dse',
     domain='atmos',
     description=('Dry Static Energy'),
-    variables=(temp, sphum, dp, p),
+    variables=(temp, gz),
     def_time=True,
     def_vert=True,
     def_lat=True,
@@ -154,7 +154,7 @@ mse = Var(
     name='mse',
     domain='atmos',
     description=('Moist Static Energy'),
-    variables=(temp, sphum, dp, p),
+    variables=(dse, sphum),
     def_time=True,
     def_vert=True,
     def_lat=True,
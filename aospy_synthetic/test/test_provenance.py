@@ -0,0 +1,112 @@
+"""Test suite for input file fingerprints of Calcs."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+from test_objs import calc_objs
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.provenance import StatCache, record_inputs, stale_calcs
+
+from . import AospyTestCase
+
+
+class SharedProvenanceTests(object):
+    def _make_db(self):
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.inputs = []
+        for name in ('temp.nc', 'sphum.nc'):
+            path = os.path.join(self.tmpdir, name)
+            with open(path, 'w') as f:
+                f.write(name)
+            self.inputs.append(path)
+        self.out_path = os.path.join(self.tmpdir, 'out.nc')
+        with open(self.out_path, 'w') as f:
+            f.write('out')
+
+        self.calc = calc_objs.c
+        self.orig_path_scratch = self.calc.path_scratch
+        self.calc.path_scratch = self.out_path
+        self.db = self._make_db()
+
+    def tearDown(self):
+        self.calc.path_scratch = self.orig_path_scratch
+        shutil.rmtree(self.tmpdir)
+
+    def test_no_fingerprints(self):
+        self.db.add(self.calc)
+        self.assertFalse(self.calc.is_up_to_date(backend=self.db))
+
+    def test_up_to_date(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        self.assertTrue(self.calc.is_up_to_date(backend=self.db))
+
+    def test_input_modified(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        with open(self.inputs[0], 'a') as f:
+            f.write('changed')
+        self.assertEqual(stale_calcs([self.calc], backend=self.db),
+                         [self.calc])
+
+    def test_unicode_data_in_direc(self):
+        # Paths decoded from JSON are unicode on Python 2
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        orig_direc = self.calc.run.data_in_direc
+        self.calc.run.data_in_direc = u'{}'.format(self.tmpdir)
+        try:
+            self.assertTrue(self.calc.is_up_to_date(backend=self.db))
+        finally:
+            self.calc.run.data_in_direc = orig_direc
+        stat_cache = StatCache()
+        stat_cache.scan([u'{}'.format(self.tmpdir)])
+        self.assertIsNotNone(stat_cache.stat(self.inputs[0]))
+
+    def test_input_removed(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        os.remove(self.inputs[1])
+        self.assertFalse(self.calc.is_up_to_date(backend=self.db))
+
+    def test_output_missing(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        os.remove(self.out_path)
+        self.assertFalse(self.calc.is_up_to_date(backend=self.db))
+
+    def test_touched_with_content_hash(self):
+        record_inputs(self.calc, self.inputs, backend=self.db,
+                      with_content_hash=True)
+        st = os.stat(self.inputs[0])
+        os.utime(self.inputs[0], (st.st_atime, st.st_mtime + 10))
+        self.assertFalse(self.calc.is_up_to_date(backend=self.db))
+        self.assertTrue(self.calc.is_up_to_date(backend=self.db,
+                                                check_content=True))
+
+    def test_readd_keeps_fingerprints(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        self.db.add(self.calc)
+        self.assertTrue(self.calc.is_up_to_date(backend=self.db))
+
+    def test_delete_removes_fingerprints(self):
+        record_inputs(self.calc, self.inputs, backend=self.db)
+        self.db.delete(self.calc)
+        self.db.add(self.calc)
+        self.assertFalse(self.calc.is_up_to_date(backend=self.db))
+
+
+class TestSQLAlchemyProvenance(SharedProvenanceTests, AospyTestCase):
+    def _make_db(self):
+        return SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                        'test.db'))
+
+
+class TestLogFileProvenance(SharedProvenanceTests, AospyTestCase):
+    def _make_db(self):
+        return LogFileDB(os.path.join(self.tmpdir, 'logdb'))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,123 @@
+"""Test suite for loading the input data of time chunks ahead."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic import io
+from aospy_synthetic.calc import compute_all
+from aospy_synthetic.db import registry
+from aospy_synthetic.reader import BlockReader
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_run
+
+
+class _Node(object):
+    """Stand-in for a loaded dag.Node, recording when it is evaluated."""
+    def __init__(self, plan_index, started):
+        self.inputs = []
+        self.plan_index = plan_index
+        self.started = started
+
+    def evaluate(self, values):
+        self.started[self.plan_index].set()
+        return np.zeros(100) + self.plan_index
+
+
+class _Plan(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+
+class TestBlockReader(AospyTestCase):
+    def setUp(self):
+        self.started = [threading.Event() for _ in range(4)]
+        self.plans = [_Plan([_Node(i, self.started)]) for i in range(4)]
+
+    def _consume(self, reader, check=None):
+        for i, (plan, load) in enumerate(reader):
+            if check is not None and i == 0:
+                check()
+            data = load(plan.nodes[0])
+            np.testing.assert_array_equal(data, i)
+        self.assertEqual(reader.bytes_loaded, 4 * 800)
+
+    def test_prefetch(self):
+        def check():
+            self.assertTrue(self.started[1].wait(5))
+            self.assertFalse(self.started[2].wait(0.05))
+        self._consume(BlockReader(self.plans, depth=1), check)
+
+    def test_no_prefetch(self):
+        def check():
+            self.assertFalse(self.started[1].wait(0.05))
+        self._consume(BlockReader(self.plans, depth=0), check)
+
+    def test_max_bytes(self):
+        def check():
+            self.assertTrue(self.started[1].wait(5))
+            self.assertFalse(self.started[2].wait(0.05))
+        self._consume(BlockReader(self.plans, depth=3, max_bytes=1000),
+                      check)
+
+    def test_stop(self):
+        reader = BlockReader(self.plans, depth=1)
+        for plan, load in reader:
+            break
+        self.assertFalse(self.started[3].wait(0.05))
+
+
+class TestCalcPrefetch(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr', 'swdn_toa', 'swup_toa'], end_year=6,
+            data_in_dur=2
+        )
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _compute(self, **kwargs):
+        calcs = [make_calc(self.proj, self.model, self.run, var,
+                           os.path.join(self.tmpdir, 'scratch'),
+                           dtype_out_time='ts', chunk_len=True)
+                 for var in (variables.olr, variables.net_sw_toa)]
+        return compute_all(calcs, use_cache=False, **kwargs)
+
+    def test_compute(self):
+        expected = self._compute(prefetch_depth=0)
+        np.testing.assert_allclose(
+            expected[0].values,
+            self.data['olr']['olr'].values.reshape(6, 12, 4, 3).mean(axis=1)
+        )
+        for kwargs in ({}, {'prefetch_depth': 2},
+                       {'prefetch_depth': 2, 'max_prefetch_bytes': 1}):
+            for result, expected_result in zip(self._compute(**kwargs),
+                                               expected):
+                np.testing.assert_allclose(result.values,
+                                           expected_result.values)
+
+    def test_hdf5_lock(self):
+        # Reading every file as through netCDF4 serializes the loads ahead
+        # with the reads of the main thread, without deadlocking
+        expected = self._compute(prefetch_depth=0)
+        uses_hdf5 = io._uses_hdf5
+        io._uses_hdf5 = lambda path: True
+        try:
+            results = self._compute(prefetch_depth=2)
+        finally:
+            io._uses_hdf5 = uses_hdf5
+        for result, expected_result in zip(results, expected):
+            np.testing.assert_allclose(result.values, expected_result.values)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,99 @@
+"""Test suite for reconciling tracked Calcs with output files on disk."""
+import unittest
+import copy
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+
+from test_objs import calc_objs
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.db.reconcile import reconcile, scan_outputs
+
+from . import AospyTestCase
+
+
+class TestReconcile(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.calc = calc_objs.c
+        self.out_dir = os.path.join(self.tmpdir, 'out', 'mse')
+        os.makedirs(self.out_dir)
+        self._touch(os.path.join(self.out_dir, 'other.nc'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _touch(path):
+        with open(path, 'w') as f:
+            f.write('')
+
+    def test_scan_outputs(self):
+        path = os.path.join(self.out_dir, self.calc.file_name)
+        self._touch(path)
+        self._touch(os.path.join(self.out_dir, 'notes.txt'))
+        found = scan_outputs([self.tmpdir], max_workers=2)
+        self.assertEqual(found, {
+            self.calc.file_name: [path],
+            'other.nc': [os.path.join(self.out_dir, 'other.nc')]
+        })
+
+    def test_scan_archive(self):
+        path = os.path.join(self.out_dir, self.calc.file_name)
+        self._touch(path)
+        tar_path = os.path.join(self.tmpdir, 'data.tar')
+        with tarfile.open(tar_path, 'w') as tar:
+            tar.add(path, arcname=self.calc.file_name)
+        os.remove(path)
+        found = scan_outputs([self.tmpdir])
+        self.assertEqual(found[self.calc.file_name],
+                         [os.path.join(tar_path, self.calc.file_name)])
+
+    def _computed(self):
+        calc = copy.copy(self.calc)
+        calc.compute_time = 1.
+        return calc
+
+    def test_missing(self):
+        self.db.add(self._computed())
+        result = reconcile(self.db, [self.tmpdir])
+        self.assertEqual(result.missing, set([self.calc.file_name]))
+        self.assertEqual(result.pending, set())
+        self.assertEqual(list(result.untracked), ['other.nc'])
+        self.db._assertNoDuplicates(self.calc)
+
+    def test_delete_missing(self):
+        self.db.add(self._computed())
+        reconcile(self.db, [self.tmpdir], delete_missing=True)
+        self.db._assertNotInDB(self.calc)
+        self.db._assertNoDuplicates(self.calc.run)
+
+    def test_pending(self):
+        # Calcs registered but never computed are not missing, nor deleted
+        for db in (self.db, LogFileDB(os.path.join(self.tmpdir, 'logdb'))):
+            db.add(self.calc)
+            result = reconcile(db, [self.tmpdir], delete_missing=True)
+            self.assertEqual(result.missing, set())
+            self.assertEqual(result.pending, set([self.calc.file_name]))
+            self.assertEqual(db.get_calc_file_names(),
+                             set([self.calc.file_name]))
+            self.assertEqual(db.get_calc_file_names(computed=True), set())
+
+    def test_register(self):
+        self._touch(os.path.join(self.out_dir, self.calc.file_name))
+        result = reconcile(self.db, [self.tmpdir], calcs=[self.calc],
+                           register=True)
+        self.assertIn(self.calc.file_name, result.untracked)
+        self.db._assertNoDuplicates(self.calc)
+        result = reconcile(self.db, [self.tmpdir])
+        self.assertEqual(result.missing, set())
+        self.assertEqual(list(result.untracked), ['other.nc'])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
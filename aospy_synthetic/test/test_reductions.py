@@ -0,0 +1,62 @@
+"""Test suite for time reductions accumulated over chunks."""
+import unittest
+import sys
+
+import numpy as np
+import pandas as pd
+import xray
+
+from aospy_synthetic.reductions import accumulator
+
+from . import AospyTestCase
+
+
+class TestAccumulators(AospyTestCase):
+    def setUp(self):
+        values = 1e4 + np.random.RandomState(0).rand(36, 3)
+        values[:14, 0] = np.nan
+        self.arr = xray.DataArray(
+            values, dims=['time', 'x'],
+            coords={'time': pd.date_range('2000-01-01', periods=36,
+                                          freq='MS')}
+        )
+
+    def _accumulate(self, reduction, bounds):
+        acc = accumulator(reduction)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            acc.add(self.arr.isel(time=slice(start, end)))
+        return acc.result()
+
+    def test_mean(self):
+        np.testing.assert_allclose(self._accumulate('avg', [0, 5, 20, 36]),
+                                   self.arr.mean('time'))
+
+    def test_std(self):
+        np.testing.assert_allclose(self._accumulate('std', [0, 5, 20, 36]),
+                                   self.arr.std('time'))
+
+    def test_yearly_mean_across_chunks(self):
+        result = self._accumulate('ts', [0, 7, 30, 36])
+        expected = self.arr.groupby('time.year').mean('time')
+        np.testing.assert_array_equal(result['year'], expected['year'])
+        np.testing.assert_allclose(result, expected)
+
+    def test_merge_state(self):
+        # The statistics of disjoint parts, e.g. stored and newly computed
+        # years, combine into those of the whole
+        for reduction in ('avg', 'std', 'ts'):
+            first, second = accumulator(reduction), accumulator(reduction)
+            first.add(self.arr.isel(time=slice(0, 20)))
+            second.add(self.arr.isel(time=slice(20, 36)))
+            second.merge_state(first.state())
+            np.testing.assert_allclose(
+                second.result(), self._accumulate(reduction, [0, 36])
+            )
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            accumulator('max')
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
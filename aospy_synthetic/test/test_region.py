@@ -0,0 +1,163 @@
+"""Test suite for region masks and regional averages."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.calc import cache_stats, compute_all
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.region import (Region, MaskCache, grid_area,
+                                    regional_averages)
+
+from . import AospyTestCase
+from .synthetic_data import LAT, LON, make_data, write_run, make_calc
+
+
+class TestMask(AospyTestCase):
+    def setUp(self):
+        self.lat = np.array([-60., -30., 0., 30., 60.])
+        self.lon = np.array([0., 90., 180., 270.])
+
+    def test_box(self):
+        region = Region(name='box', lat_bounds=(0, 40), lon_bounds=(90, 180))
+        mask = region.mask(self.lat, self.lon)
+        self.assertEqual(list(zip(*np.nonzero(mask))),
+                         [(2, 1), (2, 2), (3, 1), (3, 2)])
+
+    def test_wraparound(self):
+        region = Region(name='wrap', lat_bounds=(-90, 90),
+                        lon_bounds=(-100, 10))
+        self.assertEqual(list(region.mask(self.lat, self.lon)[0]),
+                         [True, False, False, True])
+
+    def test_union(self):
+        region = Region(name='union', mask_bounds=[((-90, -50), (0, 360)),
+                                                   ((50, 90), (0, 360))])
+        mask = region.mask(self.lat, self.lon)
+        self.assertEqual(list(mask.all(axis=1)),
+                         [True, False, False, False, True])
+
+    def test_land_mask_required(self):
+        region = Region(name='land', lat_bounds=(-90, 90),
+                        lon_bounds=(0, 360), do_land_mask=True)
+        area = grid_area(self.lat, self.lon)
+        with self.assertRaises(ValueError):
+            region.weights(self.lat, self.lon, area)
+        land = np.zeros(area.shape)
+        land[:, 0] = 1.
+        self.assertEqual(
+            np.count_nonzero(region.weights(self.lat, self.lon, area, land)),
+            len(self.lat)
+        )
+
+
+class TestRegionalAverages(AospyTestCase):
+    def setUp(self):
+        self.regions = [
+            Region(name='sh', lat_bounds=(-90, 0), lon_bounds=(0, 360)),
+            Region(name='nh', lat_bounds=(0, 90), lon_bounds=(0, 360)),
+            Region(name='east', lat_bounds=(-90, 90), lon_bounds=(0, 200))
+        ]
+        self.arr = make_data('olr', np.arange(5.))['olr']
+        self.cache = MaskCache()
+
+    def _expected(self, arr, region):
+        weights = region.weights(LAT, LON, grid_area(LAT, LON))
+        values = arr.values
+        valid = ~np.isnan(values)
+        return ((np.where(valid, values, 0.) * weights).sum(axis=(1, 2)) /
+                (valid * weights).sum(axis=(1, 2)))
+
+    def test_all_regions(self):
+        self.arr[0, 3, 1] = np.nan
+        result = regional_averages(self.arr, self.regions, cache=self.cache)
+        self.assertEqual(result.dims, ('time', 'region'))
+        self.assertEqual(list(result['region'].values), ['sh', 'nh', 'east'])
+        for i, region in enumerate(self.regions):
+            np.testing.assert_allclose(result.values[:, i],
+                                       self._expected(self.arr, region))
+
+    def test_cache(self):
+        regional_averages(self.arr, self.regions, cache=self.cache)
+        regional_averages(self.arr * 2, self.regions[:1], cache=self.cache)
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        regional_averages(self.arr.isel(lat=slice(1, None)),
+                          self.regions[:1], cache=self.cache)
+        self.assertEqual(len(self.cache), 4)
+
+    def test_transposed(self):
+        result = regional_averages(self.arr.transpose('lon', 'time', 'lat'),
+                                   self.regions, cache=self.cache)
+        expected = regional_averages(self.arr, self.regions,
+                                     cache=self.cache)
+        np.testing.assert_allclose(result.values, expected.values)
+
+
+class TestCalcRegional(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr']
+        )
+        self.regions = [
+            Region(name='nh', lat_bounds=(0, 90), lon_bounds=(0, 360)),
+            Region(name='sh', lat_bounds=(-90, 0), lon_bounds=(0, 360))
+        ]
+        self.proj.regions = {region.name: region for region in self.regions}
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _calc(self, **kwargs):
+        return make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'scratch'), **kwargs)
+
+    def test_all_regions(self):
+        result = self._calc(dtype_out_time='reg.ts', chunk_len=1).compute()
+        self.assertEqual(result.dims, ('year', 'region'))
+        expected = regional_averages(self.data['olr']['olr'],
+                                     self.regions[::-1])
+        np.testing.assert_allclose(
+            result.sel(region='nh').values,
+            expected.sel(region='nh').values.reshape(4, 12).mean(axis=1)
+        )
+
+    def test_calc_region(self):
+        result = self._calc(dtype_out_time='reg.std',
+                            region=self.regions[1]).compute()
+        expected = regional_averages(self.data['olr']['olr'],
+                                     self.regions[1:])
+        self.assertEqual(list(result['region'].values), ['sh'])
+        np.testing.assert_allclose(result.values, expected.std('time'))
+
+    def test_regions_stored_separately(self):
+        self.proj.backend = SQLAlchemyDB(
+            'sqlite:///' + os.path.join(self.tmpdir, 'test.db')
+        )
+        expected = regional_averages(self.data['olr']['olr'], self.regions)
+        calcs = [self._calc(dtype_out_time='reg.av', region=region)
+                 for region in self.regions]
+        self.assertNotEqual(calcs[0].path_scratch, calcs[1].path_scratch)
+        self.assertNotEqual(calcs[0].path_stats, calcs[1].path_stats)
+        compute_all(calcs)
+        cache_stats.reset()
+        calcs = [self._calc(dtype_out_time='reg.av', region=region)
+                 for region in self.regions]
+        results = compute_all(calcs)
+        self.assertEqual(cache_stats.hits, 2)
+        for region, result in zip(self.regions, results):
+            self.assertEqual(list(result['region'].values), [region.name])
+            np.testing.assert_allclose(
+                result.values, expected.sel(region=[region.name]).mean('time')
+            )
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
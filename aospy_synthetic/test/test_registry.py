@@ -0,0 +1,98 @@
+"""Test suite for automatic registration of aospy objects with a backend."""
+import unittest
+import os
+import sys
+
+from test_objs import projects, models, runs, variables, regions
+from aospy_synthetic.calc import CalcInterface, Calc
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+
+from . import AospyTestCase
+
+
+class CountingDB(SQLAlchemyDB):
+    """SQLAlchemyDB that counts the number of bulk additions."""
+    def __init__(self, *args, **kwargs):
+        super(CountingDB, self).__init__(*args, **kwargs)
+        self.num_transactions = 0
+
+    def add_all(self, AospyObjs):
+        self.num_transactions += 1
+        super(CountingDB, self).add_all(AospyObjs)
+
+
+class TestRegistry(AospyTestCase):
+    def setUp(self):
+        self.db = CountingDB()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        os.remove('test.db')
+
+    def _make_calc(self, dtype_out_time, backend=None):
+        return Calc(
+            CalcInterface(proj=projects.p,
+                          model=models.m,
+                          run=runs.r,
+                          var=variables.mse,
+                          date_range=('0021-01-01', '0080-12-31'),
+                          intvl_in='monthly',
+                          intvl_out='son',
+                          dtype_in_time='ts',
+                          dtype_in_vert='sigma',
+                          dtype_out_time=dtype_out_time,
+                          dtype_out_vert=False,
+                          region=regions.nh,
+                          level=False,
+                          verbose=False,
+                          backend=backend)
+        )
+
+    def test_batch_flushes_once(self):
+        with registry.batch():
+            calcs = [self._make_calc(dtype, backend=self.db)
+                     for dtype in ('avg', 'std', 'ts')]
+            self.assertEqual(self.db.num_transactions, 0)
+        self.assertEqual(self.db.num_transactions, 1)
+        self.db._assertNoDuplicates(*calcs)
+        self.db._assertEqualAttrsRecursive(calcs[0])
+
+    def test_no_backend_not_registered(self):
+        self._make_calc('avg')
+        self.assertEqual(len(registry.get_registry()), 0)
+
+    def test_coalesce_repeated_registration(self):
+        calc = self._make_calc('avg', backend=self.db)
+        registry.register(calc)
+        self.assertEqual(len(registry.get_registry()), 1)
+
+    def test_backend_from_parent(self):
+        runs.r.backend = self.db
+        try:
+            calc = self._make_calc('avg')
+        finally:
+            runs.r.backend = None
+        registry.flush()
+        self.db._assertNoDuplicates(calc)
+
+    def test_untracked_skipped(self):
+        calc = self._make_calc('avg', backend=self.db)
+        calc.db_tracking = False
+        registry.flush()
+        self.assertEqual(self.db.num_transactions, 0)
+        self.db._assertNotInDB(calc)
+
+    def test_max_pending(self):
+        reg = registry.PendingRegistry(flush_at_exit=False, max_pending=2)
+        calcs = [self._make_calc(dtype) for dtype in ('avg', 'std', 'ts')]
+        for calc in calcs:
+            reg.register(calc, backend=self.db)
+        self.assertEqual(self.db.num_transactions, 1)
+        self.assertEqual(len(reg), 1)
+        self.db._assertNoDuplicates(*calcs[:2])
+        self.db._assertNotInDB(calcs[2])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
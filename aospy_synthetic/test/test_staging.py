@@ -0,0 +1,130 @@
+"""Test suite for staging input files from archive to scratch."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.db import registry
+from aospy_synthetic.staging import Stager
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_gfdl_run
+
+
+class TestStager(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmpdir, 'archive')
+        self.scratch = os.path.join(self.tmpdir, 'scratch')
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.archive, 'run', 'file{}.nc'.format(i))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100 * (i + 1))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _stager(self, **kwargs):
+        return Stager(self.archive, self.scratch, max_workers=2, **kwargs)
+
+    def test_staged(self):
+        outside = os.path.join(self.tmpdir, 'grid.nc')
+        with self._stager() as stager:
+            stager.prefetch(self.paths[:2])
+            with stager.staged(self.paths[:3] + [outside]) as local_paths:
+                self.assertEqual(local_paths[3], outside)
+                for path, local_path in zip(self.paths, local_paths[:3]):
+                    self.assertEqual(
+                        local_path,
+                        os.path.join(self.scratch, 'run',
+                                     os.path.basename(path))
+                    )
+                    with open(local_path, 'rb') as f:
+                        self.assertEqual(f.read(), open(path, 'rb').read())
+            self.assertEqual(stager.hits + stager.misses, 3)
+            self.assertEqual(stager.bytes_copied, 600)
+
+        # Copies staged earlier are reused
+        with self._stager() as stager:
+            with stager.staged(self.paths[:1]):
+                pass
+            self.assertEqual(stager.bytes_copied, 0)
+
+    def test_lru_quota(self):
+        with self._stager(quota=500) as stager:
+            with stager.staged(self.paths[:2]):
+                pass
+            with stager.staged(self.paths[:1]):
+                pass
+            # file1 (200 bytes) is least recently used
+            with stager.staged(self.paths[2:3]) as local_paths:
+                self.assertEqual(stager.evictions, 1)
+                self.assertFalse(os.path.exists(
+                    stager.scratch_path(self.paths[1])))
+                self.assertTrue(os.path.exists(local_paths[0]))
+            self.assertEqual(stager.staged_bytes(), 400)
+
+            # Files in use are kept over the quota
+            with stager.staged(self.paths[2:4]) as local_paths:
+                self.assertTrue(all(os.path.exists(path)
+                                    for path in local_paths))
+            self.assertLessEqual(stager.staged_bytes(), 500)
+
+            # Evicted files are staged again when needed
+            with stager.staged(self.paths[1:2]) as local_paths:
+                self.assertTrue(os.path.exists(local_paths[0]))
+
+    def test_missing(self):
+        with self._stager() as stager:
+            with self.assertRaises(OSError):
+                with stager.staged([os.path.join(self.archive, 'none.nc')]):
+                    pass
+
+
+class TestCalcStaging(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmpdir, 'archive')
+        self.proj, self.model, self.run, self.data = write_gfdl_run(
+            os.path.join(self.archive, 'data'), ['olr'], end_year=6
+        )
+        size = os.path.getsize(os.path.join(
+            self.archive, 'data', 'atmos', 'ts', 'monthly', '2yr',
+            'atmos.000101-000212.olr.nc'
+        ))
+        self.stager = Stager(self.archive,
+                             os.path.join(self.tmpdir, 'scratch'),
+                             max_workers=2, quota=2 * size)
+
+    def tearDown(self):
+        self.stager.shutdown()
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunked(self):
+        calc = make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'out'),
+                         dtype_out_time='ts', chunk_len=True,
+                         stager=self.stager)
+        result = calc.compute()
+        np.testing.assert_allclose(
+            result.values,
+            self.data['olr']['olr'].values.reshape(6, 12, 4, 3).mean(axis=1)
+        )
+        self.assertEqual(self.stager.hits + self.stager.misses, 3)
+        self.assertEqual(self.stager.evictions, 1)
+        # Provenance refers to the archive files
+        self.assertTrue(all(path.startswith(self.archive)
+                            for path, _, _, _ in calc.input_fingerprints()))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
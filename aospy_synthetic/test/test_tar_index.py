@@ -0,0 +1,212 @@
+"""Test suite for indexed access to archives of outputs."""
+import unittest
+import multiprocessing
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+
+import numpy as np
+
+from test_objs import variables
+from aospy_synthetic.calc import archive_all, cache_stats, compute_all
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.tar_index import (StaleIndexError, TarIndex, _indices,
+                                       append_files, tar_index)
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_run
+
+
+class TestTarIndex(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tar_path = os.path.join(self.tmpdir, 'data.tar')
+        self.contents = {}
+        with tarfile.open(self.tar_path, 'w') as tar:
+            for i in range(3):
+                name = 'out{}.nc'.format(i)
+                self.contents[name] = self._write(name, 700 * (i + 1))
+                tar.add(os.path.join(self.tmpdir, name), arcname=name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, size):
+        data = os.urandom(size)
+        with open(os.path.join(self.tmpdir, name), 'wb') as f:
+            f.write(data)
+        return data
+
+    def _check_tarfile(self):
+        """Checks the archive's members with tarfile."""
+        with tarfile.open(self.tar_path) as tar:
+            contents = {member.name: tar.extractfile(member).read()
+                        for member in tar}
+        self.assertEqual(contents, self.contents)
+
+    def test_read(self):
+        index = TarIndex.scan(self.tar_path)
+        self.assertEqual(len(index), 3)
+        for name, data in self.contents.items():
+            self.assertEqual(index.read(name), data)
+        with self.assertRaises(KeyError):
+            index.read('none.nc')
+
+    def test_append(self):
+        index = tar_index(self.tar_path)
+        with open(self.tar_path, 'rb') as f:
+            head = f.read(index.end)
+        self.contents['out1.nc'] = self._write('out1.nc', 100)
+        self.contents['out3.nc'] = self._write('out3.nc', 512)
+        index.append([('out1.nc', os.path.join(self.tmpdir, 'out1.nc')),
+                      ('out3.nc', os.path.join(self.tmpdir, 'out3.nc'))])
+        # Existing members are left in place
+        with open(self.tar_path, 'rb') as f:
+            self.assertEqual(f.read(len(head)), head)
+        for name, data in self.contents.items():
+            self.assertEqual(index.read(name), data)
+        self._check_tarfile()
+        self.assertEqual(TarIndex.scan(self.tar_path).state(), index.state())
+
+    def test_create(self):
+        path = os.path.join(self.tmpdir, 'new.tar')
+        index = tar_index(path)
+        self.assertEqual(len(index), 0)
+        index.append([('out0.nc', os.path.join(self.tmpdir, 'out0.nc'))])
+        self.assertEqual(tar_index(path).read('out0.nc'),
+                         self.contents['out0.nc'])
+
+    def test_extract(self):
+        index = tar_index(self.tar_path)
+        targets = {name: os.path.join(self.tmpdir, 'restored', name)
+                   for name in ('out2.nc', 'out0.nc')}
+        index.extract(targets)
+        for name, path in targets.items():
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.contents[name])
+
+    def test_stale_sidecar(self):
+        index = tar_index(self.tar_path)
+        self.assertTrue(os.path.isfile(index.sidecar_path))
+        # The archive is changed behind the index's back
+        with tarfile.open(self.tar_path, 'a') as tar:
+            tar.add(os.path.join(self.tmpdir, 'out0.nc'), arcname='new.nc')
+        self.contents['new.nc'] = self.contents['out0.nc']
+        index = tar_index(self.tar_path)
+        self.assertIn('new.nc', index)
+        self._check_tarfile()
+        with self.assertRaises(IOError):
+            TarIndex.from_state(self.tar_path, dict(index.state(),
+                                                    stamp=None)).append([])
+
+    def test_concurrent_append(self):
+        first, second = TarIndex.scan(self.tar_path), TarIndex.scan(
+            self.tar_path)
+        first.append([('new0.nc', os.path.join(self.tmpdir, 'out0.nc'))])
+        with self.assertRaises(StaleIndexError):
+            second.append([('new1.nc', os.path.join(self.tmpdir, 'out1.nc'))])
+
+        def archive(worker):
+            for i in range(10):
+                name = 'w{}_{}.nc'.format(worker, i)
+                append_files(self.tar_path, [
+                    (name, os.path.join(self.tmpdir, 'out{}.nc'.format(i % 3)))
+                ], max_attempts=100)
+
+        processes = [multiprocessing.Process(target=archive, args=(worker,))
+                     for worker in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.contents['new0.nc'] = self.contents['out0.nc']
+        for worker in range(2):
+            for i in range(10):
+                self.contents['w{}_{}.nc'.format(worker, i)] = self.contents[
+                    'out{}.nc'.format(i % 3)]
+        self._check_tarfile()
+
+
+class TestPersistence(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tar_path = os.path.join(self.tmpdir, 'data.tar')
+        self.src = os.path.join(self.tmpdir, 'out.nc')
+        with open(self.src, 'wb') as f:
+            f.write(b'x' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _check_backend(self, make_backend):
+        tar_index(self.tar_path, make_backend()).append([('out.nc',
+                                                          self.src)])
+        state = make_backend().get_tar_index(self.tar_path)
+        self.assertEqual(TarIndex.scan(self.tar_path).state(), state)
+
+        # The stored index is used, rather than a new scan, when the sidecar
+        # file is lost
+        os.remove(self.tar_path + '.idx')
+        _indices.clear()
+        index = tar_index(self.tar_path, make_backend())
+        self.assertFalse(os.path.exists(self.tar_path + '.idx'))
+        self.assertEqual(index.read('out.nc'), b'x' * 1000)
+
+    def test_sqlalchemy(self):
+        url = 'sqlite:///' + os.path.join(self.tmpdir, 'test.db')
+        self._check_backend(lambda: SQLAlchemyDB(url))
+
+    def test_logfile(self):
+        db_dir = os.path.join(self.tmpdir, 'logdb')
+        self._check_backend(lambda: LogFileDB(db_dir))
+        LogFileDB(db_dir).compact()
+        self.assertIsNotNone(LogFileDB(db_dir).get_tar_index(self.tar_path))
+
+
+class TestCalcArchive(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLAlchemyDB('sqlite:///' + os.path.join(self.tmpdir,
+                                                           'test.db'))
+        self.proj, self.model, self.run, self.data = write_run(
+            self.tmpdir, ['olr'], backend=self.db
+        )
+        cache_stats.reset()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _calc(self):
+        calc = make_calc(self.proj, self.model, self.run, variables.olr,
+                         os.path.join(self.tmpdir, 'scratch'),
+                         dtype_out_time=('avg', 'std'))
+        calc.dir_archive = os.path.join(self.tmpdir, 'archive')
+        calc.path_archive = calc._path_archive()
+        return calc
+
+    def test_restore(self):
+        calc = self._calc()
+        expected = compute_all([calc])
+        archive_all([calc])
+        index = tar_index(calc.path_archive)
+        self.assertEqual(sorted(index.members),
+                         sorted(output.file_name
+                                for output in calc.outputs()))
+
+        for output in calc.outputs():
+            os.remove(output.path_scratch)
+        result = compute_all([self._calc()])
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (2, 2))
+        for dtype_out_time in ('avg', 'std'):
+            np.testing.assert_allclose(result[0][dtype_out_time].values,
+                                       expected[0][dtype_out_time].values)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
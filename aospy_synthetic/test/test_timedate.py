@@ -0,0 +1,178 @@
+"""Test suite for time selection."""
+import datetime
+import unittest
+import sys
+
+import numpy as np
+import pandas as pd
+import xray
+
+from aospy_synthetic.timedate import (
+    CalendarTimeIndex, TimeIndex, TimeIndexCache, TimeManager, _get_time,
+    _prep_time_data, date_bounds, date_from_days, days_from_date, time_array,
+    time_index
+)
+
+from . import AospyTestCase
+
+
+class TestTimeIndex(AospyTestCase):
+    def setUp(self):
+        self.time = xray.DataArray(
+            pd.date_range('2000-01-01', '2003-12-31', freq='6H'),
+            dims=['time'], name='time'
+        )
+        self.time = self.time.assign_coords(time=self.time)
+        self.index = TimeIndex(self.time.values)
+
+    def _expected(self, months, start_date, end_date):
+        cond = False
+        for month in months:
+            cond |= (self.time['time.month'] == month)
+        cond &= self.time['time'] >= np.datetime64(start_date)
+        cond &= self.time['time'] < np.datetime64(end_date)
+        return cond.values
+
+    def test_year_month(self):
+        np.testing.assert_array_equal(self.index.month,
+                                      self.time['time.month'].values)
+        np.testing.assert_array_equal(self.index.year,
+                                      self.time['time.year'].values)
+
+    def test_mask(self):
+        for months in ([12, 1, 2], [6], range(1, 13)):
+            np.testing.assert_array_equal(
+                self.index.mask(months, '2000-06-01', '2002-03-01'),
+                self._expected(months, '2000-06-01', '2002-03-01')
+            )
+
+    def test_contiguous_slice(self):
+        inds = self.index.select(None, '2001-01-01', '2002-01-01')
+        self.assertIsInstance(inds, slice)
+        self.assertEqual(inds.stop - inds.start, 365 * 4)
+        self.assertIsInstance(self.index.select([6, 7], '2001-01-01',
+                                                '2001-12-31'), slice)
+        self.assertNotIsInstance(self.index.select([6, 7]), slice)
+        self.assertEqual(self.index.select([1], '2005-01-01'), slice(0, 0))
+
+    def test_unsorted(self):
+        shuffled = np.random.RandomState(0).permutation(self.time.values)
+        index = TimeIndex(shuffled)
+        mask = index.mask([12, 1, 2], '2000-06-01', '2002-03-01')
+        np.testing.assert_array_equal(
+            np.sort(shuffled[mask]),
+            self.time.values[self._expected([12, 1, 2], '2000-06-01',
+                                            '2002-03-01')]
+        )
+
+    def test_get_time(self):
+        result = _get_time(self.time, '2000-06-01', '2002-03-01',
+                           TimeManager.month_indices('djf'))
+        np.testing.assert_array_equal(
+            result.values,
+            self.time.values[self._expected([12, 1, 2], '2000-06-01',
+                                            '2002-03-01')]
+        )
+
+
+class TestCalendars(AospyTestCase):
+    def test_standard(self):
+        days = np.arange(-5, 800000, 97)
+        year, month, day = date_from_days(days)
+        ref = datetime.date(1, 1, 1).toordinal()
+        dates = [datetime.date.fromordinal(ref + int(d)) for d in days[1:]]
+        self.assertEqual(list(zip(year[1:], month[1:], day[1:])),
+                         [(d.year, d.month, d.day) for d in dates])
+        np.testing.assert_array_equal(days_from_date(year, month, day), days)
+
+    def test_fixed_length(self):
+        for calendar, length in (('noleap', 365), ('360_day', 360)):
+            days = np.arange(0, 10 * length)
+            year, month, day = date_from_days(days, calendar)
+            np.testing.assert_array_equal(
+                days_from_date(year, month, day, calendar), days
+            )
+            self.assertEqual(np.bincount(year)[1:].tolist(), [length] * 10)
+        self.assertEqual(days_from_date(2, 3, 1, 'noleap'), 365 + 59)
+        self.assertEqual(days_from_date(1, 12, 30, '360_day'), 359)
+        self.assertEqual(days_from_date(1, 12, 31, '360_day'), 359)
+        self.assertEqual(days_from_date(1, 2, 29, 'noleap'), 58)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            days_from_date(1, 1, 1, 'julian')
+        with self.assertRaises(ValueError):
+            CalendarTimeIndex([0.], 'months since 0001-01-01')
+
+    def test_index(self):
+        hours = np.arange(0., 24 * 365 * 3, 6.)
+        index = CalendarTimeIndex(hours, 'hours since 0002-01-01 00:00:00',
+                                  'noleap')
+        self.assertEqual(index.year[[0, -1]].tolist(), [2, 4])
+        self.assertEqual(index.month[4 * 59], 3)
+        inds = index.select([12, 1, 2], datetime.datetime(2, 6, 1),
+                            datetime.datetime(3, 3, 1))
+        self.assertEqual(len(index.times[inds]), 4 * (31 + 31 + 28))
+
+    def test_month_end_bounds(self):
+        hours = np.arange(0., 24 * 360 * 2, 6.)
+        index = CalendarTimeIndex(hours, 'hours since 0001-01-01 00:00:00',
+                                  '360_day')
+        year_one = index.select(None, datetime.datetime(1, 1, 1),
+                                datetime.datetime(2, 1, 1))
+        self.assertEqual(year_one, slice(0, 4 * 360))
+        self.assertEqual(index.select(None, datetime.datetime(1, 12, 31),
+                                      datetime.datetime(2, 1, 1)),
+                         slice(4 * 360, 4 * 360))
+        self.assertEqual(index.select(None, datetime.datetime(1, 1, 1),
+                                      datetime.datetime(1, 12, 31)),
+                         year_one)
+
+    def test_prep_time_data(self):
+        ds = xray.Dataset(coords={'time': ('time', [0., 30., 60.], {
+            'units': 'days since 0003-01-01', 'calendar': '360_day'
+        })})
+        time = _prep_time_data(ds)['time']
+        self.assertEqual(time.attrs['units'], 'days since 0001-01-01 00:00:00')
+        np.testing.assert_array_equal(time.values, [720., 750., 780.])
+        self.assertIsInstance(time_index(time), CalendarTimeIndex)
+        self.assertEqual(time_index(time).month.tolist(), [1, 2, 3])
+
+
+class TestTimeIndexCache(AospyTestCase):
+    def test_lru(self):
+        cache = TimeIndexCache(maxsize=2)
+        times = [pd.date_range('{}-01-01'.format(year), periods=12,
+                               freq='MS').values
+                 for year in (2000, 2001, 2002)]
+        first = cache.get(times[0])
+        self.assertIs(cache.get(times[0].copy()), first)
+        cache.get(times[1])
+        cache.get(times[0])
+        cache.get(times[2])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertIs(cache.get(times[0]), first)
+        self.assertIsNot(cache.get(times[1]), None)
+        self.assertEqual(cache.misses, 4)
+
+
+class TestTimeArray(AospyTestCase):
+    def test_interned(self):
+        start, end = date_bounds(('0001-01-01', '0004-12-31'))
+        arr = time_array(start, end, TimeManager.month_indices('djf'))
+        self.assertIs(time_array(start, end, [12, 1, 2]), arr)
+        self.assertEqual(len(arr), 12)
+        self.assertEqual(sorted(set(arr['time.month'].values)), [1, 2, 12])
+        self.assertEqual(arr.values[0], np.datetime64('1900-01-31'))
+        with self.assertRaises(TypeError):
+            arr[0] = arr.values[1]
+
+    def test_date_bounds(self):
+        bounds = date_bounds(('0001-01-01', '0002-06-30', '0004-12-31'))
+        self.assertIs(date_bounds(('0001-01-01', '0004-12-31')), bounds)
+        self.assertEqual([date.year for date in bounds], [1, 4])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
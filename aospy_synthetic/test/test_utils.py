@@ -0,0 +1,65 @@
+"""Test suite for aospy utility functions."""
+import unittest
+import sys
+
+import numpy as np
+import xray
+
+from aospy_synthetic.__config__ import PFULL_STR, PLEVEL_STR
+from aospy_synthetic.utils import reverse_cumulative_vert_int, vert_coord_name
+
+from . import AospyTestCase
+
+
+class TestReverseCumulativeVertInt(AospyTestCase):
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        dims = ('time', PFULL_STR, 'lat')
+        coords = {PFULL_STR: [100., 400., 700., 1000.]}
+        self.integrand = xray.DataArray(rs.rand(2, 4, 3), dims=dims,
+                                        coords=coords)
+        self.dp = xray.DataArray(rs.rand(2, 4, 3), dims=dims, coords=coords)
+
+    def _expected(self, integrand, dp):
+        product = (integrand * dp).values
+        return np.array([np.nansum(product[:, k:], axis=1)
+                         for k in range(product.shape[1])]).swapaxes(0, 1)
+
+    def test_vert_coord_name(self):
+        self.assertEqual(vert_coord_name(self.dp), PFULL_STR)
+        self.assertEqual(
+            vert_coord_name(self.dp.rename({PFULL_STR: PLEVEL_STR})),
+            PLEVEL_STR
+        )
+        self.assertIsNone(vert_coord_name(self.dp.isel(**{PFULL_STR: 0})))
+
+    def test_matches_level_sums(self):
+        result = reverse_cumulative_vert_int(self.integrand, self.dp)
+        self.assertEqual(result.dims, self.integrand.dims)
+        np.testing.assert_allclose(
+            result.values, self._expected(self.integrand, self.dp)
+        )
+        np.testing.assert_allclose(result.isel(**{PFULL_STR: 0}),
+                                   (self.integrand * self.dp).sum(PFULL_STR))
+
+    def test_missing_values(self):
+        self.integrand[0, 2, 1] = np.nan
+        result = reverse_cumulative_vert_int(self.integrand, self.dp)
+        np.testing.assert_allclose(
+            result.values, self._expected(self.integrand, self.dp)
+        )
+
+    def test_broadcast_dp(self):
+        dp = self.dp.isel(time=0, lat=0)
+        result = reverse_cumulative_vert_int(self.integrand, dp)
+        np.testing.assert_allclose(result.values,
+                                   self._expected(self.integrand, dp))
+
+    def test_no_vert_coord(self):
+        with self.assertRaises(ValueError):
+            reverse_cumulative_vert_int(self.integrand,
+                                        self.dp.isel(**{PFULL_STR: 0}))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,141 @@
+"""Test suite for writing Calc outputs."""
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import xray
+
+from test_objs import variables
+from aospy_synthetic.calc import cache_stats
+from aospy_synthetic.db import registry
+from aospy_synthetic.db.logfile.logfile_db import LogFileDB
+from aospy_synthetic.db.sqlalchemy.sqlalchemy_db import SQLAlchemyDB
+from aospy_synthetic.writer import OutputWriter, round_bits
+
+from . import AospyTestCase
+from .synthetic_data import make_calc, write_run
+
+
+class TestRoundBits(AospyTestCase):
+    def test_round_bits(self):
+        values = np.random.RandomState(0).randn(1000).astype('float32')
+        rounded = round_bits(values, 10)
+        self.assertEqual(rounded.dtype, np.float32)
+        self.assertTrue(np.all(rounded.view('u4') & (2 ** 13 - 1) == 0))
+        np.testing.assert_allclose(rounded, values, rtol=2. ** -11)
+
+    def test_ties_to_even(self):
+        # 1 + 2**-11 and 1 + 3 * 2**-11 lie halfway between floats with 10
+        # mantissa bits
+        values = np.array([1 + 2. ** -11, 1 + 3 * 2. ** -11, -1 - 2. ** -11])
+        np.testing.assert_array_equal(
+            round_bits(values, 10), [1., 1 + 2 * 2. ** -10, -1.]
+        )
+
+    def test_non_finite(self):
+        values = np.array([np.nan, np.inf, -np.inf, 1.5])
+        np.testing.assert_array_equal(round_bits(values, 4), values)
+        self.assertIs(round_bits(values, 60), values)
+
+
+class TestOutputWriter(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'out', 'olr.nc')
+        self.data = xray.DataArray(np.arange(12.).reshape(3, 4),
+                                   dims=['lat', 'lon'], name='olr')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _load(self):
+        with xray.open_dataset(self.path) as ds:
+            return ds['olr'].load()
+
+    def test_write(self):
+        with OutputWriter() as writer:
+            bytes_written, write_time = writer.submit(self.data,
+                                                      self.path).result()
+        self.assertEqual(bytes_written, os.path.getsize(self.path))
+        self.assertGreaterEqual(write_time, 0.)
+        np.testing.assert_array_equal(self._load().values, self.data.values)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['olr.nc'])
+
+    def test_failed_write(self):
+        with OutputWriter() as writer:
+            writer.write(self.data, self.path)
+            unwritable = xray.DataArray(np.array([{}, {}], dtype=object),
+                                        dims=['x'], name='olr')
+            with self.assertRaises(Exception):
+                writer.write(unwritable, self.path)
+        np.testing.assert_array_equal(self._load().values, self.data.values)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['olr.nc'])
+
+    def test_prepare(self):
+        with OutputWriter(dtype='float32', keep_bits=8) as writer:
+            prepared = writer.prepare(self.data + 0.1)
+            writer.write(prepared, self.path)
+        self.assertEqual(prepared.dtype, np.float32)
+        np.testing.assert_array_equal(self._load().values, prepared.values)
+        self.assertEqual(writer.prepare(self.data.astype(int)).dtype,
+                         self.data.astype(int).dtype)
+
+    def test_encoding(self):
+        writer = OutputWriter(complevel=6, chunks={'lon': 2, 'lat': 10},
+                              engine='netcdf4')
+        self.assertEqual(writer.encoding(self.data),
+                         {'zlib': True, 'complevel': 6, 'chunksizes': (3, 2)})
+        writer.shutdown()
+        writer = OutputWriter(engine='scipy')
+        self.assertEqual(writer.encoding(self.data), {})
+        writer.shutdown()
+
+
+class TestCalcWrite(AospyTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        cache_stats.reset()
+
+    def tearDown(self):
+        registry.get_registry().clear()
+        shutil.rmtree(self.tmpdir)
+
+    def _check_backend(self, backend):
+        proj, model, run, data = write_run(self.tmpdir, ['olr'],
+                                           backend=backend)
+
+        def calc():
+            return make_calc(proj, model, run, variables.olr,
+                             os.path.join(self.tmpdir, 'scratch'),
+                             dtype_out_time=('avg', 'ts'),
+                             writer=OutputWriter(dtype='float32'))
+
+        computed = calc()
+        result = computed.compute()
+        for output in computed.outputs():
+            record = backend.get_metadata(output)
+            self.assertEqual(record['bytes_written'],
+                             os.path.getsize(output.path_scratch))
+            self.assertGreaterEqual(record['write_time'], 0.)
+        self.assertEqual(result['avg'].dtype, np.float32)
+
+        cached = calc().compute()
+        self.assertEqual(cache_stats.hits, 2)
+        for dtype_out_time in ('avg', 'ts'):
+            np.testing.assert_array_equal(cached[dtype_out_time].values,
+                                          result[dtype_out_time].values)
+
+    def test_sqlalchemy(self):
+        self._check_backend(SQLAlchemyDB(
+            'sqlite:///' + os.path.join(self.tmpdir, 'test.db')
+        ))
+
+    def test_logfile(self):
+        self._check_backend(LogFileDB(os.path.join(self.tmpdir, 'logdb')))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -1,5 +1,10 @@
 """Module for handling times, dates, etc."""
+from collections import OrderedDict
 import datetime
+import functools
+import hashlib
+import re
+import threading
 
 import numpy as np
 import pandas as pd
@@ -47,7 +52,9 @@ class TimeManager(object):
         first_letter = 'jfmamjjasond'*2
         # Python indexing starts at 0; month indices start at 1 for January.
         st_ind = first_letter.find(months.lower()) + 1
-        return range(st_ind, st_ind + len(months))
+        # Wrap around the end of the year, e.g. 'djf' is [12, 1, 2]
+        return [(ind - 1) % 12 + 1 for ind in range(st_ind,
+                                                    st_ind + len(months))]
 
     def __init__(self, start_date, end_date, months):
         """Instantiate a TimeManager object."""
@@ -58,20 +65,12 @@ class TimeManager(object):
     @staticmethod
     def _construct_month_conditional(time, months):
         """Create a conditional statement for selecting data in a DataArray."""
-        cond = False
-        for month in months:
-            cond |= (time['time.month'] == month)
-        return cond
+        return xray.DataArray(time_index(time).mask(months), dims=time.dims,
+                              coords=time.coords)
 
     def create_time_array(self):
         """Create an xray.DataArray comprising the desired months."""
-        all_months = pd.date_range(
-            start=self.apply_year_offset(self.start_date),
-            end=self.apply_year_offset(self.end_date), freq='M'
-        )
-        time = xray.DataArray(all_months, dims=[TIME_STR])
-        month_cond = self._construct_month_conditional(time, self.months)
-        return time[month_cond]
+        return time_array(self.start_date, self.end_date, self.months)
 
     @staticmethod
     def str_to_datetime(string):
@@ -103,18 +102,397 @@ class TimeManager(object):
                                                date.month, date.day))
 
 
+class TimeIndex(object):
+    """Integer year and month arrays of a datetime64 time coordinate.
+
+    Selections of months within a date range are looked up from the month
+    array through a 13-element table, and the date range found by bisection
+    if the times are sorted, instead of comparing every time once per month
+    and once per bound.  Selections are cached.
+    """
+    def __init__(self, times):
+        self.times = np.asarray(times).astype('datetime64[ns]')
+        months = self.times.astype('datetime64[M]').astype(np.int64)
+        self.year = months // 12 + 1970
+        self.month = months % 12 + 1
+        self.is_sorted = bool(np.all(self.times[1:] >= self.times[:-1]))
+        self._selections = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def _to_time(self, date):
+        """Converts a date to the type of ``times``.
+
+        Dates before TimeManager.NUMPYMINYEAR are offset as by
+        ``TimeManager.apply_year_offset``.
+        """
+        if date is None:
+            return None
+        if isinstance(date, str):
+            date = TimeManager.str_to_datetime(date)
+        if getattr(date, 'year', TimeManager.NUMPYMINYEAR) < \
+                TimeManager.NUMPYMINYEAR:
+            date = TimeManager.apply_year_offset(date)
+        return pd.Timestamp(date).to_datetime64()
+
+    def select(self, months=None, start_date=None, end_date=None):
+        """Returns the positions of the times of the given months from
+        ``start_date`` up to, but excluding, ``end_date``.
+
+        Returns
+        -------
+        slice or array
+            A slice if the positions are contiguous, which selects a view of
+            an array; otherwise an integer array.
+        """
+        start_date = self._to_time(start_date)
+        end_date = self._to_time(end_date)
+        if months is not None:
+            months = tuple(sorted(set(months)))
+            if months == tuple(range(1, 13)):
+                months = None
+        key = (months, start_date, end_date)
+        if key not in self._selections:
+            self._selections[key] = self._select(*key)
+        return self._selections[key]
+
+    def _select(self, months, start_date, end_date):
+        lo, hi = 0, len(self)
+        mask = None
+        if self.is_sorted:
+            if start_date is not None:
+                lo = np.searchsorted(self.times, start_date, side='left')
+            if end_date is not None:
+                hi = np.searchsorted(self.times, end_date, side='left')
+            hi = max(lo, hi)
+        elif start_date is not None or end_date is not None:
+            mask = np.ones(len(self), dtype=bool)
+            if start_date is not None:
+                mask &= self.times >= start_date
+            if end_date is not None:
+                mask &= self.times < end_date
+        if months is not None:
+            lookup = np.zeros(13, dtype=bool)
+            lookup[list(months)] = True
+            in_months = lookup[self.month[lo:hi]]
+            mask = in_months if mask is None else mask & in_months
+        if mask is None:
+            return slice(lo, hi)
+        inds = np.flatnonzero(mask) + lo
+        if not inds.size:
+            return slice(0, 0)
+        if inds[-1] - inds[0] + 1 == inds.size:
+            return slice(inds[0], inds[-1] + 1)
+        return inds
+
+    def mask(self, months=None, start_date=None, end_date=None):
+        """Returns a boolean array of the times ``select`` selects."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.select(months, start_date, end_date)] = True
+        return mask
+
+
+# Cumulative days at the start of each month of a year, for the calendars
+# with years of fixed length
+_MONTH_STARTS = {
+    365: np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    366: np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    360: np.arange(0, 361, 30)
+}
+
+CALENDARS = {
+    'standard': None,
+    'gregorian': None,
+    'proleptic_gregorian': None,
+    'noleap': 365,
+    '365_day': 365,
+    'all_leap': 366,
+    '366_day': 366,
+    '360_day': 360
+}
+
+# Days from 0000-03-01 to 1970-01-01 in the proleptic Gregorian calendar
+_CIVIL_EPOCH = 719468
+
+_UNITS_PER_DAY = {'days': 1., 'hours': 24., 'minutes': 1440.,
+                  'seconds': 86400.}
+
+
+def _year_length(calendar):
+    try:
+        return CALENDARS[calendar.lower()]
+    except KeyError:
+        raise ValueError("Unsupported calendar '{}'".format(calendar))
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 of proleptic Gregorian dates."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = (year_of_era * 365 + year_of_era // 4 -
+                  year_of_era // 100 + day_of_year)
+    return era * 146097 + day_of_era - _CIVIL_EPOCH
+
+
+def _civil_from_days(days):
+    """Proleptic Gregorian dates of days since 1970-01-01."""
+    days = days + _CIVIL_EPOCH
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 -
+                   day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 -
+                                year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = np.where(shifted_month < 10, shifted_month + 3,
+                     shifted_month - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def days_from_date(year, month, day, calendar='standard'):
+    """Days since 0001-01-01 of dates in a model calendar.
+
+    Parameters
+    ----------
+    year, month, day : int or array of int
+    calendar : str
+        One of the CF calendars in ``CALENDARS``.  The standard calendar is
+        treated as proleptic Gregorian.  Days past the end of a month in a
+        calendar, e.g. Dec 31 in the 360-day calendar, are clamped to the
+        month's last day.
+    """
+    year, month, day = (np.asarray(x, dtype=np.int64)
+                        for x in (year, month, day))
+    length = _year_length(calendar)
+    if length is None:
+        return (_days_from_civil(year, month, day) -
+                _days_from_civil(np.int64(1), np.int64(1), np.int64(1)))
+    month_starts = _MONTH_STARTS[length]
+    day = np.minimum(day, month_starts[month] - month_starts[month - 1])
+    return (year - 1) * length + month_starts[month - 1] + day - 1
+
+
+def date_from_days(days, calendar='standard'):
+    """Year, month and day arrays of days since 0001-01-01 in a model
+    calendar; the inverse of ``days_from_date``.
+    """
+    days = np.floor(np.asarray(days)).astype(np.int64)
+    length = _year_length(calendar)
+    if length is None:
+        return _civil_from_days(
+            days + _days_from_civil(np.int64(1), np.int64(1), np.int64(1))
+        )
+    month_starts = _MONTH_STARTS[length]
+    day_of_year = days % length
+    month = np.searchsorted(month_starts, day_of_year, side='right')
+    return (days // length + 1, month,
+            day_of_year - month_starts[month - 1] + 1)
+
+
+def parse_time_units(units):
+    """Returns the number of units per day and the reference (year, month,
+    day, fraction of day) of CF time units, e.g. 'hours since 0001-01-01'.
+    """
+    match = re.match(r'^\s*(\w+) since (-?\d+)-(\d+)-(\d+)'
+                     r'(?:[ T](\d+):(\d+)(?::(\d+(?:\.\d*)?))?)?',
+                     units)
+    if match is None or match.group(1).lower() not in _UNITS_PER_DAY:
+        raise ValueError("Unsupported time units '{}'".format(units))
+    hour, minute, second = (float(x or 0) for x in match.group(5, 6, 7))
+    return (_UNITS_PER_DAY[match.group(1).lower()],
+            tuple(int(x) for x in match.group(2, 3, 4)),
+            (hour + (minute + second / 60.) / 60.) / 24.)
+
+
+class CalendarTimeIndex(TimeIndex):
+    """Integer year, month and day arrays of a numeric time coordinate in a
+    model calendar.
+
+    Times are held as days since 0001-01-01 of the calendar, so that
+    no-leap, 360-day and standard calendars, from year 1 on, are selected
+    and grouped without converting to numpy datetimes.
+
+    Parameters
+    ----------
+    values : array
+        Times in the given CF units.
+    units : str
+        E.g. 'days since 0001-01-01 00:00:00'.
+    calendar : str
+        One of the calendars in ``CALENDARS``.
+    """
+    def __init__(self, values, units, calendar='standard'):
+        self.calendar = calendar
+        per_day, ref_date, ref_fraction = parse_time_units(units)
+        self.times = (days_from_date(*ref_date, calendar=calendar) +
+                      ref_fraction +
+                      np.asarray(values, dtype=float) / per_day)
+        self.year, self.month, self.day = date_from_days(self.times,
+                                                         calendar)
+        self.is_sorted = bool(np.all(self.times[1:] >= self.times[:-1]))
+        self._selections = {}
+
+    def _to_time(self, date):
+        """Converts a date, without any year offset, to days since
+        0001-01-01 of the calendar.
+        """
+        if date is None:
+            return None
+        if isinstance(date, str):
+            date = TimeManager.str_to_datetime(date)
+        days = days_from_date(date.year, date.month, date.day, self.calendar)
+        if date_from_days(days, self.calendar)[2] != date.day:
+            # The date is past the end of its month in the calendar, so
+            # bounds the times up to the end of the month
+            return float(days) + 1.
+        fraction = (date.hour + (date.minute + date.second / 60.) / 60.) / 24.
+        return float(days) + fraction
+
+
+class TimeIndexCache(object):
+    """Least recently used cache of the TimeIndex of time coordinates,
+    keyed by a digest of their values.  Safe to use from several threads.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._indices = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._indices)
+
+    def clear(self):
+        self._indices.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, time):
+        """Returns the TimeIndex of a time coordinate.
+
+        Parameters
+        ----------
+        time : DataArray or array
+            Times, either numeric with CF ``units`` (and optionally
+            ``calendar``) attributes, giving a CalendarTimeIndex, or
+            representable as numpy datetime64 objects.
+        """
+        values = np.asarray(getattr(time, 'values', time))
+        attrs = getattr(time, 'attrs', {})
+        md5 = hashlib.md5()
+        if values.dtype.kind in 'iuf' and 'units' in attrs:
+            units = attrs['units']
+            calendar = attrs.get('calendar', 'standard')
+            md5.update(repr((units, calendar)).encode('utf-8'))
+            md5.update(values.astype(float).tobytes())
+            make_index = functools.partial(CalendarTimeIndex, values, units,
+                                           calendar)
+        else:
+            values = values.astype('datetime64[ns]')
+            md5.update(values.view(np.int64).tobytes())
+            make_index = functools.partial(TimeIndex, values)
+        key = md5.hexdigest()
+        with self._lock:
+            index = self._indices.pop(key, None)
+            if index is not None:
+                self.hits += 1
+                self._indices[key] = index
+                return index
+            self.misses += 1
+        index = make_index()
+        with self._lock:
+            while len(self._indices) >= self.maxsize:
+                self._indices.popitem(last=False)
+            self._indices[key] = index
+        return index
+
+
+time_index_cache = TimeIndexCache()
+
+
+def time_index(time):
+    """Returns the cached TimeIndex of a time coordinate."""
+    return time_index_cache.get(time)
+
+
+DAYS_UNITS = 'days since 0001-01-01 00:00:00'
+
+_time_arrays = {}
+
+
+def time_array(start_date, end_date, months):
+    """Returns an xray.DataArray of the month ends between two dates that
+    fall in the given months.
+
+    Arrays are interned by (start_date, end_date, months), since many Calcs
+    share them; their values are backed by a pandas index and so cannot be
+    modified in place.
+    """
+    key = (start_date, end_date, tuple(months))
+    if key not in _time_arrays:
+        all_months = pd.date_range(
+            start=TimeManager.apply_year_offset(start_date),
+            end=TimeManager.apply_year_offset(end_date), freq='M'
+        )
+        time = xray.DataArray(all_months, dims=[TIME_STR])
+        month_cond = TimeManager._construct_month_conditional(time, months)
+        _time_arrays[key] = time[month_cond]
+    return _time_arrays[key]
+
+
+_date_bounds = {}
+
+
+def date_bounds(date_range):
+    """Returns the start and end dates of a (start, ..., end) sequence of
+    YYYY-MM-DD strings, as datetime.datetime objects.
+    """
+    key = (date_range[0], date_range[-1])
+    if key not in _date_bounds:
+        _date_bounds[key] = (TimeManager.str_to_datetime(key[0]),
+                             TimeManager.str_to_datetime(key[1]))
+    return _date_bounds[key]
+
+
 def _get_time(time, start_date, end_date, months, indices=False):
     """Determine indices/values of a time array within the specified interval.
 
     Assumes time is an xray DataArray and that it can be represented
     by numpy datetime64 objects (i.e. the year is between 1678 and 2262).
     """
-    inds = TimeManager._construct_month_conditional(time, months)
-    inds &= (time[TIME_STR] <= np.datetime64(end_date))
-    inds &= (time[TIME_STR] >= np.datetime64(start_date))
+    index = time_index(time)
     if indices == 'only':
-        return inds
-    elif indices:
-        return (inds, time.sel(time=inds))
-    else:
-        return time.sel(time=inds)
+        return xray.DataArray(index.mask(months, start_date, end_date),
+                              dims=time.dims, coords=time.coords)
+    selected = time.isel(**{TIME_STR: index.select(months, start_date,
+                                                   end_date)})
+    if indices:
+        return (xray.DataArray(index.mask(months, start_date, end_date),
+                               dims=time.dims, coords=time.coords), selected)
+    return selected
+
+
+def _prep_time_data(ds):
+    """Express the time coordinate of a Dataset opened with
+    decode_times=False as days since 0001-01-01 of its calendar.
+
+    Times stay numeric, so that they need not be representable as numpy
+    datetime64 objects; they are selected and grouped through
+    ``time_index``, and files with different reference dates can be
+    concatenated.
+    """
+    if TIME_STR not in ds or 'units' not in ds[TIME_STR].attrs:
+        return ds
+    time = ds[TIME_STR]
+    calendar = time.attrs.get('calendar', 'standard')
+    index = CalendarTimeIndex(time.values, time.attrs['units'], calendar)
+    attrs = dict(time.attrs)
+    attrs.update(units=DAYS_UNITS, calendar=calendar)
+    ds[TIME_STR] = xray.DataArray(index.times, dims=[TIME_STR], attrs=attrs)
+    return ds
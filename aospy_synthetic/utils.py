@@ -1,4 +1,8 @@
 """aospy.utils: utility functions for the aospy module."""
+import numpy as np
+import xray
+
+from .__config__ import PFULL_STR, PLEVEL_STR
 
 
 def robust_bool(obj):
@@ -39,3 +43,45 @@ def dict_name_keys(objs):
         except AttributeError as e:
             raise AttributeError(e)
     return objs
+
+
+def vert_coord_name(arr):
+    """Returns the name of the vertical coordinate of an array, or None if
+    it has none.
+    """
+    for name in (PFULL_STR, PLEVEL_STR):
+        if name in arr.dims:
+            return name
+    return None
+
+
+def reverse_cumulative_vert_int(integrand, dp):
+    """Integrates over pressure from each vertical level to the surface.
+
+    Levels are ordered from the top of the atmosphere down, as in model
+    output on pressure or hybrid sigma-pressure levels, and ``dp`` holds
+    the (positive) pressure thickness of each level, e.g. from
+    ``dp_from_ps``.  Level k of the result is the sum of ``integrand * dp``
+    over levels k to the bottom, with missing values skipped, computed in a
+    single cumulative sum.
+
+    Parameters
+    ----------
+    integrand, dp : DataArray
+        Arrays sharing a vertical coordinate.
+
+    Returns
+    -------
+    DataArray
+    """
+    vert = vert_coord_name(dp)
+    if vert is None:
+        raise ValueError('dp has no vertical coordinate')
+    product = integrand * dp
+    axis = product.get_axis_num(vert)
+    reverse = [slice(None)] * product.ndim
+    reverse[axis] = slice(None, None, -1)
+    reverse = tuple(reverse)
+    values = np.nancumsum(product.values[reverse], axis=axis)[reverse]
+    return xray.DataArray(values, coords=product.coords, dims=product.dims,
+                          name=product.name)
@@ -0,0 +1,173 @@
+"""writer.py: atomic, compressed writing of Calc outputs to netCDF.
+
+An output is written to a temporary file next to its destination and then
+renamed over it, so that a crash or a concurrent reader never sees a partly
+written file.  Outputs can be compressed with zlib in chunks of a given
+shape (with the netCDF4 library; netCDF3 files written with scipy support
+neither) and stored with reduced precision, which also makes them compress
+much better.  Writes are run on a pool of threads so that writing one Calc's
+output overlaps with finishing the next.
+"""
+import errno
+import os
+import threading
+import time
+
+import numpy as np
+import xray
+from concurrent.futures import ThreadPoolExecutor
+
+from .io import hdf5_lock
+
+try:
+    import netCDF4  # noqa: F401
+except ImportError:
+    ENGINE = 'scipy'
+else:
+    ENGINE = 'netcdf4'
+
+
+def round_bits(values, keep_bits):
+    """Rounds floats to the nearest value with only ``keep_bits`` bits of
+    mantissa, ties to even.
+
+    The dropped bits are zeroed, so the values compress well.  Non-finite
+    values are left as they are.
+
+    Parameters
+    ----------
+    values : array-like of float
+    keep_bits : int
+        Number of explicit mantissa bits to keep: at most 23 for float32
+        and 52 for float64.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    values = np.asarray(values)
+    drop = np.finfo(values.dtype).nmant - keep_bits
+    if drop <= 0:
+        return values
+    uint = np.dtype('u{}'.format(values.dtype.itemsize)).type
+    bits = values.view(uint)
+    drop = uint(drop)
+    half_minus_one = uint((1 << (int(drop) - 1)) - 1)
+    mask = ~uint((1 << int(drop)) - 1)
+    rounded = (bits + half_minus_one + ((bits >> drop) & uint(1))) & mask
+    return np.where(np.isfinite(values), rounded.view(values.dtype), values)
+
+
+class OutputWriter(object):
+    """Writes DataArrays to netCDF files atomically, in background threads.
+
+    Parameters
+    ----------
+    complevel : int
+        zlib compression level, from 0 (no compression) to 9.
+    chunks : dict, optional
+        Chunk length along each dimension; dimensions not given are not
+        split.  By default the library chooses.
+    dtype : str or numpy.dtype, optional
+        Float type to store the data as, e.g. 'float32'.  By default the
+        data's own type.
+    keep_bits : int, optional
+        Number of mantissa bits to keep; see ``round_bits``.  By default
+        all of them.
+    max_workers : int
+        Maximum number of files written at once.
+    engine : {'netcdf4', 'scipy'}, optional
+        Defaults to netCDF4 if it is installed.
+    """
+    def __init__(self, complevel=4, chunks=None, dtype=None, keep_bits=None,
+                 max_workers=2, engine=None):
+        self.complevel = complevel
+        self.chunks = chunks or {}
+        self.dtype = dtype
+        self.keep_bits = keep_bits
+        self.engine = engine or ENGINE
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        """Stops the writing threads, by default after pending writes."""
+        self._pool.shutdown(wait=wait)
+
+    def prepare(self, data):
+        """Returns the data with the precision it is to be stored with."""
+        if data.dtype.kind != 'f':
+            return data
+        if self.dtype is not None:
+            data = data.astype(self.dtype)
+        if self.keep_bits is not None:
+            data = data.copy()
+            data.values = round_bits(data.values, self.keep_bits)
+        return data
+
+    def encoding(self, data):
+        """Returns the netCDF encoding of the data variable."""
+        if self.engine != 'netcdf4':
+            return {}
+        encoding = {}
+        if self.complevel:
+            encoding.update(zlib=True, complevel=self.complevel)
+        if self.chunks and data.ndim:
+            encoding['chunksizes'] = tuple(
+                min(self.chunks.get(dim, size), size) or 1
+                for dim, size in zip(data.dims, data.shape)
+            )
+        return encoding
+
+    def write(self, data, path):
+        """Writes a prepared DataArray, or a Dataset, to a file, replacing
+        it atomically.
+
+        Returns
+        -------
+        bytes_written : int
+        write_time : float
+            Seconds taken to write the file.
+        """
+        start = time.time()
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+                                         threading.current_thread().ident)
+        ds = data if isinstance(data, xray.Dataset) else data.to_dataset()
+        try:
+            if self.engine == 'netcdf4':
+                encoding = {name: self.encoding(ds[name])
+                            for name in ds.data_vars}
+                with hdf5_lock:
+                    ds.to_netcdf(tmp_path, engine=self.engine,
+                                 encoding=encoding)
+            else:
+                ds.to_netcdf(tmp_path, engine=self.engine)
+            bytes_written = os.path.getsize(tmp_path)
+            os.rename(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return bytes_written, time.time() - start
+
+    def submit(self, data, path):
+        """Starts writing a prepared DataArray, or a Dataset, in the
+        background.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of the output of ``write``.
+        """
+        return self._pool.submit(self.write, data, path)
@@ -0,0 +1,58 @@
+"""Compare the per-level loop formerly used in gz with
+reverse_cumulative_vert_int, for typical numbers of vertical levels.
+
+Usage::
+
+    python benchmark_vert_int.py
+"""
+from __future__ import print_function
+import timeit
+
+import numpy as np
+import xray
+
+from aospy_synthetic.__config__ import PFULL_STR
+from aospy_synthetic.utils import reverse_cumulative_vert_int, vert_coord_name
+
+NTIME, NLAT, NLON = 12, 90, 144
+LEVEL_COUNTS = (20, 24, 32, 48, 64, 91)
+
+
+def loop_vert_int(integrand, dp):
+    """Per-level implementation of reverse_cumulative_vert_int."""
+    integrand = integrand * dp
+    result = integrand.copy(deep=True)
+    v = vert_coord_name(dp)
+    for k in range(len(dp[v])):
+        result[{v: k}] = integrand.isel(**{v: slice(k, None)}).sum(dim=v)
+    return result
+
+
+def make_arrays(nlev):
+    rs = np.random.RandomState(0)
+    dims = ('time', PFULL_STR, 'lat', 'lon')
+    coords = {PFULL_STR: np.linspace(10., 1000., nlev)}
+    shape = (NTIME, nlev, NLAT, NLON)
+    integrand = xray.DataArray(rs.rand(*shape), dims=dims, coords=coords)
+    dp = xray.DataArray(1e3 + rs.rand(*shape), dims=dims, coords=coords)
+    return integrand, dp
+
+
+def main(repeat=3):
+    print('{:>6} {:>10} {:>14} {:>8}'.format('nlev', 'loop (s)',
+                                             'vectorized (s)', 'speedup'))
+    for nlev in LEVEL_COUNTS:
+        integrand, dp = make_arrays(nlev)
+        np.testing.assert_allclose(reverse_cumulative_vert_int(integrand, dp),
+                                   loop_vert_int(integrand, dp))
+        loop = min(timeit.repeat(lambda: loop_vert_int(integrand, dp),
+                                 number=1, repeat=repeat))
+        vectorized = min(timeit.repeat(
+            lambda: reverse_cumulative_vert_int(integrand, dp), number=1,
+            repeat=repeat))
+        print('{:>6} {:>10.3f} {:>14.3f} {:>8.1f}'.format(
+            nlev, loop, vectorized, loop / vectorized))
+
+
+if __name__ == '__main__':
+    main()
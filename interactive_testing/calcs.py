@@ -2,8 +2,9 @@
 """
 
 from aospy.constants import (c_p, L_v, R_a)
-from aospy.utils import (to_pascal, dp_from_ps, vert_coord_name)
+from aospy.utils import (to_pascal, dp_from_ps)
 from aospy_synthetic.__config__ import PFULL_STR
+from aospy_synthetic.utils import reverse_cumulative_vert_int
 
 
 def dp(ps, bk, pk, arr):
@@ -24,42 +25,32 @@ def pfull(p):
 def gz(temp, sphum, dp, p):
     """Geopotential calculated from hydrostatic relation."""
     integrand = (R_a.value * (1.0 + 0.608 * sphum) * temp) / p
-    integrand = integrand * dp
-    gz = integrand.copy(deep=True)
-    v = vert_coord_name(dp)
-    print(v)
-    for k in range(len(dp[v])):
-        gz[{v: k}] = integrand.isel(**{v: slice(k, None)}).sum(dim=v)
-    return gz
+    return reverse_cumulative_vert_int(integrand, dp)
 
 
-def dse(temp, sphum, dp, p):
+def dse(temp, gz):
     """ Returns the dry static energy at each gridbox.
 
     $s = c_p T + gz$
     """
-    return (c_p.value * temp + gz(temp, sphum, dp, p))
+    return (c_p.value * temp + gz)
 
 
-def mse(temp, sphum, dp, p):
+def mse(dse, sphum):
     """ Returns the moist static energy at each gridbox.
 
     $m = c_p T + L_v q + gz$
 
     Parameters
     ----------
-    temp : array
-        temperature
+    dse : array
+        dry static energy
     sphum : array
         specific humidity
-    p : array
-        pressure at sigma levels
-    dp : array
-        thickness of pressure levels
 
     Returns
     -------
     mse : array
         moist static energy
     """
-    return (dse(temp, sphum, dp, p) + L_v.value * sphum)
+    return (dse + L_v.value * sphum)